@@ -1,31 +1,106 @@
+import asyncio
+import atexit
 import base64
-import difflib
+import codecs
+import contextvars
+import functools
+import hashlib
+import itertools
 import json
+import multiprocessing
 import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import requests
 from mcp.server.fastmcp import FastMCP
 
-from .tools import is_siyuan_timestamp, mask_sensitive_data, parse_and_mask_kramdown
+from .tools import (
+    StreamingMasker,
+    is_siyuan_timestamp,
+    mask_sensitive_data,
+    mask_sql_row,
+    parse_and_mask_kramdown,
+)
+from .cache import TTLCache, current_scope, request_scope, tool_call_stats
+from .diffing import describe_diff
+from .disk_cache import TextMapDiskCache, default_cache_dir
+from .export import (
+    SchemaTracker,
+    atomic_path,
+    default_export_dir,
+    ndjson_to_parquet,
+    require_pyarrow,
+    resolve_export_path,
+    validate_file_name,
+    write_ndjson_rows,
+)
+from .history import get_snapshot_index
+from .notifications import NotificationQueue, format_notification
+from .pagination import (
+    KEYSETS,
+    decode_cursor,
+    keyset_condition,
+    next_cursor,
+    order_clause,
+    query_fingerprint,
+)
+from .search_index import SearchIndex, fts_phrase
+from .text_map import walk_block_tree
+from .transport import env_bool, env_float, env_int, get_transport
+from .tree_index import DocumentTree, TreeIndex
+
+
+# 会改变块结构或内容的写入端点：调用后使块元数据缓存失效
+_WRITE_ENDPOINTS = frozenset(
+    {
+        "/api/block/insertBlock",
+        "/api/block/prependBlock",
+        "/api/block/appendBlock",
+        "/api/block/updateBlock",
+        "/api/block/deleteBlock",
+        "/api/block/moveBlock",
+        "/api/block/foldBlock",
+        "/api/block/unfoldBlock",
+        "/api/filetree/createDocWithMd",
+    }
+)
 
+# 笔记本列表与块元数据的进程内缓存（SIYUAN_MCP_CACHE_TTL=0 可关闭）
+_CACHE_TTL = env_float("SIYUAN_MCP_CACHE_TTL", 10.0, allow_zero=True)
+_CACHE_SIZE = env_int("SIYUAN_MCP_CACHE_SIZE", 2048, minimum=1)
+_notebook_cache = TTLCache("notebooks", _CACHE_TTL, 1)
+_block_metadata_cache = TTLCache("block_metadata", _CACHE_TTL, _CACHE_SIZE)
+# 文档块树索引：从 .sy 文件加载，随写接口返回的 doOperations 原地更新
+_TREE_INDEX_TTL = env_float("SIYUAN_MCP_TREE_INDEX_TTL", _CACHE_TTL, allow_zero=True)
+_tree_index = TreeIndex(_TREE_INDEX_TTL)
 
-_DEFAULT_SIYUAN_API_URL = "http://127.0.0.1:6806"
 
+def _invalidate_block_caches() -> None:
+    """本服务发起写入后调用：块的父子关系、类型等可能已变化。"""
+    _block_metadata_cache.invalidate()
+    if _search_index is not None:
+        _search_index.mark_stale()
+    scope = current_scope()
+    if scope is not None:
+        scope.invalidate()
 
-def _get_siyuan_request_parts(endpoint: str) -> Tuple[str, Dict[str, str]]:
-    """构造思源 API 请求所需的 URL 和标准请求头。"""
-    api_token = os.getenv("SIYUAN_API_TOKEN")
-    if not api_token:
-        raise ValueError("SIYUAN_API_TOKEN environment variable not set.")
 
-    base_url = os.getenv("SIYUAN_API_URL", _DEFAULT_SIYUAN_API_URL).rstrip("/")
-    headers = {
-        "Authorization": f"Token {api_token}",
-        "Content-Type": "application/json",
-    }
-    return f"{base_url}{endpoint}", headers
+def _memoized(kind: str, key: str, loader: Callable[[], Any]) -> Any:
+    """在当前工具调用内去重相同查询；不在工具调用中时直接查询。"""
+    scope = current_scope()
+    if scope is None:
+        return loader()
+    return scope.memoize(kind, key, loader)
+
+
+def _record_backend_call(endpoint: str) -> None:
+    scope = current_scope()
+    if scope is not None:
+        scope.record_call(endpoint)
 
 
 def _post_to_siyuan_api(
@@ -33,6 +108,8 @@ def _post_to_siyuan_api(
 ) -> Any:
     """发送 POST 请求到思源笔记 API
 
+    请求经由共享传输层发出（连接池复用、分端点超时、只读端点有限重试）。
+
     Args:
         endpoint: API 端点，例如 '/api/query/sql'
         json_data: 要发送的 JSON 数据
@@ -45,25 +122,61 @@ def _post_to_siyuan_api(
         ConnectionError: 如果无法连接到思源笔记 API
         Exception: 如果 API 返回错误
     """
-    url, headers = _get_siyuan_request_parts(endpoint)
+    transport = get_transport()
+    _record_backend_call(endpoint)
+    tree_patched = False
     try:
-        response = requests.post(url, json=json_data, headers=headers)
-        response.raise_for_status()
+        response = transport.post(endpoint, json_data)
         api_response = response.json()
         if api_response.get("code") != 0:
             raise Exception(f"Siyuan API Error: {api_response.get('msg')}")
-        return api_response.get("data")
+        data = api_response.get("data")
+        if endpoint in _WRITE_ENDPOINTS:
+            _patch_tree_index(endpoint, json_data, data)
+            tree_patched = True
+        return data
     except requests.exceptions.RequestException as e:
         raise ConnectionError(f"Failed to connect to Siyuan API: {e}") from e
+    finally:
+        # 写入失败也可能已部分生效，一律让缓存失效
+        if endpoint in _WRITE_ENDPOINTS:
+            _invalidate_block_caches()
+            if not tree_patched:
+                _tree_index.invalidate()
+
+
+def _patch_tree_index(
+    endpoint: str, json_data: Optional[Dict[str, Any]], data: Any
+) -> None:
+    if endpoint in ("/api/block/foldBlock", "/api/block/unfoldBlock"):
+        block_id = (json_data or {}).get("id")
+        if isinstance(block_id, str):
+            _tree_index.set_folded(block_id, endpoint == "/api/block/foldBlock")
+        return
+    _tree_index.apply_transactions(data)
+
+
+def _post_file_request(path: str, stream: bool = False) -> requests.Response:
+    """通过 /api/file/getFile 读取文件，返回原始响应（stream=True 时由调用方负责关闭）。"""
+    transport = get_transport()
+    _record_backend_call("/api/file/getFile")
+    try:
+        return transport.post("/api/file/getFile", {"path": path}, stream=stream)
+    except requests.exceptions.RequestException as e:
+        raise ConnectionError(f"Failed to get file: {e}") from e
 
 
-def _push_notification(endpoint: str, msg: str, timeout: int = 20000) -> Dict[str, Any]:
-    """推送前台通知消息。"""
+def _validate_notification(msg: str, timeout: int) -> None:
     if not isinstance(msg, str) or not msg.strip():
         raise ValueError("msg must be a non-empty string")
     if isinstance(timeout, bool) or not isinstance(timeout, int) or timeout <= 0:
         raise ValueError("timeout must be a positive integer in milliseconds")
 
+
+def _push_notification(endpoint: str, msg: str, timeout: int = 20000) -> Dict[str, Any]:
+    """推送前台通知消息。"""
+    _validate_notification(msg, timeout)
+
     result = _post_to_siyuan_api(endpoint, {"msg": msg, "timeout": timeout})
     if not isinstance(result, dict):
         raise TypeError(
@@ -72,18 +185,46 @@ def _push_notification(endpoint: str, msg: str, timeout: int = 20000) -> Dict[st
     return result
 
 
-def _push_message(title: str, msg: str, timeout: int = 20000) -> Dict[str, Any]:
-    """内部统一的成功通知入口（供写操作 tool 调用）。"""
-    title_text = title.strip() if isinstance(title, str) else ""
-    combined = f"{title_text}：{msg}" if title_text else msg
-    return _push_notification("/api/notification/pushMsg", combined, timeout)
+# 写操作通知默认经后台队列发送，不占用工具调用的返回时间；
+# SIYUAN_MCP_NOTIFY_QUEUE_SIZE=0 时退回同步发送。
+_NOTIFY_QUEUE_SIZE = env_int("SIYUAN_MCP_NOTIFY_QUEUE_SIZE", 200)
+_NOTIFY_COALESCE_SECONDS = env_float(
+    "SIYUAN_MCP_NOTIFY_COALESCE_SECONDS", 1.0, allow_zero=True
+)
+_notification_queue: Optional[NotificationQueue] = None
+if _NOTIFY_QUEUE_SIZE > 0:
+    _notification_queue = NotificationQueue(
+        _push_notification, _NOTIFY_QUEUE_SIZE, _NOTIFY_COALESCE_SECONDS
+    )
+    atexit.register(_notification_queue.close)
 
 
-def _push_error_message(title: str, msg: str, timeout: int = 7000) -> Dict[str, Any]:
+def _dispatch_notification(
+    endpoint: str, title: str, msg: str, timeout: int, is_error: bool
+) -> None:
+    combined = format_notification(title, msg)
+    _validate_notification(combined, timeout)
+    if _notification_queue is None:
+        _push_notification(endpoint, combined, timeout)
+        return
+    _notification_queue.enqueue(endpoint, title, msg, timeout, is_error)
+
+
+def _push_message(title: str, msg: str, timeout: int = 20000) -> None:
+    """内部统一的成功通知入口（供写操作 tool 调用）。
+
+    通知进入后台队列后立即返回；短时间内同一标题的多条通知会合并为一条汇总。
+    """
+    _dispatch_notification(
+        "/api/notification/pushMsg", title, msg, timeout, is_error=False
+    )
+
+
+def _push_error_message(title: str, msg: str, timeout: int = 7000) -> None:
     """内部统一的失败通知入口（供写操作 tool 调用）。"""
-    title_text = title.strip() if isinstance(title, str) else ""
-    combined = f"{title_text}：{msg}" if title_text else msg
-    return _push_notification("/api/notification/pushErrMsg", combined, timeout)
+    _dispatch_notification(
+        "/api/notification/pushErrMsg", title, msg, timeout, is_error=True
+    )
 
 
 def _best_effort_push_notification(
@@ -204,22 +345,87 @@ def _validate_block_data_type(data_type: str) -> None:
         raise ValueError("data_type must be 'markdown' or 'dom'")
 
 
+# 精简写入：跳过仅用于拼接通知文案的内容预览请求，批量写入时每次只调用写接口本身。
+# 仍会推送简短通知（不允许静默写入），连续写入会在通知队列中合并为一条汇总。
+_LEAN_WRITES = env_bool("SIYUAN_MCP_LEAN_WRITES", False)
+
+
+def _resolve_lean(lean: Optional[bool]) -> bool:
+    if lean is None:
+        return _LEAN_WRITES
+    if type(lean) is not bool:
+        raise ValueError("lean must be a boolean")
+    return lean
+
+
 def _sql_escape(value: str) -> str:
     return value.replace("'", "''")
 
 
 def _get_block_metadata(block_id: str) -> Optional[Dict[str, Any]]:
+    metadata = _memoized(
+        "metadata", block_id, lambda: _load_block_metadata(block_id)
+    )
+    return dict(metadata) if metadata is not None else None
+
+
+def _load_block_metadata(block_id: str) -> Optional[Dict[str, Any]]:
+    hit, cached = _block_metadata_cache.get(block_id)
+    if hit:
+        return dict(cached)
+
     sanitized_id = _sql_escape(block_id)
-    query = f"SELECT id, root_id, parent_id, type, subtype, sort, created FROM blocks WHERE id = '{sanitized_id}' LIMIT 1"
+    query = f"SELECT id, root_id, parent_id, box, path, type, subtype, sort, created FROM blocks WHERE id = '{sanitized_id}' LIMIT 1"
     result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
     if not isinstance(result, list) or not result:
         return None
     first = result[0]
     if not isinstance(first, dict):
         return None
+    _block_metadata_cache.set(block_id, dict(first))
     return first
 
 
+# 单条 IN (...) 查询最多携带的 ID 数，避免 SQL 语句过长
+_METADATA_BATCH_SIZE = 500
+
+
+def _prime_block_metadata(block_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """用 IN (...) 批量查询块元数据并写入缓存，返回 id -> 元数据（不存在的 ID 不在结果中）。"""
+    unique_ids = list(dict.fromkeys(block_ids))
+    found: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(unique_ids), _METADATA_BATCH_SIZE):
+        chunk = unique_ids[start : start + _METADATA_BATCH_SIZE]
+        id_list = ", ".join(f"'{_sql_escape(block_id)}'" for block_id in chunk)
+        query = (
+            "SELECT id, root_id, parent_id, box, path, type, subtype, sort, created FROM blocks "
+            f"WHERE id IN ({id_list}) LIMIT {len(chunk)}"
+        )
+        result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
+        if not isinstance(result, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(result)}")
+        for row in result:
+            if isinstance(row, dict) and isinstance(row.get("id"), str):
+                found[row["id"]] = row
+
+    scope = current_scope()
+    for block_id, row in found.items():
+        _block_metadata_cache.set(block_id, dict(row))
+        if scope is not None:
+            scope.memoize("metadata", block_id, lambda row=row: dict(row))
+    return found
+
+
+def _fetch_block_kramdown(block_id: str) -> Any:
+    """读取块的 kramdown 原文（未打码），调用方负责打码。"""
+    result = _memoized(
+        "kramdown",
+        block_id,
+        lambda: _post_to_siyuan_api("/api/block/getBlockKramdown", {"id": block_id}),
+    )
+    return dict(result) if isinstance(result, dict) else result
+
+
 def _get_block_content_preview(block_id: str, max_len: int = 30) -> str:
     """获取块的内容预览（用于语义化通知）。"""
     try:
@@ -232,11 +438,16 @@ def _get_block_content_preview(block_id: str, max_len: int = 30) -> str:
 
 
 
+# 结构查询的行数上限：思源 SQL 接口未写 LIMIT 时只返回前 64 行，需显式给出
+_STRUCTURE_ROW_LIMIT = 200000
+
+
 def _get_root_block_rows(root_id: str) -> List[Dict[str, Any]]:
     sanitized_root_id = _sql_escape(root_id)
     query = (
         "SELECT id, parent_id, type, subtype, sort, created FROM blocks "
-        f"WHERE root_id = '{sanitized_root_id}' ORDER BY sort ASC, created ASC, id ASC"
+        f"WHERE root_id = '{sanitized_root_id}' ORDER BY sort ASC, created ASC, id ASC "
+        f"LIMIT {_STRUCTURE_ROW_LIMIT}"
     )
     result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
     if not isinstance(result, list):
@@ -250,6 +461,87 @@ def _get_root_block_rows(root_id: str) -> List[Dict[str, Any]]:
     return rows
 
 
+def _read_document_tree(block_id: str, reader: Callable[[DocumentTree], Any]) -> Any:
+    """在包含 block_id 的文档块树上执行只读查询（持有索引锁），返回 reader 的结果。
+
+    文档树首次使用时从 .sy 文件加载；索引关闭、加载失败或查询出错时返回 None，
+    调用方应退回向思源查询。
+    """
+    if not _tree_index.enabled:
+        return None
+    try:
+        root_id = _tree_index.root_of(block_id)
+        if root_id is None:
+            metadata = _get_block_metadata(block_id)
+            raw_root_id = metadata.get("root_id") if metadata else None
+            if not isinstance(raw_root_id, str) or not raw_root_id:
+                return None
+            root_id = raw_root_id
+        found, result = _tree_index.read(root_id, block_id, reader)
+        if found:
+            return result
+
+        root_metadata = _get_block_metadata(root_id)
+        box = root_metadata.get("box") if root_metadata else None
+        path = root_metadata.get("path") if root_metadata else None
+        if not isinstance(box, str) or not isinstance(path, str) or not path.endswith(".sy"):
+            return None
+        response = _post_file_request(f"/data/{box}{path}")
+        _tree_index.store(DocumentTree.from_sy(response.json(), time.monotonic()))
+        _, result = _tree_index.read(root_id, block_id, reader)
+        return result
+    except Exception:
+        return None
+
+
+def _check_tree_drift(block_id: str, child_ids: List[str]) -> None:
+    """用思源实际返回的子块列表核对索引，不一致时丢弃该文档的索引。"""
+    root_id = _tree_index.root_of(block_id)
+    if root_id is None:
+        return
+    try:
+        found, indexed = _tree_index.read(
+            root_id, block_id, lambda tree: tree.child_block_ids(block_id)
+        )
+    except (KeyError, ValueError):
+        found, indexed = True, None
+    if found and indexed != child_ids:
+        _tree_index.invalidate(root_id)
+
+
+def _get_subtree_rows(block_id: str, root_id: str) -> List[Dict[str, Any]]:
+    """查询 block_id 及其全部后代，开销与子树大小成正比。
+
+    优先使用文档块树索引；否则沿 parent_id 递归查询，递归查询失败时退回整篇文档扫描。
+    """
+    indexed_rows = _read_document_tree(
+        block_id, lambda tree: [tree.row(node_id) for node_id in tree.subtree_ids(block_id)]
+    )
+    if indexed_rows is not None:
+        return indexed_rows
+
+    sanitized_id = _sql_escape(block_id)
+    sanitized_root_id = _sql_escape(root_id)
+    query = (
+        "WITH RECURSIVE subtree(id) AS ("
+        f"SELECT id FROM blocks WHERE id = '{sanitized_id}' "
+        "UNION ALL "
+        "SELECT b.id FROM blocks b JOIN subtree s ON b.parent_id = s.id "
+        f"WHERE b.root_id = '{sanitized_root_id}'"
+        ") "
+        "SELECT id, parent_id, type, subtype, sort, created FROM blocks "
+        "WHERE id IN (SELECT id FROM subtree) "
+        f"ORDER BY sort ASC, created ASC, id ASC LIMIT {_STRUCTURE_ROW_LIMIT}"
+    )
+    try:
+        result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
+    except Exception:
+        result = None
+    if not isinstance(result, list) or not result:
+        return _get_root_block_rows(root_id)
+    return [row for row in result if isinstance(row, dict)]
+
+
 def _get_direct_child_rows(parent_id: str) -> List[Dict[str, Any]]:
     sanitized_parent_id = _sql_escape(parent_id)
     query = (
@@ -268,15 +560,35 @@ def _get_direct_child_rows(parent_id: str) -> List[Dict[str, Any]]:
     return rows
 
 
-def _get_child_blocks_rows(block_id: str) -> List[Dict[str, Any]]:
-    result = _post_to_siyuan_api("/api/block/getChildBlocks", {"id": block_id})
+def _get_child_blocks_rows(block_id: str, use_index: bool = True) -> List[Dict[str, Any]]:
+    """与 getChildBlocks 一致的子块列表。
+
+    use_index=False 时强制向思源查询，并用结果核对文档块树索引（不一致时丢弃该文档的索引）。
+    """
+    if use_index:
+        indexed_rows = _read_document_tree(
+            block_id,
+            lambda tree: [tree.row(node_id) for node_id in tree.child_block_ids(block_id)],
+        )
+        if indexed_rows is not None:
+            return indexed_rows
+
+    result = _memoized(
+        "children",
+        block_id,
+        lambda: _post_to_siyuan_api("/api/block/getChildBlocks", {"id": block_id}),
+    )
     if not isinstance(result, list):
         raise TypeError(f"Expected a list from getChildBlocks, but got {type(result)}")
 
     rows: List[Dict[str, Any]] = []
     for row in result:
         if isinstance(row, dict):
-            rows.append(row)
+            rows.append(dict(row))
+    if not use_index:
+        _check_tree_drift(
+            block_id, [row["id"] for row in rows if isinstance(row.get("id"), str)]
+        )
     return rows
 
 
@@ -339,7 +651,18 @@ def _parse_heading_level(subtype: Any) -> Optional[int]:
     return level
 
 
-def _collect_heading_section_ids(block_id: str) -> List[str]:
+def _collect_heading_section_ids(block_id: str, use_index: bool = True) -> List[str]:
+    """标题分节的顶层块 ID（含标题本身）；use_index=False 时按思源当前的子块列表计算。"""
+    if use_index:
+        indexed_ids = _read_document_tree(
+            block_id,
+            lambda tree: tree.section_ids(block_id)
+            if tree.row(block_id)["type"] == "h"
+            else [block_id],
+        )
+        if indexed_ids is not None:
+            return indexed_ids
+
     metadata = _get_block_metadata(block_id)
     if not metadata:
         raise ValueError(f"block_id not found: {block_id}")
@@ -356,7 +679,7 @@ def _collect_heading_section_ids(block_id: str) -> List[str]:
     if not parent_id:
         return [block_id]
 
-    rows = _get_child_blocks_rows(parent_id)
+    rows = _get_child_blocks_rows(parent_id, use_index=use_index)
     child_ids: List[str] = []
     type_by_id: Dict[str, str] = {}
     level_by_id: Dict[str, Optional[int]] = {}
@@ -388,6 +711,61 @@ def _collect_heading_section_ids(block_id: str) -> List[str]:
     return section_ids or [block_id]
 
 
+# 标题分节移动优先走“折叠标题 -> 移动标题 -> 展开”：思源移动折叠标题时会带上整个分节，
+# 一次 moveBlock 即可完成；设为 0 时始终逐块链式移动。
+_FOLD_SECTION_MOVE = env_bool("SIYUAN_MCP_FOLD_SECTION_MOVE", True)
+_FOLD_ATTR_RE = re.compile(r'\bfold="1"')
+
+
+def _is_block_folded(block_id: str) -> bool:
+    sanitized_id = _sql_escape(block_id)
+    result = _post_to_siyuan_api(
+        "/api/query/sql",
+        {"stmt": f"SELECT ial FROM blocks WHERE id = '{sanitized_id}' LIMIT 1"},
+    )
+    if not isinstance(result, list) or not result or not isinstance(result[0], dict):
+        return False
+    ial = result[0].get("ial")
+    return isinstance(ial, str) and bool(_FOLD_ATTR_RE.search(ial))
+
+
+def _move_folded_section(
+    group_top_level_ids: List[str],
+    previous_id: Optional[str],
+    parent_id: str,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """折叠标题后整体移动，返回 (操作列表, 未跟随标题移动的分节块 ID)。
+
+    移动后用 getChildBlocks 核对标题下的分节；核对不一致的块由调用方逐块补移。
+    """
+    heading_id = group_top_level_ids[0]
+    was_folded = _is_block_folded(heading_id)
+    if not was_folded:
+        _post_to_siyuan_api("/api/block/foldBlock", {"id": heading_id})
+    try:
+        operations = _move_block_once(
+            heading_id, previous_id=previous_id, parent_id=parent_id
+        )
+    finally:
+        if not was_folded:
+            _post_to_siyuan_api("/api/block/unfoldBlock", {"id": heading_id})
+
+    expected = group_top_level_ids[1:]
+    actual = [
+        row_id
+        for row_id in (
+            row.get("id") for row in _get_child_blocks_rows(heading_id, use_index=False)
+        )
+        if isinstance(row_id, str)
+    ]
+    matched = 0
+    while matched < len(expected) and matched < len(actual):
+        if actual[matched] != expected[matched]:
+            break
+        matched += 1
+    return operations, expected[matched:]
+
+
 def _move_section_group_after(
     group_top_level_ids: List[str],
     previous_id: Optional[str],
@@ -405,11 +783,39 @@ def _move_section_group_after(
 
     # Chain the anchor to keep the moved group contiguous.
     anchor_id: Optional[str] = previous_id
+    pending_ids = group_top_level_ids
+
+    heading_meta = _get_block_metadata(group_top_level_ids[0])
+    if (
+        _FOLD_SECTION_MOVE
+        and len(group_top_level_ids) > 1
+        and heading_meta is not None
+        and heading_meta.get("type") == "h"
+    ):
+        try:
+            folded_ops, stray_ids = _move_folded_section(
+                group_top_level_ids, previous_id, parent_id
+            )
+        except Exception:
+            # 折叠/移动接口不可用时退回逐块链式移动（重复移动到同一锚点是幂等的）
+            folded_ops, stray_ids = [], group_top_level_ids
+        if len(stray_ids) < len(group_top_level_ids):
+            operations.extend(folded_ops)
+            moved_ids = [
+                block_id
+                for block_id in group_top_level_ids
+                if block_id not in stray_ids
+            ]
+            if not stray_ids:
+                return moved_ids, operations
+            # 未跟随标题的块接在已就位部分之后继续链式移动
+            anchor_id = moved_ids[-1]
+            pending_ids = stray_ids
 
     failures: Dict[str, str] = {}
-    for idx, current_id in enumerate(group_top_level_ids):
+    for idx, current_id in enumerate(pending_ids):
         try:
-            if idx == 0:
+            if idx == 0 and not moved_ids:
                 current_ops = _move_block_once(
                     current_id, previous_id=anchor_id, parent_id=parent_id
                 )
@@ -492,7 +898,7 @@ def _move_block_group(
             raise ValueError("parent_id cannot be the same as block_id")
         return [block_id], _move_block_once(block_id, previous_id, parent_id)
 
-    rows = _get_root_block_rows(root_id)
+    rows = _get_subtree_rows(block_id, root_id)
     children_index = _build_children_index(rows)
     subtree_ids = _collect_subtree_ids(block_id, children_index)
     subtree_set = set(subtree_ids)
@@ -508,6 +914,74 @@ def _move_block_group(
     return subtree_ids, operations
 
 
+def _move_group(
+    block_id: str,
+    previous_id: Optional[str],
+    parent_id: Optional[str],
+    metadata: Optional[Dict[str, Any]],
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """按逻辑块组移动（标题按分节范围，其它块按子树），返回 (移动的块 ID, 操作列表)。"""
+    previous_meta: Optional[Dict[str, Any]] = None
+    if previous_id:
+        previous_meta = _get_block_metadata(previous_id)
+        if not previous_meta:
+            raise ValueError(f"previous_id not found: {previous_id}")
+        if previous_meta.get("type") == "d":
+            raise ValueError(
+                "previous_id cannot be a document block (type='d'); "
+                + "Siyuan moveBlock may silently lose blocks in this case."
+            )
+
+    is_heading = bool(metadata and metadata.get("type") == "h")
+
+    if is_heading:
+        # 移动前按思源当前结构确定分节与落点，不使用可能落后于思源客户端编辑的块树索引
+        section_top_level_ids = _collect_heading_section_ids(block_id, use_index=False)
+        target_parent_id = parent_id
+        if not target_parent_id and metadata:
+            raw_parent_id = metadata.get("parent_id")
+            target_parent_id = (
+                raw_parent_id if isinstance(raw_parent_id, str) else ""
+            )
+        if not target_parent_id:
+            raise ValueError("parent_id could not be resolved for section move")
+
+        effective_previous_id = previous_id
+        if previous_id and previous_meta:
+            if previous_meta.get("type") == "h":
+                anchor_section_ids = _collect_heading_section_ids(
+                    previous_id, use_index=False
+                )
+                if anchor_section_ids:
+                    effective_previous_id = anchor_section_ids[-1]
+
+        if not effective_previous_id:
+            try:
+                parent_rows = _get_child_blocks_rows(target_parent_id, use_index=False)
+                parent_ids: List[str] = []
+                for row in parent_rows:
+                    row_id = row.get("id")
+                    if isinstance(row_id, str) and row_id:
+                        parent_ids.append(row_id)
+
+                for candidate_id in reversed(parent_ids):
+                    if candidate_id not in section_top_level_ids:
+                        effective_previous_id = candidate_id
+                        break
+            except Exception:
+                effective_previous_id = None
+
+        if effective_previous_id and effective_previous_id in section_top_level_ids:
+            raise ValueError(
+                "previous_id cannot point to a block inside the moving group"
+            )
+
+        return _move_section_group_after(
+            section_top_level_ids, effective_previous_id, target_parent_id
+        )
+    return _move_block_group(block_id, previous_id, parent_id)
+
+
 def _get_direct_children_ids(parent_id: str) -> List[str]:
     sanitized_parent_id = _sql_escape(parent_id)
     query = (
@@ -547,11 +1021,108 @@ def _restore_children(parent_id: str, child_ids: List[str]) -> List[Dict[str, An
     return operations
 
 
+def _list_notebooks() -> List[Dict[str, Any]]:
+    """读取笔记本列表（带 TTL 缓存，返回值请勿原地修改）。"""
+    hit, cached = _notebook_cache.get("all")
+    if hit:
+        return cached
+
+    result = _post_to_siyuan_api("/api/notebook/lsNotebooks")
+    if not isinstance(result, dict) or "notebooks" not in result:
+        raise TypeError(f"Expected a dict with 'notebooks' key, but got {type(result)}")
+    notebooks = result["notebooks"]
+    _notebook_cache.set("all", notebooks)
+    return notebooks
+
+
 # 创建 MCP 服务器实例
 mcp = FastMCP("siyuan-mcp-server")
 
+# 工具执行线程池：同步工具在工作线程中运行，事件循环只负责调度，
+# 一个耗时的 get_block_diffs 不会阻塞同时到达的 find_notebooks 等快速调用。
+_TOOL_MAX_CONCURRENCY = env_int("SIYUAN_MCP_MAX_CONCURRENCY", 8, minimum=1)
+_tool_executor = ThreadPoolExecutor(
+    max_workers=_TOOL_MAX_CONCURRENCY, thread_name_prefix="siyuan-tool"
+)
+
+# get_blocks_content 等批量读取工具的默认并发请求数
+_FETCH_CONCURRENCY = env_int("SIYUAN_MCP_FETCH_CONCURRENCY", 8, minimum=1)
+
+# get_file / get_history_file 的默认读取上限与流式读取块大小
+_MAX_FILE_BYTES = env_int("SIYUAN_MCP_MAX_FILE_BYTES", 16 * 1024 * 1024, minimum=1)
+_FILE_CHUNK_SIZE = 64 * 1024
+
+# create_documents 的默认并发创建数、单次导入上限、进度通知间隔与目录导入识别的后缀
+_IMPORT_CONCURRENCY = env_int("SIYUAN_MCP_IMPORT_CONCURRENCY", 4, minimum=1)
+_IMPORT_MAX_DOCUMENTS = 10000
+_IMPORT_PROGRESS_EVERY = 200
+_MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+
+def _tool(**kwargs: Any) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """注册 MCP 工具（替代 @mcp.tool()）。
+
+    MCP 侧注册的是异步包装：调用时把同步实现提交到工具线程池并 await 结果，
+    多个工具调用可以并发执行。模块内仍保留同步函数，供其他工具直接调用。
+
+    每次调用都在独立的查询上下文中执行：同一次调用内重复的元数据、kramdown、
+    子块查询只发一次，并按工具统计后端请求数（见 get_server_stats）。
+    """
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def run_in_scope(*args: Any, **kw: Any) -> Any:
+            with request_scope(fn.__name__):
+                return fn(*args, **kw)
+
+        @functools.wraps(run_in_scope)
+        async def run_in_worker(*args: Any, **kw: Any) -> Any:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _tool_executor, functools.partial(run_in_scope, *args, **kw)
+            )
+
+        mcp.add_tool(run_in_worker, **kwargs)
+        return run_in_scope
+
+    return decorator
+
+
+def _validate_page_size(page_size: Any, name: str = "limit") -> int:
+    if isinstance(page_size, bool) or not isinstance(page_size, int) or page_size <= 0:
+        raise ValueError(f"{name} must be a positive integer")
+    return page_size
+
+
+def _keyset_page(
+    select_sql: str,
+    keyset: str,
+    fingerprint: str,
+    cursor: Optional[str],
+    page_size: int,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """按 keyset 翻页执行查询：把 select_sql 包成子查询，从游标位置之后取 page_size 行。
+
+    select_sql 不能带 ORDER BY / LIMIT，且结果中必须包含 keyset 对应的列。
+    返回 (本页行, 下一页游标)，没有下一页时游标为 None。
+    """
+    columns = KEYSETS[keyset]
+    condition = ""
+    if cursor is not None:
+        values = decode_cursor(cursor, fingerprint, len(columns))
+        condition = f" WHERE {keyset_condition(columns, values, 'page')}"
+    stmt = (
+        f"SELECT * FROM ({select_sql}) AS page{condition} "
+        f"ORDER BY {order_clause(columns, 'page')} LIMIT {page_size + 1}"
+    )
+    rows = _post_to_siyuan_api("/api/query/sql", {"stmt": stmt})
+    if not isinstance(rows, list):
+        raise TypeError(f"Expected a list from SQL query, but got {type(rows)}")
+    # 游标取自打码前的原始行
+    return rows, next_cursor(rows, page_size, columns, fingerprint)
+
 
-@mcp.tool()
+@_tool()
 def find_notebooks(name: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
     """查找并列出思源笔记中的笔记本。
 
@@ -574,10 +1145,7 @@ def find_notebooks(name: Optional[str] = None, limit: int = 10) -> List[Dict[str
     Returns:
         list: 包含笔记本信息的字典列表，每个字典包含 'name' 和 'id'。
     """
-    result = _post_to_siyuan_api("/api/notebook/lsNotebooks")
-    if not isinstance(result, dict) or "notebooks" not in result:
-        raise TypeError(f"Expected a dict with 'notebooks' key, but got {type(result)}")
-    notebooks = result["notebooks"]
+    notebooks = [dict(nb) if isinstance(nb, dict) else nb for nb in _list_notebooks()]
 
     # 如果指定了名称，则进行过滤
     if name:
@@ -589,14 +1157,16 @@ def find_notebooks(name: Optional[str] = None, limit: int = 10) -> List[Dict[str
     return notebooks[:limit]
 
 
-@mcp.tool()
+@_tool()
 def find_documents(
     notebook_id: Optional[str] = None,
     title: Optional[str] = None,
     created_after: Optional[str] = None,
     updated_after: Optional[str] = None,
     limit: int = 10,
-) -> List[Dict[str, Any]]:
+    cursor: Optional[str] = None,
+    paginate: bool = False,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """在指定的笔记本中查找文档，支持多种过滤条件。
 
     适用场景:
@@ -606,22 +1176,32 @@ def find_documents(
         - notebook_id: 指定笔记本范围。
         - title: 对文档名称字段做 LIKE 模糊匹配。
         - created_after / updated_after: 传入 YYYYMMDDHHMMSS。
+        - paginate=true 时按 (updated, id) 倒序分页，limit 为每页条数，返回
+          {"items": [...], "next_cursor": ...}；把 next_cursor 原样传回 cursor 取下一页，
+          为 null 表示已到末页。传入 cursor 时自动按分页模式返回。
 
     注意事项:
         - 本工具按 blocks.name 过滤标题，不按 hpath 过滤。
         - 若需要更复杂条件（例如按 hpath 前缀），请使用 execute_sql。
+        - 游标与查询条件绑定，条件变化后需从第一页重新开始。
 
     Args:
         notebook_id (Optional[str]): 在哪个笔记本中查找。如果省略，则在所有打开的笔记本中查找。
         title (Optional[str]): 根据文档标题进行模糊匹配。
         created_after (Optional[str]): 查找在此日期之后创建的文档，格式为 'YYYYMMDDHHMMSS'。
         updated_after (Optional[str]): 查找在此日期之后更新的文档，格式为 'YYYYMMDDHHMMSS'。
-        limit (int): 返回结果的最大数量，默认为 10。
+        limit (int): 返回结果的最大数量（分页时为每页条数），默认为 10。
+        cursor (Optional[str]): 上一页返回的 next_cursor。
+        paginate (bool): 是否以分页结构返回，默认 false。
 
     Returns:
-        list: 包含文档信息的字典列表，每个字典包含 'name', 'id', 和 'hpath'。
+        list: 包含文档信息的字典列表，每个字典包含 'name', 'id', 和 'hpath'；
+            分页模式下为 {"items": [...], "next_cursor": ...}，条目额外包含 'updated'。
     """
+    paginated = paginate or cursor is not None
     query = "SELECT name, id, hpath FROM blocks WHERE type = 'd'"
+    if paginated:
+        query = "SELECT name, id, hpath, updated FROM blocks WHERE type = 'd'"
     conditions = []
     if notebook_id:
         sanitized_id = notebook_id.replace("'", "''")
@@ -637,6 +1217,20 @@ def find_documents(
         conditions.append(f"updated > '{sanitized_date}'")
     if conditions:
         query += " AND " + " AND ".join(conditions)
+    if paginated:
+        fingerprint = query_fingerprint(
+            "find_documents",
+            {
+                "notebook_id": notebook_id,
+                "title": title,
+                "created_after": created_after,
+                "updated_after": updated_after,
+            },
+        )
+        items, cursor_out = _keyset_page(
+            query, "updated", fingerprint, cursor, _validate_page_size(limit)
+        )
+        return {"items": items, "next_cursor": cursor_out}
     query += f" LIMIT {limit}"
 
     # 验证 SQL 只包含 SELECT 语句
@@ -649,7 +1243,129 @@ def find_documents(
     return result
 
 
-@mcp.tool()
+# 可选的本地全文索引（SQLite FTS5 旁路库），由 SIYUAN_MCP_SEARCH_INDEX 开启
+_SEARCH_INDEX_ENABLED = env_bool("SIYUAN_MCP_SEARCH_INDEX", False)
+_SEARCH_INDEX_REFRESH = env_float("SIYUAN_MCP_SEARCH_INDEX_REFRESH", 5.0, allow_zero=True)
+# trigram 分词至少需要 3 个字符，更短的关键词走 LIKE
+_SEARCH_INDEX_MIN_QUERY_CHARS = 3
+_search_index: Optional[SearchIndex] = None
+_search_index_lock = threading.Lock()
+
+
+def _get_search_index() -> Optional[SearchIndex]:
+    """首次使用时创建索引；文件名包含思源地址的哈希，不同实例互不混用。"""
+    global _search_index
+    if not _SEARCH_INDEX_ENABLED:
+        return None
+    with _search_index_lock:
+        if _search_index is None:
+            base_url = get_transport().config.base_url
+            digest = hashlib.sha1(base_url.encode("utf-8")).hexdigest()[:12]
+            _search_index = SearchIndex(
+                os.path.join(
+                    os.getenv("SIYUAN_MCP_CACHE_DIR") or default_cache_dir(),
+                    f"search-index-{digest}.sqlite3",
+                ),
+                lambda stmt: _post_to_siyuan_api("/api/query/sql", {"stmt": stmt}),
+                _SEARCH_INDEX_REFRESH,
+            )
+        return _search_index
+
+
+def _sql_filters(filters: Dict[str, Any]) -> str:
+    """把 search_blocks 的过滤条件拼成 " AND ..." 片段（值已转义）。"""
+    sql = ""
+    for key, column, op in (
+        ("parent_id", "parent_id", "="),
+        ("root_id", "root_id", "="),
+        ("type", "type", "="),
+        ("created_after", "created", ">"),
+        ("updated_after", "updated", ">"),
+    ):
+        value = filters.get(key)
+        if value:
+            sanitized = str(value).replace("'", "''")
+            sql += f" AND {column} {op} '{sanitized}'"
+    return sql
+
+
+def _resolve_search_scope(scope_id: str) -> Tuple[str, Optional[str]]:
+    """返回搜索范围的 (root_id, 子树条件)。
+
+    文档只需 root_id 条件（走 root_id 索引）；其他块返回一个递归 CTE 子查询条件，
+    从块自身（标题块为其整个分节）出发沿 parent_id 向下展开，并限定在同一文档内。
+    """
+    if not isinstance(scope_id, str) or not scope_id.strip():
+        raise ValueError("scope_id must be a non-empty string")
+    metadata = _get_block_metadata(scope_id)
+    if not metadata:
+        raise ValueError(f"scope_id not found: {scope_id}")
+    root_id = metadata.get("root_id") or scope_id
+    if metadata.get("type") == "d":
+        return root_id, None
+    seed_ids = _collect_heading_section_ids(scope_id)
+    seeds = ", ".join(f"'{_sql_escape(seed_id)}'" for seed_id in seed_ids)
+    sanitized_root_id = _sql_escape(root_id)
+    subtree = (
+        "WITH RECURSIVE scope(id) AS ("
+        f"SELECT id FROM blocks WHERE id IN ({seeds}) "
+        "UNION ALL "
+        "SELECT b.id FROM blocks b JOIN scope s ON b.parent_id = s.id "
+        f"WHERE b.root_id = '{sanitized_root_id}'"
+        ") SELECT id FROM scope"
+    )
+    return root_id, subtree
+
+
+def _search_with_index(
+    index: SearchIndex,
+    match: str,
+    like: Optional[str],
+    filters: Dict[str, Any],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """在本地索引中按 BM25 取候选，再回思源按 ID 取最新内容并复核条件。
+
+    索引可能落后于思源（删除的块、刷新间隔内的修改），复核不通过的候选被丢弃，
+    思源中已不存在的块同时从索引中删除；候选不足时继续向后取。
+    """
+    index.sync()
+    batch = max(limit * 2, 50)
+    results: List[Dict[str, Any]] = []
+    offset = 0
+    while len(results) < limit:
+        candidates = index.search(match, filters, batch, offset)
+        if not candidates:
+            break
+        id_list = ", ".join("'" + block_id.replace("'", "''") + "'" for block_id in candidates)
+        stmt = f"SELECT id, content, type, subtype, hpath FROM blocks WHERE id IN ({id_list})"
+        if like is not None:
+            stmt += " AND content LIKE '" + f"%{like}%".replace("'", "''") + "'"
+        # 思源 SQL 不带 LIMIT 时最多返回 64 行
+        stmt += _sql_filters(filters) + f" LIMIT {len(candidates)}"
+        rows = _post_to_siyuan_api("/api/query/sql", {"stmt": stmt})
+        if not isinstance(rows, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(rows)}")
+        by_id = {row["id"]: row for row in rows if isinstance(row, dict) and "id" in row}
+        results.extend(by_id[block_id] for block_id in candidates if block_id in by_id)
+        if len(by_id) < len(candidates):
+            # 不满足条件的候选可能只是内容已变化，仅在思源中确实不存在时才删除
+            missing = [block_id for block_id in candidates if block_id not in by_id]
+            id_list = ", ".join("'" + block_id.replace("'", "''") + "'" for block_id in missing)
+            existing = _post_to_siyuan_api(
+                "/api/query/sql",
+                {"stmt": f"SELECT id FROM blocks WHERE id IN ({id_list}) LIMIT {len(missing)}"},
+            )
+            existing_ids = {row.get("id") for row in existing or [] if isinstance(row, dict)}
+            # 删除的条目不再占用索引中的位置，下一批的偏移相应减少
+            offset -= index.remove([block_id for block_id in missing if block_id not in existing_ids])
+        if len(candidates) < batch:
+            break
+        offset += batch
+    return results[:limit]
+
+
+@_tool()
 def search_blocks(
     query: str,
     parent_id: Optional[str] = None,
@@ -657,7 +1373,11 @@ def search_blocks(
     created_after: Optional[str] = None,
     updated_after: Optional[str] = None,
     limit: int = 20,
-) -> List[Dict[str, Any]]:
+    cursor: Optional[str] = None,
+    paginate: bool = False,
+    fts: bool = False,
+    scope_id: Optional[str] = None,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """根据关键词、类型等多种条件在思源笔记中搜索内容块。
 
     这是最核心和最灵活的查询工具。
@@ -669,26 +1389,109 @@ def search_blocks(
     使用方法:
         - query: 使用 SQL LIKE 语义匹配 content。
         - parent_id: 按直接父块 ID 过滤。
+        - scope_id: 只搜索该块及其全部后代，例如整篇文档、整个标题分节（标题及其下方直到
+          同级或更高级标题之前的所有块）或嵌套列表；一次查询完成，无需逐个子块调用。
         - block_type: 例如 p/h/l。
+        - paginate=true 时按 (updated, id) 倒序分页，limit 为每页条数，返回
+          {"items": [...], "next_cursor": ...}；把 next_cursor 原样传回 cursor 取下一页。
+        - 开启本地全文索引（SIYUAN_MCP_SEARCH_INDEX）后，非分页且 query 不少于 3 个字符的
+          搜索走索引，匹配语义不变，结果按 BM25 相关度排序。
+        - fts=true 时 query 为 FTS5 查询语法（需开启索引），例如 '"完整短语"'、'前缀*'、
+          'a AND b'、'a OR b'、'NEAR(a b, 5)'；每个词至少 3 个字符。
 
     注意事项:
-        - parent_id 仅匹配直接子块，不会递归后代。
+        - parent_id 仅匹配直接子块，不会递归后代；需要递归时使用 scope_id。
         - 返回 content 会做敏感信息打码处理。
+        - 索引按 updated 增量同步，最多落后 SIYUAN_MCP_SEARCH_INDEX_REFRESH 秒；
+          命中结果会回思源复核，返回的内容总是最新的。
 
     Args:
         query (str): 在块内容中搜索的关键词。
         parent_id (Optional[str]): 在哪个文档或父块下进行搜索。如果省略，则全局搜索。
+        scope_id (Optional[str]): 限定搜索范围的块 ID（含自身与全部后代）。
         block_type (Optional[str]): 限制块的类型，例如 'p' (段落), 'h' (标题), 'l' (列表)。
         created_after (Optional[str]): 查找在此日期之后创建的块，格式为 'YYYYMMDDHHMMSS'。
         updated_after (Optional[str]): 查找在此日期之后更新的块，格式为 'YYYYMMDDHHMMSS'。
-        limit (int): 返回结果的最大数量，默认为 20。
+        limit (int): 返回结果的最大数量（分页时为每页条数），默认为 20。
+        cursor (Optional[str]): 上一页返回的 next_cursor。
+        paginate (bool): 是否以分页结构返回，默认 false。
+        fts (bool): query 是否为 FTS5 查询语法，默认 false。
 
     Returns:
-        list: 包含块信息的字典列表。
+        list: 包含块信息的字典列表；分页模式下为 {"items": [...], "next_cursor": ...}，
+            条目额外包含 'updated'。
     """
+    paginated = paginate or cursor is not None
+    index = None if paginated else _get_search_index()
+    if fts and index is None:
+        raise ValueError(
+            "fts=true requires the local search index (SIYUAN_MCP_SEARCH_INDEX=true) "
+            "and cannot be combined with pagination"
+        )
+    if index is not None and not index.ensure_ready():
+        # 首次构建在后台进行或索引无法打开，普通搜索仍走 LIKE
+        if fts:
+            detail = f" (last error: {index.last_error})" if index.last_error else ""
+            raise ValueError(f"The local search index is not ready; retry later{detail}")
+        index = None
+    scope_root_id, scope_subtree = (
+        _resolve_search_scope(scope_id) if scope_id is not None else (None, None)
+    )
+    # LIKE 中的 % 与 _ 是通配符，而 FTS 短语按字面匹配；含这两个字符的普通查询走 LIKE，保持匹配语义
+    use_index = index is not None and (
+        fts
+        or (
+            len(query) >= _SEARCH_INDEX_MIN_QUERY_CHARS
+            and "%" not in query
+            and "_" not in query
+        )
+    )
+    filters: Dict[str, Any] = {
+        "parent_id": parent_id,
+        "root_id": scope_root_id,
+        "type": block_type,
+        "created_after": created_after,
+        "updated_after": updated_after,
+    }
+    if use_index and scope_subtree is not None:
+        scope_rows = _post_to_siyuan_api(
+            "/api/query/sql", {"stmt": f"{scope_subtree} LIMIT {_STRUCTURE_ROW_LIMIT}"}
+        )
+        if not isinstance(scope_rows, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(scope_rows)}")
+        if len(scope_rows) >= _STRUCTURE_ROW_LIMIT:
+            # 子树达到结构查询上限，ID 列表可能不完整，改由 LIKE 查询在思源侧限定子树
+            if fts:
+                raise ValueError(
+                    f"scope_id covers {_STRUCTURE_ROW_LIMIT}+ blocks, too many for fts=true; "
+                    "narrow the scope or search without fts"
+                )
+            use_index = False
+        else:
+            filters["ids"] = [
+                row["id"] for row in scope_rows if isinstance(row, dict) and "id" in row
+            ]
+    if use_index:
+        results = _search_with_index(
+            index,
+            query if fts else fts_phrase(query),
+            None if fts else query,
+            filters,
+            limit,
+        )
+        for result in results:
+            if "content" in result:
+                result["content"] = mask_sensitive_data(result["content"])
+        return results
+
     sql_query = (
         "SELECT id, content, type, subtype, hpath FROM blocks WHERE content LIKE ?"
     )
+    if paginated:
+        sql_query = (
+            "SELECT id, content, type, subtype, hpath, updated FROM blocks "
+            "WHERE content LIKE ?"
+        )
     params = [f"%{query}%"]
     if parent_id:
         sql_query += " AND parent_id = ?"
@@ -702,20 +1505,44 @@ def search_blocks(
     if updated_after:
         sql_query += " AND updated > ?"
         params.append(updated_after)
-    sql_query += f" LIMIT {limit}"
+    if scope_root_id:
+        sql_query += " AND root_id = ?"
+        params.append(scope_root_id)
 
     # 替换参数占位符为实际值
     for param in params:
         sanitized_param = str(param).replace("'", "''")
         sql_query = sql_query.replace("?", f"'{sanitized_param}'", 1)
+    # 子树条件中的值已转义，在占位符替换之后拼接
+    if scope_subtree is not None:
+        sql_query += f" AND id IN ({scope_subtree})"
+    if not paginated:
+        sql_query += f" LIMIT {limit}"
 
     # 验证 SQL 只包含 SELECT 语句
     if not sql_query.strip().upper().startswith("SELECT"):
         raise ValueError("Only SELECT statements are allowed for security reasons.")
 
-    results = _post_to_siyuan_api("/api/query/sql", {"stmt": sql_query})
-    if not isinstance(results, list):
-        raise TypeError(f"Expected a list from SQL query, but got {type(results)}")
+    cursor_out = None
+    if paginated:
+        fingerprint = query_fingerprint(
+            "search_blocks",
+            {
+                "query": query,
+                "parent_id": parent_id,
+                "block_type": block_type,
+                "created_after": created_after,
+                "updated_after": updated_after,
+                "scope_id": scope_id,
+            },
+        )
+        results, cursor_out = _keyset_page(
+            sql_query, "updated", fingerprint, cursor, _validate_page_size(limit)
+        )
+    else:
+        results = _post_to_siyuan_api("/api/query/sql", {"stmt": sql_query})
+        if not isinstance(results, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(results)}")
 
     # 对搜索结果中的内容进行打码处理
     for result in results:
@@ -723,10 +1550,12 @@ def search_blocks(
             if "content" in result:
                 result["content"] = mask_sensitive_data(result["content"])
 
+    if paginated:
+        return {"items": results, "next_cursor": cursor_out}
     return results
 
 
-@mcp.tool()
+@_tool()
 def get_block_content(block_id: str) -> Dict[str, Any]:
     """获取指定块的完整 Markdown 内容。
 
@@ -743,7 +1572,7 @@ def get_block_content(block_id: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: 包含块内容的字典
     """
-    result = _post_to_siyuan_api("/api/block/getBlockKramdown", {"id": block_id})
+    result = _fetch_block_kramdown(block_id)
     if not isinstance(result, dict):
         raise TypeError(f"Expected a dict for block content, but got {type(result)}")
     # 对 kramdown 字段进行智能敏感信息打码，保留思源属性中的ID
@@ -752,45 +1581,80 @@ def get_block_content(block_id: str) -> Dict[str, Any]:
     return result
 
 
-@mcp.tool()
-def get_blocks_content(block_ids: List[str]) -> List[Dict[str, Any]]:
+@_tool()
+def get_blocks_content(
+    block_ids: List[str], concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
     """批量获取多个块的完整内容。
 
     适用场景:
         - 一次性拉取多个块内容，减少多次调用开销。
 
+    使用方法:
+        - concurrency: 并发请求上限，默认取 SIYUAN_MCP_FETCH_CONCURRENCY（8）。
+
     注意事项:
         - 单个块失败不会中断整体，失败项会返回 error 字段。
         - 返回的 kramdown 与 get_block_content 一样会做敏感信息打码。
+        - 结果顺序与 block_ids 一致。
 
     Args:
         block_ids (List[str]): 块 ID 列表
+        concurrency (Optional[int]): 并发请求上限，需为正整数。
 
     Returns:
         List[Dict[str, Any]]: 包含每个块内容的字典列表
     """
-    results = []
-    for block_id in block_ids:
-        try:
-            result = _post_to_siyuan_api(
-                "/api/block/getBlockKramdown", {"id": block_id}
-            )
-            if isinstance(result, dict):
-                # 对 kramdown 字段进行智能敏感信息打码，保留思源属性中的ID
-                if "kramdown" in result and isinstance(result["kramdown"], str):
-                    result["kramdown"] = parse_and_mask_kramdown(result["kramdown"])
-                results.append(result)
-            else:
-                results.append(
-                    {"id": block_id, "error": f"Unexpected type: {type(result)}"}
-                )
-        except Exception as e:
-            results.append({"id": block_id, "error": str(e)})
+    if concurrency is None:
+        concurrency = _FETCH_CONCURRENCY
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency <= 0:
+        raise ValueError("concurrency must be a positive integer")
+
+    results: List[Dict[str, Any]] = [{} for _ in block_ids]
+    if not block_ids:
+        return results
+
+    # 工作线程只负责网络请求；打码在调用线程中按完成顺序进行，
+    # 与仍在等待中的请求重叠执行。
+    with ThreadPoolExecutor(
+        max_workers=min(concurrency, len(block_ids)),
+        thread_name_prefix="siyuan-fetch",
+    ) as executor:
+        # 每个任务带上当前上下文的副本，使后台请求计入本次工具调用的统计
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, _fetch_block_kramdown, block_id
+            ): index
+            for index, block_id in enumerate(block_ids)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            block_id = block_ids[index]
+            try:
+                result = future.result()
+                if isinstance(result, dict):
+                    # 对 kramdown 字段进行智能敏感信息打码，保留思源属性中的ID
+                    if "kramdown" in result and isinstance(result["kramdown"], str):
+                        result["kramdown"] = parse_and_mask_kramdown(result["kramdown"])
+                    results[index] = result
+                else:
+                    results[index] = {
+                        "id": block_id,
+                        "error": f"Unexpected type: {type(result)}",
+                    }
+            except Exception as e:
+                results[index] = {"id": block_id, "error": str(e)}
     return results
 
 
-@mcp.tool()
-def execute_sql(query: str) -> List[Dict[str, Any]]:
+@_tool()
+def execute_sql(
+    query: str,
+    cursor: Optional[str] = None,
+    paginate: bool = False,
+    page_size: int = 100,
+    order_key: str = "updated",
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     """直接对数据库执行只读的 SELECT 查询。
 
     适用场景:
@@ -800,16 +1664,28 @@ def execute_sql(query: str) -> List[Dict[str, Any]]:
     使用方法:
         - 仅支持 SELECT 语句。
         - 建议显式 LIMIT，避免一次返回过多数据。
+        - 大结果集请用 paginate=true 分页：原查询被包成子查询，按 order_key 做 keyset 翻页，
+          每页 page_size 行，返回 {"items": [...], "next_cursor": ...}；
+          把 next_cursor 原样传回 cursor 取下一页，为 null 表示已到末页。
+        - order_key: "updated" 按 (updated, id) 倒序；"sort" 按 (sort, id) 正序；
+          "id" 按 id 正序。查询结果必须包含对应的列。
 
     注意事项:
         - 返回的字符串字段会进行敏感信息打码。
+        - 结构字段（id/root_id/parent_id/box/created/updated/path 等）形态符合
+          块 ID、时间戳、.sy 路径时原样返回，可直接用于后续调用；ial 中的 ID 和时间戳同样保留。
         - 如需精确审计原始敏感字段值，不适合使用该工具。
+        - 分页时原查询不应再带 ORDER BY / LIMIT（子查询内的 LIMIT 会限制总行数）。
 
     Args:
         query (str): SQL SELECT 查询语句
+        cursor (Optional[str]): 上一页返回的 next_cursor。
+        paginate (bool): 是否分页返回，默认 false；传入 cursor 时自动分页。
+        page_size (int): 分页时每页行数，默认 100。
+        order_key (str): 分页排序键，可选 "updated" / "sort" / "id"，默认 "updated"。
 
     Returns:
-        List[Dict[str, Any]]: 查询结果列表
+        List[Dict[str, Any]]: 查询结果列表；分页模式下为 {"items": [...], "next_cursor": ...}
 
     Raises:
         ValueError: 如果查询不是 SELECT 语句
@@ -817,21 +1693,154 @@ def execute_sql(query: str) -> List[Dict[str, Any]]:
     if not query.strip().upper().startswith("SELECT"):
         raise ValueError("Only SELECT statements are allowed for security reasons.")
 
-    result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
-    if not isinstance(result, list):
-        raise TypeError(f"Expected a list from SQL query, but got {type(result)}")
+    cursor_out = None
+    paginated = paginate or cursor is not None
+    if paginated:
+        if order_key not in KEYSETS:
+            raise ValueError(f"order_key must be one of {sorted(KEYSETS)}")
+        inner = query.strip().rstrip(";").strip()
+        fingerprint = query_fingerprint(
+            "execute_sql", {"query": inner, "order_key": order_key}
+        )
+        result, cursor_out = _keyset_page(
+            inner,
+            order_key,
+            fingerprint,
+            cursor,
+            _validate_page_size(page_size, "page_size"),
+        )
+    else:
+        result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
+        if not isinstance(result, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(result)}")
 
-    # 对查询结果进行打码处理
+    # 对查询结果进行打码处理（结构字段形态匹配时保留原值）
     for row in result:
         if isinstance(row, dict):
-            for key, value in row.items():
-                if isinstance(value, str):
-                    row[key] = mask_sensitive_data(value)
+            mask_sql_row(row)
+
+    if paginated:
+        return {"items": result, "next_cursor": cursor_out}
+    return result
+
+
+_EXPORT_DIR = os.getenv("SIYUAN_MCP_EXPORT_DIR") or default_export_dir()
+_EXPORT_MAX_PAGE_SIZE = 10000
+
+
+@_tool()
+def export_query(
+    query: str,
+    file_name: str,
+    page_size: int = 1000,
+    order_key: str = "updated",
+    parquet: bool = False,
+    overwrite: bool = False,
+    max_rows: Optional[int] = None,
+) -> Dict[str, Any]:
+    """把只读 SELECT 查询的结果分页导出到本地文件，只返回文件路径、行数和列信息。
+
+    适用场景:
+        - 分析类任务需要大批量 blocks 数据，但不希望结果经过 MCP 消息返回。
+
+    使用方法:
+        - 查询按 order_key 做 keyset 分页（与 execute_sql 分页相同），逐页打码后追加写入
+          SIYUAN_MCP_EXPORT_DIR 下的 <file_name>.ndjson（每行一个 JSON 对象），内存占用与页大小相关。
+        - parquet=true 时另外生成同名 .parquet 列式文件（需要安装 pyarrow）。
+        - 完成后推送一条通知。
+
+    注意事项:
+        - 打码规则与 execute_sql 相同。
+        - 查询结果必须包含 order_key 对应的列（默认 updated 与 id），且不应带 ORDER BY / LIMIT。
+        - file_name 只能是文件名，不能包含目录；目标文件已存在时默认报错，overwrite=true 才覆盖。
+        - 文件先写入临时文件，完成后再改名，失败不会留下不完整的导出文件。
+
+    Args:
+        query (str): SQL SELECT 查询语句。
+        file_name (str): 导出文件名（可省略 .ndjson 后缀）。
+        page_size (int): 每页行数，默认 1000，最大 10000。
+        order_key (str): 分页排序键，可选 "updated" / "sort" / "id"，默认 "updated"。
+        parquet (bool): 是否同时导出 Parquet 文件，默认 false。
+        overwrite (bool): 是否覆盖已存在的文件，默认 false。
+        max_rows (Optional[int]): 最多导出的行数，默认不限制。
+
+    Returns:
+        Dict[str, Any]: path、row_count、pages、schema（列名 → 类型），
+            导出 Parquet 时含 parquet_path，达到 max_rows 截断时含 truncated=True。
+    """
+    if not query.strip().upper().startswith("SELECT"):
+        raise ValueError("Only SELECT statements are allowed for security reasons.")
+    if order_key not in KEYSETS:
+        raise ValueError(f"order_key must be one of {sorted(KEYSETS)}")
+    _validate_page_size(page_size, "page_size")
+    if page_size > _EXPORT_MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must not exceed {_EXPORT_MAX_PAGE_SIZE}")
+    if max_rows is not None:
+        _validate_page_size(max_rows, "max_rows")
+    validate_file_name(file_name)
+    if parquet:
+        # 先确认 pyarrow 可用，避免整个查询导出完才发现无法生成 Parquet
+        require_pyarrow()
+
+    base_name = file_name[: -len(".ndjson")] if file_name.endswith(".ndjson") else file_name
+    ndjson_path = resolve_export_path(_EXPORT_DIR, base_name, ".ndjson", overwrite)
+    parquet_path = (
+        resolve_export_path(_EXPORT_DIR, base_name, ".parquet", overwrite) if parquet else None
+    )
+
+    inner = query.strip().rstrip(";").strip()
+    fingerprint = query_fingerprint("export_query", {"query": inner, "order_key": order_key})
+    schema = SchemaTracker()
+    row_count = 0
+    pages = 0
+    truncated = False
+    cursor: Optional[str] = None
+    try:
+        with atomic_path(ndjson_path) as tmp_path, open(
+            tmp_path, "w", encoding="utf-8", newline="\n"
+        ) as output:
+            while True:
+                size = page_size if max_rows is None else min(page_size, max_rows - row_count)
+                rows, cursor = _keyset_page(inner, order_key, fingerprint, cursor, size)
+                pages += 1
+                rows = [mask_sql_row(row) for row in rows if isinstance(row, dict)]
+                for row in rows:
+                    schema.observe(row)
+                row_count += write_ndjson_rows(output, rows)
+                if cursor is None:
+                    break
+                if max_rows is not None and row_count >= max_rows:
+                    truncated = True
+                    break
+
+        columns = schema.columns()
+        if parquet_path is not None:
+            try:
+                ndjson_to_parquet(ndjson_path, parquet_path, columns, page_size)
+            except BaseException:
+                # 整体失败时不留下半套结果，重试无需 overwrite
+                os.unlink(ndjson_path)
+                raise
+    except Exception as e:
+        _push_error_message("导出查询结果失败", _humanize_error(e))
+        raise
 
+    _push_message("导出查询结果", f"已导出 {row_count} 行到 {ndjson_path}")
+
+    result: Dict[str, Any] = {
+        "path": ndjson_path,
+        "row_count": row_count,
+        "pages": pages,
+        "schema": columns,
+    }
+    if parquet_path is not None:
+        result["parquet_path"] = parquet_path
+    if truncated:
+        result["truncated"] = True
     return result
 
 
-@mcp.tool()
+@_tool()
 def push_message(msg: str, timeout: int = 7000) -> Dict[str, Any]:
     """推送前台消息。
 
@@ -852,7 +1861,7 @@ def push_message(msg: str, timeout: int = 7000) -> Dict[str, Any]:
     return _push_notification("/api/notification/pushMsg", msg, timeout)
 
 
-@mcp.tool()
+@_tool()
 def push_error_message(msg: str, timeout: int = 7000) -> Dict[str, Any]:
     """推送前台错误消息。
 
@@ -873,7 +1882,7 @@ def push_error_message(msg: str, timeout: int = 7000) -> Dict[str, Any]:
     return _push_notification("/api/notification/pushErrMsg", msg, timeout)
 
 
-@mcp.tool()
+@_tool()
 def create_document(notebook_id: str, path: str, markdown: str) -> str:
     """通过 Markdown 创建文档。
 
@@ -914,9 +1923,248 @@ def create_document(notebook_id: str, path: str, markdown: str) -> str:
         raise
 
 
-@mcp.tool()
+def _normalize_hpath(path: str) -> str:
+    parts = [part.strip() for part in path.split("/") if part.strip()]
+    if not parts:
+        raise ValueError(f"invalid document path: {path!r}")
+    return "/" + "/".join(parts)
+
+
+def _collect_import_sources(
+    documents: Optional[List[Dict[str, Any]]],
+    source_dir: Optional[str],
+    target_path: str,
+) -> List[Tuple[str, Callable[[], str]]]:
+    """整理待导入文档为 (hpath, 读取 Markdown 的函数)；目录中的文件在创建时才读取。"""
+    if (documents is None) == (source_dir is None):
+        raise ValueError("Provide exactly one of documents or source_dir")
+    if not isinstance(target_path, str) or not target_path.startswith("/"):
+        raise ValueError("target_path must start with '/'")
+    prefix = target_path.rstrip("/")
+
+    sources: List[Tuple[str, Callable[[], str]]] = []
+    if documents is not None:
+        if not isinstance(documents, list):
+            raise ValueError("documents must be a list")
+        for index, doc in enumerate(documents):
+            if not isinstance(doc, dict):
+                raise ValueError(f"documents[{index}] must be an object")
+            path = doc.get("path")
+            markdown = doc.get("markdown", "")
+            if not isinstance(path, str) or not path.strip():
+                raise ValueError(f"documents[{index}].path must be a non-empty string")
+            if not isinstance(markdown, str):
+                raise ValueError(f"documents[{index}].markdown must be a string")
+            hpath = _normalize_hpath(f"{prefix}/{path}")
+            sources.append((hpath, lambda markdown=markdown: markdown))
+    else:
+        if not isinstance(source_dir, str) or not os.path.isdir(source_dir):
+            raise ValueError(f"source_dir is not a directory: {source_dir!r}")
+        for dirpath, dirnames, filenames in os.walk(source_dir):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                stem, suffix = os.path.splitext(filename)
+                if suffix.lower() not in _MARKDOWN_SUFFIXES:
+                    continue
+                file_path = os.path.join(dirpath, filename)
+                relative_dir = os.path.relpath(dirpath, source_dir).replace(os.sep, "/")
+                relative = stem if relative_dir == "." else f"{relative_dir}/{stem}"
+                hpath = _normalize_hpath(f"{prefix}/{relative}")
+                sources.append((hpath, functools.partial(_read_local_markdown, file_path)))
+
+    if len(sources) > _IMPORT_MAX_DOCUMENTS:
+        raise ValueError(f"create_documents supports at most {_IMPORT_MAX_DOCUMENTS} documents")
+    return sources
+
+
+def _read_local_markdown(file_path: str) -> str:
+    with open(file_path, "r", encoding="utf-8-sig") as f:
+        return f.read()
+
+
+def _find_existing_doc_ids(notebook_id: str, hpaths: List[str]) -> Dict[str, str]:
+    """用 hpath IN (...) 查询笔记本中已存在的文档，返回 hpath -> 文档 ID。"""
+    existing: Dict[str, str] = {}
+    sanitized_box = _sql_escape(notebook_id)
+    for start in range(0, len(hpaths), _METADATA_BATCH_SIZE):
+        chunk = hpaths[start : start + _METADATA_BATCH_SIZE]
+        path_list = ", ".join(f"'{_sql_escape(hpath)}'" for hpath in chunk)
+        query = (
+            "SELECT hpath, id FROM blocks WHERE type = 'd' "
+            f"AND box = '{sanitized_box}' AND hpath IN ({path_list}) "
+            f"LIMIT {len(chunk) * 4}"
+        )
+        result = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
+        if not isinstance(result, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(result)}")
+        for row in result:
+            if isinstance(row, dict) and isinstance(row.get("hpath"), str):
+                existing.setdefault(row["hpath"], str(row.get("id", "")))
+    return existing
+
+
+def _create_doc_with_md(notebook_id: str, hpath: str, markdown: str) -> str:
+    result = _post_to_siyuan_api(
+        "/api/filetree/createDocWithMd",
+        {"notebook": notebook_id, "path": hpath, "markdown": markdown},
+    )
+    if not isinstance(result, str):
+        raise TypeError(f"Expected a document id string, but got {type(result)}")
+    return result
+
+
+@_tool()
+def create_documents(
+    notebook_id: str,
+    documents: Optional[List[Dict[str, Any]]] = None,
+    source_dir: Optional[str] = None,
+    target_path: str = "/",
+    concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """批量创建文档（从文档列表或本地 Markdown 目录导入）。
+
+    适用场景:
+        - 一次迁移大量 Markdown 文件到思源笔记。
+        - 需要批量创建文档且不希望每篇都弹出通知。
+
+    使用方法:
+        - notebook_id: 目标笔记本 ID。
+        - documents: 文档列表，每项形如 {"path": "/项目/周报", "markdown": "..."}。
+        - source_dir: 本机（运行本服务的机器）上的目录，递归导入其中的 .md / .markdown 文件，
+          文档路径取相对路径并去掉扩展名。documents 与 source_dir 二选一。
+        - target_path: 导入到的父路径（以 / 开头），默认笔记本根目录。
+        - concurrency: 并发创建数，默认取 SIYUAN_MCP_IMPORT_CONCURRENCY。
+
+    注意事项:
+        - 创建前用一次 hpath 查询比对已有文档：路径已存在或与同批次重复的文档会跳过，不会重复创建。
+        - 缺失的上级路径会先按层级创建为空文档，避免并发创建同一父文档。
+        - 单次最多 10000 篇；只推送阶段性进度与一条汇总通知。
+
+    Returns:
+        Dict[str, Any]: manifest（hpath -> 文档 ID，含已存在而跳过的文档）、created、
+        skipped_existing、skipped_duplicate、failed（hpath -> 错误信息）、
+        created_parents、elapsed_seconds 与 docs_per_sec。
+    """
+    started = time.perf_counter()
+    try:
+        if not isinstance(notebook_id, str) or not notebook_id.strip():
+            raise ValueError("notebook_id must be a non-empty string")
+        if concurrency is None:
+            concurrency = _IMPORT_CONCURRENCY
+        if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency <= 0:
+            raise ValueError("concurrency must be a positive integer")
+
+        sources = _collect_import_sources(documents, source_dir, target_path)
+        if not sources:
+            raise ValueError("no documents to import")
+
+        loaders: Dict[str, Callable[[], str]] = {}
+        skipped_duplicate: List[str] = []
+        for hpath, loader in sources:
+            if hpath in loaders:
+                skipped_duplicate.append(hpath)
+            else:
+                loaders[hpath] = loader
+
+        ancestors = {
+            "/".join(hpath.split("/")[:depth])
+            for hpath in loaders
+            for depth in range(2, hpath.count("/") + 1)
+        }
+        existing = _find_existing_doc_ids(
+            notebook_id, sorted(set(loaders) | ancestors)
+        )
+    except Exception as e:
+        _push_error_message("批量创建文档失败", _humanize_error(e))
+        raise
+
+    manifest: Dict[str, str] = {}
+    skipped_existing: List[str] = []
+    for hpath in loaders:
+        if hpath in existing:
+            manifest[hpath] = existing[hpath]
+            skipped_existing.append(hpath)
+    missing_parents = sorted(
+        hpath for hpath in ancestors if hpath not in existing and hpath not in loaders
+    )
+
+    # 按层级分批创建：同一批内的文档父路径均已存在，可以安全并发
+    waves: Dict[int, List[str]] = {}
+    for hpath in list(missing_parents) + [h for h in loaders if h not in existing]:
+        waves.setdefault(hpath.count("/"), []).append(hpath)
+
+    failed: Dict[str, str] = {}
+    created_parents: List[str] = []
+    created = 0
+    missing_parent_set = set(missing_parents)
+
+    def create_one(hpath: str) -> str:
+        markdown = "" if hpath in missing_parent_set else loaders[hpath]()
+        return _create_doc_with_md(notebook_id, hpath, markdown)
+
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="siyuan-import"
+    ) as executor:
+        for depth in sorted(waves):
+            hpaths: List[str] = []
+            for hpath in waves[depth]:
+                failed_parent = next(
+                    (f for f in failed if hpath.startswith(f + "/")), None
+                )
+                if failed_parent is None:
+                    hpaths.append(hpath)
+                elif hpath not in missing_parent_set:
+                    failed[hpath] = f"parent document could not be created: {failed_parent}"
+            futures = {
+                executor.submit(contextvars.copy_context().run, create_one, hpath): hpath
+                for hpath in hpaths
+            }
+            for future in as_completed(futures):
+                hpath = futures[future]
+                try:
+                    doc_id = future.result()
+                except Exception as e:
+                    failed[hpath] = str(e)
+                    continue
+                if hpath in missing_parent_set:
+                    created_parents.append(hpath)
+                    continue
+                manifest[hpath] = doc_id
+                created += 1
+                if created % _IMPORT_PROGRESS_EVERY == 0:
+                    _push_message(
+                        "批量创建文档", f"已创建 {created} / {len(loaders)} 篇"
+                    )
+
+    elapsed = time.perf_counter() - started
+    summary = (
+        f"新建 {created} 篇，跳过已存在 {len(skipped_existing)} 篇"
+        + (f"、重复 {len(skipped_duplicate)} 篇" if skipped_duplicate else "")
+    )
+    if failed:
+        first_path, first_error = next(iter(failed.items()))
+        _push_error_message(
+            "批量创建文档部分失败",
+            f"{summary}，失败 {len(failed)} 篇；{first_path}：{_shorten(first_error, 80)}",
+        )
+    else:
+        _push_message("批量创建文档", f"{summary}，保存到 {target_path}")
+
+    return {
+        "manifest": manifest,
+        "created": created,
+        "skipped_existing": skipped_existing,
+        "skipped_duplicate": skipped_duplicate,
+        "failed": failed,
+        "created_parents": created_parents,
+        "elapsed_seconds": round(elapsed, 3),
+        "docs_per_sec": round(created / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+@_tool()
 def update_block(
-    block_id: str, data: str, data_type: str = "markdown"
+    block_id: str, data: str, data_type: str = "markdown", lean: Optional[bool] = None
 ) -> List[Dict[str, Any]]:
     """更新块内容。
 
@@ -927,6 +2175,7 @@ def update_block(
         - block_id: 目标块 ID。
         - data_type: 仅支持 markdown 或 dom。
         - data: 新内容。
+        - lean: 是否精简写入（不读取旧内容做通知预览），默认取服务端配置。
 
     注意事项:
         - 这是整块替换，不是局部 patch。
@@ -937,6 +2186,18 @@ def update_block(
             raise ValueError("block_id must be a non-empty string")
         _validate_block_data_type(data_type)
 
+        if _resolve_lean(lean):
+            result = _post_to_siyuan_api(
+                "/api/block/updateBlock",
+                {"id": block_id, "data": data, "dataType": data_type},
+            )
+            if not isinstance(result, list):
+                raise TypeError(
+                    f"Expected a list from updateBlock, but got {type(result)}"
+                )
+            _push_message("更新内容", "已更新 1 个块")
+            return result
+
         # 获取旧内容用于对比
         old_content_dict = get_block_content(block_id)
         old_content = old_content_dict.get("kramdown", "")
@@ -963,16 +2224,20 @@ def update_block(
         raise
 
 
-@mcp.tool()
-def delete_block(block_id: str) -> List[Dict[str, Any]]:
+@_tool()
+def delete_block(block_id: str, lean: Optional[bool] = None) -> List[Dict[str, Any]]:
     """删除指定块。
 
     适用场景:
         - 清理错误插入或不再需要的块。
 
+    使用方法:
+        - lean: 是否精简写入（不读取被删内容做通知预览），默认取服务端配置。
+
     注意事项:
         - 删除操作具破坏性，调用前建议先用查询工具确认 block_id。
         - 返回值包含操作记录，可用于审计本次删除结果。
+        - 精简写入同样会拒绝删除文档块。
     """
     try:
         if not block_id.strip():
@@ -986,29 +2251,36 @@ def delete_block(block_id: str) -> List[Dict[str, Any]]:
                 + "please delete it manually in SiYuan."
             )
 
-        # 获取被删除块的内容预览（需要在删除前读取）
-        content_dict = get_block_content(block_id)
-        content = content_dict.get("kramdown", "")
-        preview = _shorten(content.replace("\n", " ").strip(), 50)
+        is_lean = _resolve_lean(lean)
+        preview = ""
+        if not is_lean:
+            # 获取被删除块的内容预览（需要在删除前读取）
+            content_dict = get_block_content(block_id)
+            content = content_dict.get("kramdown", "")
+            preview = _shorten(content.replace("\n", " ").strip(), 50)
 
         result = _post_to_siyuan_api("/api/block/deleteBlock", {"id": block_id})
         if not isinstance(result, list):
             raise TypeError(f"Expected a list from deleteBlock, but got {type(result)}")
 
-        _push_message("删除内容", f"已删除：{preview or '空白块'}")
+        if is_lean:
+            _push_message("删除内容", "已删除 1 个块")
+        else:
+            _push_message("删除内容", f"已删除：{preview or '空白块'}")
         return result
     except Exception as e:
         _push_error_message("删除内容失败", _humanize_error(e))
         raise
 
 
-@mcp.tool()
+@_tool()
 def insert_block(
     data: str,
     data_type: str = "markdown",
     next_id: Optional[str] = None,
     previous_id: Optional[str] = None,
     parent_id: Optional[str] = None,
+    lean: Optional[bool] = None,
 ) -> List[Dict[str, Any]]:
     """插入块（next_id / previous_id / parent_id 至少提供一个）。
 
@@ -1021,6 +2293,7 @@ def insert_block(
         - previous_id: 插入到 previous_id 对应块之后。
         - parent_id: 插入为 parent_id 的子块。
         - 三者可同时提供，但思源 API 优先级为 next_id > previous_id > parent_id。
+        - lean: 是否精简写入（不读取锚点内容做通知预览），默认取服务端配置。
 
     注意事项:
         - 如果你要"确保挂到某个标题（如 H3）下面"，请显式传 parent_id，
@@ -1053,23 +2326,25 @@ def insert_block(
                 "At least one of next_id, previous_id, parent_id is required"
             )
 
+        is_lean = _resolve_lean(lean)
         location_desc = "未知位置"
-        if parent_id:
-            parent_meta = _get_block_metadata(parent_id)
-            if parent_meta:
-                parent_type = parent_meta.get("type", "")
-                if parent_type == "h":
-                    title_preview = _get_block_content_preview(parent_id, 20)
-                    location_desc = f"添加到标题「{title_preview}」下方"
-                else:
-                    parent_preview = _get_block_content_preview(parent_id, 20)
-                    location_desc = f"添加到「{parent_preview}...」内"
-        elif previous_id:
-            prev_preview = _get_block_content_preview(previous_id, 20)
-            location_desc = f"在「{prev_preview}...」之后"
-        elif next_id:
-            next_preview = _get_block_content_preview(next_id, 20)
-            location_desc = f"在「{next_preview}...」之前"
+        if not is_lean:
+            if parent_id:
+                parent_meta = _get_block_metadata(parent_id)
+                if parent_meta:
+                    parent_type = parent_meta.get("type", "")
+                    if parent_type == "h":
+                        title_preview = _get_block_content_preview(parent_id, 20)
+                        location_desc = f"添加到标题「{title_preview}」下方"
+                    else:
+                        parent_preview = _get_block_content_preview(parent_id, 20)
+                        location_desc = f"添加到「{parent_preview}...」内"
+            elif previous_id:
+                prev_preview = _get_block_content_preview(previous_id, 20)
+                location_desc = f"在「{prev_preview}...」之后"
+            elif next_id:
+                next_preview = _get_block_content_preview(next_id, 20)
+                location_desc = f"在「{next_preview}...」之前"
 
         content_preview = _shorten(data.replace("\n", " "), 50)
         payload = {
@@ -1083,16 +2358,19 @@ def insert_block(
         if not isinstance(result, list):
             raise TypeError(f"Expected a list from insertBlock, but got {type(result)}")
 
-        _push_message("插入内容", f"{location_desc}：{content_preview}")
+        if is_lean:
+            _push_message("插入内容", "已插入 1 个块")
+        else:
+            _push_message("插入内容", f"{location_desc}：{content_preview}")
         return result
     except Exception as e:
         _push_error_message("插入内容失败", _humanize_error(e))
         raise
 
 
-@mcp.tool()
+@_tool()
 def prepend_block(
-    parent_id: str, data: str, data_type: str = "markdown"
+    parent_id: str, data: str, data_type: str = "markdown", lean: Optional[bool] = None
 ) -> List[Dict[str, Any]]:
     """插入前置子块。
 
@@ -1103,6 +2381,7 @@ def prepend_block(
     使用方法:
         - parent_id 传入目标父块 ID。
         - data 为待插入内容，data_type 支持 markdown 或 dom。
+        - lean: 是否精简写入（不读取父块内容做通知预览），默认取服务端配置。
 
     注意事项:
         - 该工具是"父块优先"的安全写入方式，不依赖 next_id/previous_id。
@@ -1122,6 +2401,18 @@ def prepend_block(
             raise ValueError("parent_id must be a non-empty string")
         _validate_block_data_type(data_type)
 
+        if _resolve_lean(lean):
+            result = _post_to_siyuan_api(
+                "/api/block/prependBlock",
+                {"parentID": parent_id, "data": data, "dataType": data_type},
+            )
+            if not isinstance(result, list):
+                raise TypeError(
+                    f"Expected a list from prependBlock, but got {type(result)}"
+                )
+            _push_message("前置插入", "已插入 1 个块")
+            return result
+
         # 获取父块信息
         parent_meta = _get_block_metadata(parent_id)
         parent_type = parent_meta.get("type", "") if parent_meta else ""
@@ -1145,9 +2436,9 @@ def prepend_block(
         raise
 
 
-@mcp.tool()
+@_tool()
 def append_block(
-    parent_id: str, data: str, data_type: str = "markdown"
+    parent_id: str, data: str, data_type: str = "markdown", lean: Optional[bool] = None
 ) -> List[Dict[str, Any]]:
     """插入后置子块。
 
@@ -1158,6 +2449,7 @@ def append_block(
     使用方法:
         - parent_id 传入目标父块 ID。
         - data 为待插入内容，data_type 支持 markdown 或 dom。
+        - lean: 是否精简写入（不读取父块内容做通知预览），默认取服务端配置。
 
     注意事项:
         - 该工具不会使用 next_id/previous_id 锚点，适合避免层级歧义。
@@ -1177,6 +2469,18 @@ def append_block(
             raise ValueError("parent_id must be a non-empty string")
         _validate_block_data_type(data_type)
 
+        if _resolve_lean(lean):
+            result = _post_to_siyuan_api(
+                "/api/block/appendBlock",
+                {"parentID": parent_id, "data": data, "dataType": data_type},
+            )
+            if not isinstance(result, list):
+                raise TypeError(
+                    f"Expected a list from appendBlock, but got {type(result)}"
+                )
+            _push_message("后置插入", "已插入 1 个块")
+            return result
+
         # 获取父块信息
         parent_meta = _get_block_metadata(parent_id)
         parent_type = parent_meta.get("type", "") if parent_meta else ""
@@ -1198,12 +2502,13 @@ def append_block(
         raise
 
 
-@mcp.tool()
+@_tool()
 def move_block(
     block_id: str,
     previous_id: Optional[str] = None,
     parent_id: Optional[str] = None,
     allow_heading_only_move: bool = False,
+    lean: Optional[bool] = None,
 ) -> List[Dict[str, Any]]:
     """移动块（previous_id / parent_id 至少提供一个）。
 
@@ -1216,10 +2521,17 @@ def move_block(
         - previous_id: 把 block_id 移动到 previous_id 之后。
         - parent_id: 把 block_id 移动到 parent_id 之下。
         - allow_heading_only_move: 兼容旧参数，已废弃；传 true 会报错。
+        - lean: 是否精简写入（不读取块内容做通知预览），默认取服务端配置。
+          计算移动范围所需的结构查询不受影响。
 
     注意事项:
         - 若 block_id 是标题块（h1-h6），将按“分节范围”移动：
           从该标题开始，直到下一个同级或更高级标题（level <= 当前 level）之前的所有块一起移动。
+        - 标题分节默认以“折叠标题 -> 移动标题 -> 展开标题”的方式一次移动（思源移动折叠标题时
+          会带上整个分节）；移动后用 getChildBlocks 核对，未跟随的块再逐块补移。
+          SIYUAN_MCP_FOLD_SECTION_MOVE=false 时始终逐块链式移动。
+        - 副作用：原本未折叠的标题会被折叠再展开，标题的 IAL（fold 属性）会被改写、
+          updated 时间戳会更新，思源中会多出对应的折叠/展开操作记录；原本已折叠的标题保持折叠。
         - 其他块默认按“子树块组”移动：目标块 + 全部后代，避免父块与子块脱离。
         - 思源 API 对同传 previous_id 和 parent_id 时会优先 previous_id。
         - previous_id / parent_id 不能指向正在移动的子树内部块。
@@ -1259,93 +2571,279 @@ def move_block(
                 + "move_block now always performs group move to prevent partial moves."
             )
 
-        # 获取被移动块的内容预览
-        moved_preview = _get_block_content_preview(block_id, 20)
+        is_lean = _resolve_lean(lean)
         metadata = _get_block_metadata(block_id)
 
-        # 构建语义化的移动描述
+        # 获取被移动块的内容预览，构建语义化的移动描述
+        moved_preview = ""
         move_action = "移动到未知位置"
-        if previous_id:
-            prev_preview = _get_block_content_preview(previous_id, 20)
-            move_action = f"移动到「{prev_preview}...」之后"
-        elif parent_id:
-            parent_meta = _get_block_metadata(parent_id)
-            if parent_meta and parent_meta.get("type") == "h":
-                parent_preview = _get_block_content_preview(parent_id, 20)
-                move_action = f"移动到标题「{parent_preview}」下方"
-            else:
-                move_action = "移动到块内"
-
-        previous_meta: Optional[Dict[str, Any]] = None
-        if previous_id:
-            previous_meta = _get_block_metadata(previous_id)
-            if not previous_meta:
-                raise ValueError(f"previous_id not found: {previous_id}")
-            if previous_meta.get("type") == "d":
-                raise ValueError(
-                    "previous_id cannot be a document block (type='d'); "
-                    + "Siyuan moveBlock may silently lose blocks in this case."
-                )
+        if not is_lean:
+            moved_preview = _get_block_content_preview(block_id, 20)
+            if previous_id:
+                prev_preview = _get_block_content_preview(previous_id, 20)
+                move_action = f"移动到「{prev_preview}...」之后"
+            elif parent_id:
+                parent_meta = _get_block_metadata(parent_id)
+                if parent_meta and parent_meta.get("type") == "h":
+                    parent_preview = _get_block_content_preview(parent_id, 20)
+                    move_action = f"移动到标题「{parent_preview}」下方"
+                else:
+                    move_action = "移动到块内"
 
-        is_heading = bool(metadata and metadata.get("type") == "h")
+        moved_ids, result = _move_group(block_id, previous_id, parent_id, metadata)
+        moved_count = len(moved_ids)
 
-        if is_heading:
-            section_top_level_ids = _collect_heading_section_ids(block_id)
-            target_parent_id = parent_id
-            if not target_parent_id and metadata:
-                raw_parent_id = metadata.get("parent_id")
-                target_parent_id = (
-                    raw_parent_id if isinstance(raw_parent_id, str) else ""
-                )
-            if not target_parent_id:
-                raise ValueError("parent_id could not be resolved for section move")
+        if is_lean:
+            _push_message("移动内容", f"已移动（共{moved_count}个块）")
+        else:
+            _push_message(
+                "移动内容", f"「{moved_preview}」已{move_action}（共{moved_count}个块）"
+            )
+        return result
+    except Exception as e:
+        _push_error_message("移动内容失败", _humanize_error(e))
+        raise
 
-            effective_previous_id = previous_id
-            if previous_id and previous_meta:
-                if previous_meta.get("type") == "h":
-                    anchor_section_ids = _collect_heading_section_ids(previous_id)
-                    if anchor_section_ids:
-                        effective_previous_id = anchor_section_ids[-1]
 
-            if not effective_previous_id:
-                try:
-                    parent_rows = _get_child_blocks_rows(target_parent_id)
-                    parent_ids: List[str] = []
-                    for row in parent_rows:
-                        row_id = row.get("id")
-                        if isinstance(row_id, str) and row_id:
-                            parent_ids.append(row_id)
-
-                    for candidate_id in reversed(parent_ids):
-                        if candidate_id not in section_top_level_ids:
-                            effective_previous_id = candidate_id
-                            break
-                except Exception:
-                    effective_previous_id = None
-
-            if effective_previous_id and effective_previous_id in section_top_level_ids:
-                raise ValueError(
-                    "previous_id cannot point to a block inside the moving group"
-                )
+# batch_block_ops 支持的操作：op -> (通知中的名称, 必填字段, 写接口)
+_BATCH_OPS: Dict[str, Tuple[str, Tuple[str, ...], Optional[str]]] = {
+    "insert": ("插入", ("data",), "/api/block/insertBlock"),
+    "prepend": ("前置插入", ("parent_id", "data"), "/api/block/prependBlock"),
+    "append": ("后置插入", ("parent_id", "data"), "/api/block/appendBlock"),
+    "update": ("更新", ("block_id", "data"), "/api/block/updateBlock"),
+    "delete": ("删除", ("block_id",), "/api/block/deleteBlock"),
+    "move": ("移动", ("block_id",), None),
+}
+_BATCH_ID_FIELDS = ("block_id", "parent_id", "previous_id", "next_id")
+_BATCH_MAX_OPS = 1000
 
-            moved_ids, result = _move_section_group_after(
-                section_top_level_ids, effective_previous_id, target_parent_id
-            )
-            moved_count = len(moved_ids)
-        else:
-            moved_ids, result = _move_block_group(block_id, previous_id, parent_id)
-            moved_count = len(moved_ids)
 
-        _push_message(
-            "移动内容", f"「{moved_preview}」已{move_action}（共{moved_count}个块）"
+def _validate_batch_op(index: int, op: Any) -> Dict[str, Any]:
+    if not isinstance(op, dict):
+        raise ValueError(f"operations[{index}] must be an object")
+    kind = op.get("op")
+    if kind not in _BATCH_OPS:
+        raise ValueError(
+            f"operations[{index}].op must be one of {', '.join(_BATCH_OPS)}, got {kind!r}"
+        )
+    for field_name in _BATCH_OPS[kind][1]:
+        value = op.get(field_name)
+        if not isinstance(value, str) or (field_name != "data" and not value.strip()):
+            raise ValueError(f"operations[{index}].{field_name} must be a non-empty string")
+    for field_name in _BATCH_ID_FIELDS:
+        value = op.get(field_name)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"operations[{index}].{field_name} must be a string")
+    if "data" in _BATCH_OPS[kind][1]:
+        _validate_block_data_type(op.get("data_type", "markdown"))
+    if kind == "insert" and not (
+        op.get("next_id") or op.get("previous_id") or op.get("parent_id")
+    ):
+        raise ValueError(
+            f"operations[{index}] (insert) requires next_id, previous_id or parent_id"
+        )
+    if kind == "move" and not (op.get("previous_id") or op.get("parent_id")):
+        raise ValueError(
+            f"operations[{index}] (move) requires previous_id or parent_id"
+        )
+    return op
+
+
+def _batch_lanes(
+    ops: List[Dict[str, Any]], known: Dict[str, Dict[str, Any]]
+) -> List[List[int]]:
+    """按文档把操作分成互不相关的执行队列（操作下标列表）。
+
+    同一文档的操作留在同一队列并保持原有顺序；跨文档的移动会把两个文档合并到一个队列。
+    """
+    parents: Dict[str, str] = {}
+
+    def find(root_id: str) -> str:
+        parents.setdefault(root_id, root_id)
+        while parents[root_id] != root_id:
+            parents[root_id] = parents[parents[root_id]]
+            root_id = parents[root_id]
+        return root_id
+
+    op_roots: List[List[str]] = []
+    for op in ops:
+        roots = [
+            known[op[field_name]].get("root_id") or op[field_name]
+            for field_name in _BATCH_ID_FIELDS
+            if op.get(field_name)
+        ]
+        for root_id in roots[1:]:
+            parents[find(root_id)] = find(roots[0])
+        op_roots.append(roots)
+
+    lanes: Dict[str, List[int]] = {}
+    for index, roots in enumerate(op_roots):
+        lanes.setdefault(find(roots[0]), []).append(index)
+    return list(lanes.values())
+
+
+def _run_batch_op(op: Dict[str, Any]) -> Any:
+    kind = op["op"]
+    if kind == "move":
+        metadata = _get_block_metadata(op["block_id"])
+        _, result = _move_group(
+            op["block_id"], op.get("previous_id"), op.get("parent_id"), metadata
         )
         return result
+
+    endpoint = _BATCH_OPS[kind][2]
+    data_type = op.get("data_type", "markdown")
+    if kind == "insert":
+        payload = {
+            "data": op["data"],
+            "dataType": data_type,
+            "nextID": op.get("next_id") or "",
+            "previousID": op.get("previous_id") or "",
+            "parentID": op.get("parent_id") or "",
+        }
+    elif kind in ("prepend", "append"):
+        payload = {"parentID": op["parent_id"], "data": op["data"], "dataType": data_type}
+    elif kind == "update":
+        payload = {"id": op["block_id"], "data": op["data"], "dataType": data_type}
+    else:
+        payload = {"id": op["block_id"]}
+
+    result = _post_to_siyuan_api(endpoint, payload)
+    if not isinstance(result, list):
+        raise TypeError(f"Expected a list from {endpoint}, but got {type(result)}")
+    return result
+
+
+@_tool()
+def batch_block_ops(
+    operations: List[Dict[str, Any]], stop_on_error: bool = True
+) -> Dict[str, Any]:
+    """按顺序批量执行块写入操作（一次调用完成多次插入/更新/删除/移动）。
+
+    适用场景:
+        - 一次追加大量列表项、批量更新或删除多个块。
+        - 需要多次写入但不希望每次都单独调用工具、单独弹出通知。
+
+    使用方法:
+        - operations: 操作列表，按顺序执行，每项形如
+          {"op": "append", "parent_id": "...", "data": "...", "data_type": "markdown"}。
+          op 取值与对应工具一致:
+            - insert: data + next_id / previous_id / parent_id 至少一个
+            - prepend / append: parent_id + data
+            - update: block_id + data
+            - delete: block_id
+            - move: block_id + previous_id / parent_id 至少一个（按逻辑块组移动）
+        - stop_on_error: 某项失败后是否停止执行后续操作，默认 true。
+
+    注意事项:
+        - 执行前先用一次 SQL 查询校验所有引用的块 ID，任何 ID 不存在或试图删除
+          文档块时整批拒绝，不会执行任何写入。
+        - 同一文档内的操作按列表顺序依次执行；涉及不同文档的操作互不依赖，
+          按文档分组并发执行（上限 SIYUAN_MCP_FETCH_CONCURRENCY）。
+        - stop_on_error 为 true 时，某项失败后不再开始新的操作；其他文档中已在执行的
+          操作会正常完成，结果中未执行的操作标记为 skipped。
+        - 只能引用执行前已存在的块，不能引用同一批次中新插入的块。
+        - 单次最多 1000 项；整批只推送一条汇总通知，不读取内容预览。
+
+    Returns:
+        Dict[str, Any]: results（逐项结果，含 index、op、ok、result 或 error）、
+        succeeded / failed / skipped 计数、elapsed_seconds 与 ops_per_sec。
+    """
+    started = time.perf_counter()
+    try:
+        if not isinstance(operations, list) or not operations:
+            raise ValueError("operations must be a non-empty list")
+        if len(operations) > _BATCH_MAX_OPS:
+            raise ValueError(f"operations supports at most {_BATCH_MAX_OPS} items")
+        if type(stop_on_error) is not bool:
+            raise ValueError("stop_on_error must be a boolean")
+        ops = [_validate_batch_op(index, op) for index, op in enumerate(operations)]
+
+        referenced_ids = [
+            op[field_name]
+            for op in ops
+            for field_name in _BATCH_ID_FIELDS
+            if op.get(field_name)
+        ]
+        known = _prime_block_metadata(referenced_ids)
+        missing = [block_id for block_id in dict.fromkeys(referenced_ids) if block_id not in known]
+        if missing:
+            raise ValueError(f"block ids not found: {', '.join(missing[:10])}")
+        for index, op in enumerate(ops):
+            if op["op"] == "delete" and known[op["block_id"]].get("type") == "d":
+                raise ValueError(
+                    f"operations[{index}]: refusing to delete a document block; "
+                    + "please delete documents manually in SiYuan."
+                )
     except Exception as e:
-        _push_error_message("移动内容失败", _humanize_error(e))
+        _push_error_message("批量写入失败", _humanize_error(e))
         raise
 
+    results: List[Dict[str, Any]] = [{} for _ in ops]
+    stopped = threading.Event()
 
-@mcp.tool()
+    def run_lane(lane: List[int]) -> None:
+        for index in lane:
+            op = ops[index]
+            if stopped.is_set():
+                results[index] = {"index": index, "op": op["op"], "ok": False, "skipped": True}
+                continue
+            try:
+                result = _run_batch_op(op)
+                results[index] = {"index": index, "op": op["op"], "ok": True, "result": result}
+            except Exception as e:
+                results[index] = {"index": index, "op": op["op"], "ok": False, "error": str(e)}
+                if stop_on_error:
+                    stopped.set()
+
+    lanes = _batch_lanes(ops, known)
+    if len(lanes) == 1:
+        run_lane(lanes[0])
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(_FETCH_CONCURRENCY, len(lanes)),
+            thread_name_prefix="siyuan-batch",
+        ) as executor:
+            # 每个任务带上当前上下文的副本，使后台请求计入本次工具调用的统计
+            futures = [
+                executor.submit(contextvars.copy_context().run, run_lane, lane)
+                for lane in lanes
+            ]
+            for future in futures:
+                future.result()
+
+    counts: Dict[str, int] = {}
+    failed = 0
+    for item in results:
+        if item["ok"]:
+            counts[item["op"]] = counts.get(item["op"], 0) + 1
+        elif "error" in item:
+            failed += 1
+    elapsed = time.perf_counter() - started
+    succeeded = sum(counts.values())
+    skipped = len(ops) - succeeded - failed
+    summary = "、".join(f"{_BATCH_OPS[kind][0]} {count} 项" for kind, count in counts.items())
+    if failed:
+        first_error = next(item for item in results if "error" in item)
+        _push_error_message(
+            "批量写入部分失败",
+            f"成功 {succeeded} 项（{summary or '无'}），失败 {failed} 项，未执行 {skipped} 项；"
+            + f"第 {first_error['index'] + 1} 项出错：{_shorten(first_error['error'], 80)}",
+        )
+    else:
+        _push_message("批量写入", f"共完成 {succeeded} 项：{summary}")
+
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": failed,
+        "skipped": skipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "ops_per_sec": round((succeeded + failed) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+@_tool()
 def list_files(path: str) -> List[Dict[str, Any]]:
     """列出指定路径下的文件和文件夹（只读）。
 
@@ -1367,8 +2865,8 @@ def list_files(path: str) -> List[Dict[str, Any]]:
     return result
 
 
-@mcp.tool()
-def get_file(path: str) -> str:
+@_tool()
+def get_file(path: str, max_bytes: Optional[int] = None) -> str:
     """读取指定文件的内容（只读）。
 
     用于读取历史快照或其他数据文件。
@@ -1376,31 +2874,71 @@ def get_file(path: str) -> str:
     注意事项:
         - 文本内容会进行敏感信息打码。
         - 若文件为二进制且无法解码为 UTF-8，将返回 '[Binary Data]'。
+        - 文件按块流式读取、增量解码和打码，内存占用与文件大小无关。
+        - 超过 max_bytes 的部分不会读取，返回内容末尾会附带截断说明。
 
     Args:
         path: 文件路径，例如 '/data/history/2023/01/...'。
+        max_bytes: 最多读取的字节数，默认取 SIYUAN_MCP_MAX_FILE_BYTES（16 MiB）。
 
     Returns:
         str: 文件内容（文本）或二进制数据提示。
     """
-    url, headers = _get_siyuan_request_parts("/api/file/getFile")
+    if max_bytes is None:
+        max_bytes = _MAX_FILE_BYTES
+    if isinstance(max_bytes, bool) or not isinstance(max_bytes, int) or max_bytes <= 0:
+        raise ValueError("max_bytes must be a positive integer")
+
     try:
-        response = requests.post(url, json={"path": path}, headers=headers)
-        response.raise_for_status()
+        content, truncated = _read_masked_file_text(path, max_bytes)
+    except UnicodeDecodeError:
+        return "[Binary Data]"
 
-        # 尝试将内容解码为文本
-        try:
-            content = response.content.decode("utf-8")
-            # 对文件内容进行敏感信息打码
-            return mask_sensitive_data(content)
-        except UnicodeDecodeError:
-            return "[Binary Data]"
+    if truncated:
+        content += f"\n...[truncated: only the first {max_bytes} bytes were read]"
+    return content
+
+
+def _read_masked_file_text(path: str, max_bytes: int) -> Tuple[str, bool]:
+    """流式读取文件：按块增量 UTF-8 解码并打码，读满 max_bytes 即停止。
 
+    Returns:
+        (打码后的文本, 是否被截断)
+
+    Raises:
+        UnicodeDecodeError: 内容不是合法的 UTF-8 文本。
+    """
+    response = _post_file_request(path, stream=True)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    masker = StreamingMasker()
+    parts: List[str] = []
+    received = 0
+    truncated = False
+    try:
+        for chunk in response.iter_content(chunk_size=_FILE_CHUNK_SIZE):
+            if not chunk:
+                continue
+            remaining = max_bytes - received
+            if len(chunk) > remaining:
+                # 预算用尽：丢弃剩余部分，不再继续下载
+                truncated = True
+                chunk = chunk[:remaining]
+            received += len(chunk)
+            parts.append(masker.feed(decoder.decode(chunk)))
+            if truncated:
+                break
+        if not truncated:
+            parts.append(masker.feed(decoder.decode(b"", final=True)))
     except requests.exceptions.RequestException as e:
         raise ConnectionError(f"Failed to get file: {e}") from e
+    finally:
+        response.close()
+
+    parts.append(masker.flush())
+    return "".join(parts), truncated
 
 
-@mcp.tool()
+@_tool()
 def get_file_base64(path: str) -> str:
     """读取指定文件内容并以 Base64 返回（只读）。
 
@@ -1416,24 +2954,19 @@ def get_file_base64(path: str) -> str:
     Returns:
         str: Base64 编码的文件内容（已打码）。
     """
-    url, headers = _get_siyuan_request_parts("/api/file/getFile")
+    response = _post_file_request(path)
     try:
-        response = requests.post(url, json={"path": path}, headers=headers)
-        response.raise_for_status()
-        try:
-            text = response.content.decode("utf-8")
-        except UnicodeDecodeError as e:
-            raise ValueError(
-                "Binary content cannot be safely masked for base64 export."
-            ) from e
+        text = response.content.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ValueError(
+            "Binary content cannot be safely masked for base64 export."
+        ) from e
 
-        masked = mask_sensitive_data(text)
-        return base64.b64encode(masked.encode("utf-8")).decode("ascii")
-    except requests.exceptions.RequestException as e:
-        raise ConnectionError(f"Failed to get file: {e}") from e
+    masked = mask_sensitive_data(text)
+    return base64.b64encode(masked.encode("utf-8")).decode("ascii")
 
 
-@mcp.tool()
+@_tool()
 def list_history_entries(path: str = "/history") -> List[Dict[str, Any]]:
     """列出历史快照目录下的文件和文件夹。
 
@@ -1455,35 +2988,32 @@ def list_history_entries(path: str = "/history") -> List[Dict[str, Any]]:
     return result
 
 
-@mcp.tool()
-def get_history_file(path: str) -> str:
+@_tool()
+def get_history_file(path: str, max_bytes: Optional[int] = None) -> str:
     """读取历史快照文件内容（只读）。
 
     注意事项:
         - path 必须以 '/history' 或 '/data/history' 开头。
-        - 行为与 get_file 一致，文本会做敏感信息打码。
+        - 行为与 get_file 一致，文本会做敏感信息打码，超过 max_bytes 会截断。
 
     Args:
         path: 历史快照文件路径，必须以 "/history" 或 "/data/history" 开头。
+        max_bytes: 最多读取的字节数，默认取 SIYUAN_MCP_MAX_FILE_BYTES（16 MiB）。
 
     Returns:
         str: 历史快照文件内容。
     """
     if not (path.startswith("/history") or path.startswith("/data/history")):
         raise ValueError("path must start with /history or /data/history")
-    return get_file(path)
+    return get_file(path, max_bytes)
 
 
 def _get_file_text_raw(path: str) -> str:
-    url, headers = _get_siyuan_request_parts("/api/file/getFile")
+    response = _post_file_request(path)
     try:
-        response = requests.post(url, json={"path": path}, headers=headers)
-        response.raise_for_status()
         return response.content.decode("utf-8")
     except UnicodeDecodeError as e:
         raise ValueError("Binary content cannot be decoded as UTF-8 text.") from e
-    except requests.exceptions.RequestException as e:
-        raise ConnectionError(f"Failed to get file: {e}") from e
 
 
 def _load_sy_json_from_path(path: str) -> Dict[str, Any]:
@@ -1491,92 +3021,206 @@ def _load_sy_json_from_path(path: str) -> Dict[str, Any]:
     return json.loads(text)
 
 
-def _extract_text_from_node(node: Dict[str, Any]) -> str:
-    node_type = node.get("Type")
-    if node_type == "NodeText":
-        return node.get("Data", "")
-    if node_type == "NodeTextMark":
-        return node.get("TextMarkTextContent", "")
-    return ""
+def _build_block_text_map(doc_json: Dict[str, Any]) -> Dict[str, str]:
+    """块 ID → 子树文本。get_block_diffs 需要完整映射：已删除块的检测要用到全部块 ID，
+    磁盘缓存也按文档整体复用，因此不按块 ID 子集构建。"""
+    return walk_block_tree(doc_json)
 
 
-def _walk_block_tree(node: Dict[str, Any], block_map: Dict[str, str]) -> str:
-    children = node.get("Children", [])
-    if children:
-        child_texts = [_walk_block_tree(child, block_map) for child in children]
-        aggregated = "".join(child_texts)
-    else:
-        aggregated = ""
+# 缓存的是未脱敏的文档文本，默认关闭，由 SIYUAN_MCP_DISK_CACHE_MB 显式开启
+_TEXT_MAP_CACHE = TextMapDiskCache(
+    "sy_text_maps",
+    os.getenv("SIYUAN_MCP_CACHE_DIR") or default_cache_dir(),
+    env_int("SIYUAN_MCP_DISK_CACHE_MB", 0) * 1024 * 1024,
+)
+# readDir 返回的 mtime 只精确到秒，刚修改的文件不走磁盘缓存，避免同一秒内的两次写入共用一个键
+_TEXT_MAP_MIN_AGE_SECONDS = 2
 
-    node_text = _extract_text_from_node(node)
-    combined = node_text + aggregated
 
-    node_id = node.get("ID") or node.get("Properties", {}).get("id")
-    if node_id:
-        block_map[node_id] = combined
+def _load_block_text_map(path: str, version: Optional[str]) -> Dict[str, str]:
+    """读取 .sy 文件并返回块文本映射。
 
-    return combined
+    version 为缓存版本（历史快照不会变化，传固定值；当前文档传 mtime），
+    为 None 时不使用磁盘缓存。缓存键包含思源地址，多个实例互不干扰。
+    """
+    key = None
+    if version is not None and _TEXT_MAP_CACHE.enabled:
+        key = TextMapDiskCache.make_key(get_transport().config.base_url, path, version)
+        cached = _TEXT_MAP_CACHE.get(key)
+        if cached is not None:
+            return cached
+    text_map = _build_block_text_map(_load_sy_json_from_path(path))
+    if key is not None:
+        _TEXT_MAP_CACHE.set(key, text_map)
+    return text_map
+
+
+def _read_dir_mtimes(parent: str) -> Optional[Dict[str, int]]:
+    """readDir 一个目录，返回文件名 → mtime；失败返回 None。"""
+    try:
+        entries = _post_to_siyuan_api("/api/file/readDir", {"path": parent})
+        return {
+            entry["name"]: entry.get("updated")
+            for entry in entries
+            if isinstance(entry, dict) and isinstance(entry.get("name"), str)
+        }
+    except Exception:
+        return None
 
 
-def _build_block_text_map(doc_json: Dict[str, Any]) -> Dict[str, str]:
-    block_map: Dict[str, str] = {}
-    _walk_block_tree(doc_json, block_map)
-    return block_map
+def _current_doc_version(
+    current_path: str, dir_mtimes: Dict[str, Optional[Dict[str, int]]]
+) -> Optional[str]:
+    """取当前文档文件的 mtime 作为缓存版本，dir_mtimes 中没有的目录会 readDir 一次。"""
+    if not _TEXT_MAP_CACHE.enabled:
+        return None
+    parent, _, filename = current_path.rpartition("/")
+    if parent not in dir_mtimes:
+        dir_mtimes[parent] = _read_dir_mtimes(parent)
+    mtimes = dir_mtimes[parent]
+    mtime = mtimes.get(filename) if mtimes else None
+    if not isinstance(mtime, int) or mtime <= 0:
+        return None
+    if time.time() - mtime < _TEXT_MAP_MIN_AGE_SECONDS:
+        return None
+    return f"mtime:{mtime}"
 
 
-def _parse_history_dir_name(name: str) -> Optional[Tuple[str, str]]:
-    match = re.match(r"^(\d{4})-(\d{2})-(\d{2})-(\d{6})-(\w+)$", name)
-    if not match:
-        return None
-    ts = "".join(match.groups()[:4])
-    kind = match.group(5)
-    return ts, kind
+_DIFF_BUDGET_SECONDS = env_float("SIYUAN_MCP_DIFF_BUDGET_MS", 200.0) / 1000
 
 
-def _select_snapshot(entries: List[Dict[str, Any]], target_time: str) -> Optional[str]:
-    candidates = []
-    for entry in entries:
-        name = entry.get("name")
-        if not name:
-            continue
-        parsed = _parse_history_dir_name(name)
-        if not parsed:
-            continue
-        ts, kind = parsed
-        if ts <= target_time:
-            candidates.append((ts, kind, name))
+def _describe_diff(before: str, after: str) -> Dict[str, Any]:
+    return describe_diff(before, after, budget_seconds=_DIFF_BUDGET_SECONDS)
+
+
+# 参与 diff 的文本总字符数达到该值时才使用进程池，小批量时进程间传输不划算
+_DIFF_PROCESS_MIN_CHARS = 200000
+# 默认关闭：spawn 出的每个工作进程都会重新导入整个包（创建 FastMCP 实例、线程池、
+# 通知队列与缓存），只在 diff 计算确为瓶颈时按需开启
+_DIFF_WORKERS = env_int("SIYUAN_MCP_DIFF_WORKERS", 0)
+_diff_process_pool: Optional[ProcessPoolExecutor] = None
+_diff_process_pool_lock = threading.Lock()
+# 进程池启动或运行失败后不再尝试，之后一律在当前进程内计算
+_diff_process_pool_failed = False
+
+
+def _get_diff_process_pool() -> ProcessPoolExecutor:
+    global _diff_process_pool
+    with _diff_process_pool_lock:
+        if _diff_process_pool is None:
+            # 服务进程中有多个线程，使用 spawn 而不是 fork
+            _diff_process_pool = ProcessPoolExecutor(
+                max_workers=_DIFF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_diff_process_pool.shutdown, cancel_futures=True)
+        return _diff_process_pool
+
+
+def _describe_diffs(pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """按顺序返回每对 (before, after) 的 diff 统计；进程池不可用时回退为逐个计算。"""
+    global _diff_process_pool, _diff_process_pool_failed
+    total_chars = sum(len(before) + len(after) for before, after in pairs)
+    if (
+        _DIFF_WORKERS > 0
+        and not _diff_process_pool_failed
+        and len(pairs) > 1
+        and total_chars >= _DIFF_PROCESS_MIN_CHARS
+    ):
+        try:
+            pool = _get_diff_process_pool()
+            return list(
+                pool.map(
+                    functools.partial(describe_diff, budget_seconds=_DIFF_BUDGET_SECONDS),
+                    [before for before, _ in pairs],
+                    [after for _, after in pairs],
+                    chunksize=max(1, len(pairs) // (_DIFF_WORKERS * 4)),
+                )
+            )
+        except Exception:
+            # 启动失败、进程崩溃、序列化错误等一律回退到当前进程内计算
+            with _diff_process_pool_lock:
+                _diff_process_pool_failed = True
+                if _diff_process_pool is not None:
+                    _diff_process_pool.shutdown(wait=False, cancel_futures=True)
+                    _diff_process_pool = None
+    return [_describe_diff(before, after) for before, after in pairs]
+
+
+def _iter_deleted_blocks(
+    doc_pairs: List[Tuple[str, str, str, str, str]],
+    current_cache: Dict[str, Dict[str, str]],
+    history_cache: Dict[str, Dict[str, str]],
+) -> Iterator[Dict[str, Any]]:
+    """逐个产出在历史快照中有内容、当前文档中已不存在的块。
+
+    doc_pairs 为 (当前文件, 快照文件, box, path, snapshot)，每个文件对只比较一次，
+    按首次出现顺序处理；同一块 ID 只产出一次，打码在产出时才进行。
+    """
+    seen: set = set()
+    for current_path, history_path, box, path, snapshot in dict.fromkeys(doc_pairs):
+        current_map = current_cache.get(current_path, {})
+        for history_id, history_text in history_cache.get(history_path, {}).items():
+            if not history_text or history_id in current_map or history_id in seen:
+                continue
+            seen.add(history_id)
+            yield {
+                "id": history_id,
+                "box": box,
+                "path": path,
+                "snapshot": snapshot,
+                "before": mask_sensitive_data(history_text),
+                "after": "",
+                "change": "删除",
+            }
 
-    if not candidates:
-        return None
 
-    kind_priority = {"update": 3, "sync": 2, "delete": 1}
-    candidates.sort(
-        key=lambda item: (item[0], kind_priority.get(item[1], 0)), reverse=True
-    )
-    return candidates[0][2]
+def _load_diff_text_maps(
+    current_paths: List[str], history_paths: List[str]
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+    """并发读取并解析 get_block_diffs 涉及的当前文档与历史快照，每个文件只读一次。
 
+    单个文件读取失败时对应映射为空字典。
+    """
+    current_paths = list(dict.fromkeys(current_paths))
+    history_paths = list(dict.fromkeys(history_paths))
+    current_cache: Dict[str, Dict[str, str]] = {}
+    history_cache: Dict[str, Dict[str, str]] = {}
+    total = len(current_paths) + len(history_paths)
+    if not total:
+        return current_cache, history_cache
 
-def _describe_diff(before: str, after: str) -> Dict[str, Any]:
-    matcher = difflib.SequenceMatcher(None, before, after)
-    ratio = matcher.ratio()
-    insert_chars = 0
-    delete_chars = 0
-    replace_segments = 0
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        if tag == "insert":
-            insert_chars += j2 - j1
-        elif tag == "delete":
-            delete_chars += i2 - i1
-        elif tag == "replace":
-            replace_segments += 1
-            insert_chars += j2 - j1
-            delete_chars += i2 - i1
-    return {
-        "similarity": round(ratio, 3),
-        "inserted_chars": insert_chars,
-        "deleted_chars": delete_chars,
-        "replaced_segments": replace_segments,
-    }
+    def load(path: str, version: Optional[str]) -> Dict[str, str]:
+        try:
+            return _load_block_text_map(path, version)
+        except Exception:
+            return {}
+
+    dir_mtimes: Dict[str, Optional[Dict[str, int]]] = {}
+    with ThreadPoolExecutor(
+        max_workers=min(_FETCH_CONCURRENCY, total), thread_name_prefix="siyuan-diff"
+    ) as executor:
+        if _TEXT_MAP_CACHE.enabled:
+            parents = list(dict.fromkeys(path.rpartition("/")[0] for path in current_paths))
+            listings = [
+                executor.submit(contextvars.copy_context().run, _read_dir_mtimes, parent)
+                for parent in parents
+            ]
+            for parent, future in zip(parents, listings):
+                dir_mtimes[parent] = future.result()
+
+        futures = {}
+        for path in current_paths:
+            version = _current_doc_version(path, dir_mtimes)
+            future = executor.submit(contextvars.copy_context().run, load, path, version)
+            futures[future] = (current_cache, path)
+        for path in history_paths:
+            future = executor.submit(contextvars.copy_context().run, load, path, "snapshot")
+            futures[future] = (history_cache, path)
+        for future in as_completed(futures):
+            cache, path = futures[future]
+            cache[path] = future.result()
+    return current_cache, history_cache
 
 
 def _describe_change(before: str, after: str, stats: Dict[str, Any]) -> str:
@@ -1593,12 +3237,14 @@ def _describe_change(before: str, after: str, stats: Dict[str, Any]) -> str:
     return "替换"
 
 
-@mcp.tool()
+@_tool()
 def get_block_changes(
     start_time: str,
     end_time: Optional[str] = None,
     limit: int = 200,
     include_markdown: bool = False,
+    cursor: Optional[str] = None,
+    paginate: bool = False,
 ) -> Dict[str, Any]:
     """查询指定时间范围内新增或修改的内容块。
 
@@ -1613,12 +3259,16 @@ def get_block_changes(
     注意事项:
     - deleted 当前恒为空；删除块需要结合历史快照比对才能识别。
     - include_markdown=true 会显著增大返回体量，建议配合 limit 使用。
+    - paginate=true 时按 (updated, id) 倒序分页，limit 为每页条数，结果中带 next_cursor；
+      把它原样传回 cursor 取下一页，为 null 表示已到末页。
 
     Args:
         start_time: 起始时间，格式为 'YYYYMMDDHHMMSS'。
         end_time: 结束时间，格式为 'YYYYMMDDHHMMSS'，可选。
-        limit: 最大返回条目数，默认为 200。
+        limit: 最大返回条目数（分页时为每页条数），默认为 200。
         include_markdown: 是否返回 markdown 字段，默认 false。
+        cursor: 上一页返回的 next_cursor，可选。
+        paginate: 是否分页，默认 false；传入 cursor 时自动分页。
 
     Returns:
         Dict[str, Any]: 包含新增与修改块列表以及历史快照可用性信息。
@@ -1651,14 +3301,33 @@ def get_block_changes(
     ]
     if include_markdown:
         fields.append("markdown")
-    query = f"SELECT {', '.join(fields)} FROM blocks WHERE {time_clause} ORDER BY updated DESC LIMIT {limit}"
+    paginated = paginate or cursor is not None
+    cursor_out = None
+    if paginated:
+        fingerprint = query_fingerprint(
+            "get_block_changes",
+            {
+                "start_time": start_time,
+                "end_time": end_time,
+                "include_markdown": include_markdown,
+            },
+        )
+        results, cursor_out = _keyset_page(
+            f"SELECT {', '.join(fields)} FROM blocks WHERE {time_clause}",
+            "updated",
+            fingerprint,
+            cursor,
+            _validate_page_size(limit),
+        )
+    else:
+        query = f"SELECT {', '.join(fields)} FROM blocks WHERE {time_clause} ORDER BY updated DESC LIMIT {limit}"
 
-    if not query.strip().upper().startswith("SELECT"):
-        raise ValueError("Only SELECT statements are allowed for security reasons.")
+        if not query.strip().upper().startswith("SELECT"):
+            raise ValueError("Only SELECT statements are allowed for security reasons.")
 
-    results = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
-    if not isinstance(results, list):
-        raise TypeError(f"Expected a list from SQL query, but got {type(results)}")
+        results = _post_to_siyuan_api("/api/query/sql", {"stmt": query})
+        if not isinstance(results, list):
+            raise TypeError(f"Expected a list from SQL query, but got {type(results)}")
 
     history_available = True
     history_error = None
@@ -1682,17 +3351,14 @@ def get_block_changes(
             not end_time or updated <= end_time
         )
 
-        item = dict(row)
-        for key, value in item.items():
-            if isinstance(value, str):
-                item[key] = mask_sensitive_data(value)
+        item = mask_sql_row(dict(row))
 
         if in_created_range:
             added.append(item)
         elif in_updated_range and created < start_time:
             modified.append(item)
 
-    return {
+    result = {
         "range": {"start": start_time, "end": end_time},
         "history_available": history_available,
         "history_error": history_error,
@@ -1701,15 +3367,19 @@ def get_block_changes(
         "deleted": [],
         "note": "Deleted blocks require history snapshot diff; current API cannot infer deletions without /history.",
     }
+    if paginated:
+        result["next_cursor"] = cursor_out
+    return result
 
 
-@mcp.tool()
+@_tool()
 def get_block_diffs(
     start_time: str,
     end_time: Optional[str] = None,
     limit: int = 50,
     history_root: str = "/history",
     max_text_length: int = 400,
+    max_deleted: Optional[int] = 200,
 ) -> Dict[str, Any]:
     """查询指定时间范围内修改的内容块并返回前后对比。
 
@@ -1724,6 +3394,7 @@ def get_block_diffs(
     注意事项:
     - 依赖 history_root 可读；若历史目录不可访问，将无法完成比对。
     - before/after 为脱敏文本；max_text_length 会对长文本截断。
+    - 长文本的 diff 统计为按行/词比较的近似值；超出时间预算时 diff 中带 budget_exceeded=True。
 
     Args:
         start_time: 起始时间，格式为 'YYYYMMDDHHMMSS'。
@@ -1731,10 +3402,16 @@ def get_block_diffs(
         limit: 最大返回条目数，默认为 50。
         history_root: 历史快照根目录，默认为 '/history'。
         max_text_length: 前后文本最大长度，超出将截断。
+        max_deleted: deleted 最多返回的条目数，默认 200；超出时带 deleted_truncated=True，
+            None 表示不限制。
 
     Returns:
         Dict[str, Any]: 包含块变更差异结果。
     """
+    if max_deleted is not None and (
+        isinstance(max_deleted, bool) or not isinstance(max_deleted, int) or max_deleted < 0
+    ):
+        raise ValueError("max_deleted must be a non-negative integer or None")
     if not is_siyuan_timestamp(start_time):
         raise ValueError("start_time must be in 'YYYYMMDDHHMMSS' format")
     if end_time and not is_siyuan_timestamp(end_time):
@@ -1764,12 +3441,11 @@ def get_block_diffs(
     history_entries = _post_to_siyuan_api("/api/file/readDir", {"path": history_root})
     if not isinstance(history_entries, list):
         raise TypeError("Expected history entries list from readDir")
+    snapshot_index = get_snapshot_index(history_root)
+    snapshot_index.refresh(history_entries)
 
-    current_cache: Dict[str, Dict[str, str]] = {}
-    history_cache: Dict[Tuple[str, str], Dict[str, str]] = {}
-    deleted_candidates: Dict[str, Dict[str, Any]] = {}
-
-    diffs = []
+    # 先确定每行对应的当前文件与历史快照文件，再按文件去重并发读取
+    planned = []
     for row in rows:
         if not isinstance(row, dict):
             continue
@@ -1782,52 +3458,30 @@ def get_block_diffs(
         if not block_id or not path or not box or not updated:
             continue
 
-        snapshot = _select_snapshot(history_entries, updated)
+        snapshot = snapshot_index.latest_at_or_before(updated)
         history_path = None
         if snapshot:
             history_path = f"{history_root}/{snapshot}/{box}{path}"
 
         current_path = f"/data/{box}{path}"
+        planned.append(
+            (row, block_id, box, path, updated, created, snapshot, history_path, current_path)
+        )
 
-        if current_path not in current_cache:
-            try:
-                current_json = _load_sy_json_from_path(current_path)
-                current_cache[current_path] = _build_block_text_map(current_json)
-            except Exception:
-                current_cache[current_path] = {}
+    current_cache, history_cache = _load_diff_text_maps(
+        [item[8] for item in planned],
+        [item[7] for item in planned if item[7] and item[6]],
+    )
 
+    diffs = []
+    pending_pairs: List[Tuple[str, str]] = []
+    for row, block_id, box, path, updated, created, snapshot, history_path, current_path in planned:
         current_map = current_cache.get(current_path, {})
         after_text = current_map.get(block_id)
 
         before_text = None
         if history_path and snapshot:
-            cache_key = (snapshot, history_path)
-            if cache_key not in history_cache:
-                try:
-                    history_json = _load_sy_json_from_path(history_path)
-                    history_cache[cache_key] = _build_block_text_map(history_json)
-                except Exception:
-                    history_cache[cache_key] = {}
-            before_text = history_cache.get(cache_key, {}).get(block_id)
-
-            current_ids = set(current_map.keys())
-            history_map = history_cache.get(cache_key, {})
-            for history_id, history_text in history_map.items():
-                if history_id in current_ids:
-                    continue
-                if not history_text:
-                    continue
-                if history_id in deleted_candidates:
-                    continue
-                deleted_candidates[history_id] = {
-                    "id": history_id,
-                    "box": box,
-                    "path": path,
-                    "snapshot": snapshot,
-                    "before": mask_sensitive_data(history_text),
-                    "after": "",
-                    "change": "删除",
-                }
+            before_text = history_cache.get(history_path, {}).get(block_id)
 
         if before_text == after_text:
             continue
@@ -1844,9 +3498,7 @@ def get_block_diffs(
             if len(masked_after) > max_text_length:
                 masked_after = masked_after[:max_text_length] + "..."
 
-        diff_stats = _describe_diff(before_text or "", after_text or "")
-        change_desc = _describe_change(before_text or "", after_text or "", diff_stats)
-
+        pending_pairs.append((before_text or "", after_text or ""))
         diffs.append(
             {
                 "id": block_id,
@@ -1859,19 +3511,89 @@ def get_block_diffs(
                 "snapshot": snapshot,
                 "before": masked_before,
                 "after": masked_after,
-                "diff": diff_stats,
-                "change": change_desc,
+                "diff": None,
+                "change": None,
             }
         )
 
-    return {
+    # diff 统计是纯 CPU 计算，批量较大时交给进程池
+    for entry, (before, after), diff_stats in zip(
+        diffs, pending_pairs, _describe_diffs(pending_pairs)
+    ):
+        entry["diff"] = diff_stats
+        entry["change"] = _describe_change(before, after, diff_stats)
+
+    deleted_iter = _iter_deleted_blocks(
+        [
+            (current_path, history_path, box, path, snapshot)
+            for _, _, box, path, _, _, snapshot, history_path, current_path in planned
+            if history_path and snapshot
+        ],
+        current_cache,
+        history_cache,
+    )
+    if max_deleted is None:
+        deleted = list(deleted_iter)
+        deleted_truncated = False
+    else:
+        deleted = list(itertools.islice(deleted_iter, max_deleted))
+        deleted_truncated = next(deleted_iter, None) is not None
+
+    result = {
         "range": {"start": start_time, "end": end_time},
         "history_root": history_root,
         "count": len(diffs),
         "diffs": diffs,
-        "deleted": list(deleted_candidates.values()),
+        "deleted": deleted,
         "note": "Diff is derived by comparing current /data file with the latest history snapshot <= updated time.",
     }
+    if deleted_truncated:
+        result["deleted_truncated"] = True
+    return result
+
+
+@_tool()
+def get_server_stats() -> Dict[str, Any]:
+    """查看 MCP 服务自身的运行统计（只读，不访问思源）。
+
+    适用场景:
+        - 排查性能问题，例如确认缓存是否生效、命中率是否符合预期。
+
+    注意事项:
+        - 统计自服务进程启动起累计，重启后清零。
+        - tools 中 backend_calls_* 为每次工具调用实际发给思源的请求数，
+          可用于发现某个工具请求数的回归。
+        - 本服务自身的写入会让块元数据缓存整体失效；在思源客户端中的手动修改
+          不会通知本服务，最长在 TTL 秒后才会反映到缓存。
+
+    Returns:
+        Dict[str, Any]: 包含 caches（各缓存的容量、命中/未命中次数等）、
+        tools（各工具调用次数、后端请求数、同次调用内去重命中数）、
+        notifications（通知队列深度、合并/丢弃/发送失败次数）与
+        search_index（本地全文索引的条目数、同步水位线与同步次数）的字典。
+    """
+    return {
+        "caches": {
+            cache.name: cache.stats()
+            for cache in (
+                _notebook_cache,
+                _block_metadata_cache,
+                _tree_index,
+                _TEXT_MAP_CACHE,
+            )
+        },
+        "tools": tool_call_stats(),
+        "notifications": (
+            _notification_queue.stats()
+            if _notification_queue is not None
+            else {"enabled": False}
+        ),
+        "search_index": (
+            _search_index.stats()
+            if _search_index is not None
+            else {"enabled": _SEARCH_INDEX_ENABLED}
+        ),
+    }
 
 
 def main() -> None:
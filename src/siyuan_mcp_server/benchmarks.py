@@ -0,0 +1,741 @@
+"""写入与查询路径的可复现基准（python -m siyuan_mcp_server.benchmarks [名称 ...]）。
+
+用进程内的 FakeKernel 代替思源：它替换共享传输层，统计每个端点的调用次数，并为每次调用
+加上固定延迟模拟网络往返。FakeKernel 只实现基准用到的接口，语义按思源的行为简化
+（如移动折叠标题时带上整个分节、SQL 不带 LIMIT 时最多返回 64 行），结果只用于比较
+同一份代码中不同路径的调用次数与耗时，不代表真实思源上的绝对数值。
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from . import transport as _transport_module
+from .transport import SiyuanConfig
+
+_TYPE_NAMES = {
+    "d": "NodeDocument",
+    "h": "NodeHeading",
+    "p": "NodeParagraph",
+    "l": "NodeList",
+    "i": "NodeListItem",
+}
+
+_BLOCK_COLUMNS = (
+    "id", "parent_id", "root_id", "box", "path", "hpath", "name", "content", "markdown",
+    "type", "subtype", "ial", "sort", "created", "updated",
+)
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes):
+        self.content = body
+        self.status_code = 200
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 65536):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+
+class FakeKernel:
+    """进程内的简化思源内核，实现 SiyuanTransport.post 的接口。"""
+
+    def __init__(self, latency: float = 0.005):
+        self.config = SiyuanConfig(base_url="http://fake-kernel", headers={})
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.db = sqlite3.connect(":memory:", check_same_thread=False)
+            self.db.execute(f"CREATE TABLE blocks ({', '.join(_BLOCK_COLUMNS)})")
+            self.db.execute("CREATE UNIQUE INDEX blocks_id ON blocks(id)")
+            self.db.execute("CREATE INDEX blocks_parent ON blocks(parent_id)")
+            self.db.execute("CREATE INDEX blocks_root ON blocks(root_id)")
+            self.nodes: Dict[str, Dict[str, Any]] = {}
+            self.box = "20240101000000-box0001"
+            self._counter = 0
+            self._clock = 20250101000000
+            self.calls.clear()
+
+    # ---- 数据构造 ----
+
+    def _tick(self) -> str:
+        self._clock += 1
+        return str(self._clock)
+
+    def add(
+        self,
+        type_: str,
+        content: str = "",
+        parent: Optional[str] = None,
+        subtype: str = "",
+        index: Optional[int] = None,
+        sync: bool = True,
+    ) -> str:
+        with self._lock:
+            self._counter += 1
+            block_id = f"{self._clock}-{self._counter:07d}"
+            created = self._tick()
+            self.nodes[block_id] = {
+                "type": type_, "subtype": subtype, "children": [], "parent": parent,
+                "content": content, "fold": False, "created": created, "updated": created,
+            }
+            if parent:
+                siblings = self.nodes[parent]["children"]
+                siblings.insert(len(siblings) if index is None else index, block_id)
+            if sync:
+                self._sync_row(block_id)
+            return block_id
+
+    def sync_all(self) -> None:
+        """批量构造数据（add(..., sync=False)）后一次写入 blocks 表。"""
+        with self._lock:
+            sorts = {
+                child: sort
+                for node in self.nodes.values()
+                for sort, child in enumerate(node["children"])
+            }
+            self.db.executemany(
+                f"INSERT OR REPLACE INTO blocks VALUES ({', '.join('?' * len(_BLOCK_COLUMNS))})",
+                [self._row(block_id, sorts.get(block_id, 0)) for block_id in self.nodes],
+            )
+
+    def _root_of(self, block_id: str) -> str:
+        node = self.nodes[block_id]
+        while node["parent"]:
+            block_id = node["parent"]
+            node = self.nodes[block_id]
+        return block_id
+
+    def _row(self, block_id: str, sort: Optional[int] = None) -> tuple:
+        node = self.nodes[block_id]
+        root_id = self._root_of(block_id)
+        parent = node["parent"] or ""
+        if sort is None:
+            sort = self.nodes[parent]["children"].index(block_id) if parent else 0
+        fold = ' fold="1"' if node["fold"] else ""
+        ial = f'{{: id="{block_id}"{fold} updated="{node["updated"]}"}}'
+        return (
+            block_id, parent, root_id, self.box, f"/{root_id}.sy", "/doc", "",
+            node["content"], node["content"], node["type"], node["subtype"], ial, sort,
+            node["created"], node["updated"],
+        )
+
+    def _sync_row(self, block_id: str) -> None:
+        self.db.execute(
+            f"INSERT OR REPLACE INTO blocks VALUES ({', '.join('?' * len(_BLOCK_COLUMNS))})",
+            self._row(block_id),
+        )
+
+    def _sync_siblings(self, parent: str) -> None:
+        """同级块的 sort 随位置变化，只更新 sort 与父块。"""
+        self.db.executemany(
+            "UPDATE blocks SET sort = ?, parent_id = ? WHERE id = ?",
+            [(sort, parent, block_id) for sort, block_id in enumerate(self.nodes[parent]["children"])],
+        )
+
+    def _drop(self, block_id: str) -> None:
+        for child in self.nodes[block_id]["children"]:
+            self._drop(child)
+        self.db.execute("DELETE FROM blocks WHERE id = ?", (block_id,))
+        del self.nodes[block_id]
+
+    def children_of(self, block_id: str) -> List[str]:
+        return list(self.nodes[block_id]["children"])
+
+    def section(self, heading_id: str) -> List[str]:
+        node = self.nodes[heading_id]
+        siblings = self.nodes[node["parent"]]["children"]
+        level = int(node["subtype"][1:]) if node["subtype"] else 6
+        result = []
+        for sibling in siblings[siblings.index(heading_id) + 1 :]:
+            sibling_node = self.nodes[sibling]
+            if sibling_node["type"] == "h" and int(sibling_node["subtype"][1:]) <= level:
+                break
+            result.append(sibling)
+        return result
+
+    def to_sy(self, block_id: str) -> Dict[str, Any]:
+        node = self.nodes[block_id]
+        properties = {"id": block_id, "updated": node["updated"]}
+        if node["fold"]:
+            properties["fold"] = "1"
+        result: Dict[str, Any] = {
+            "ID": block_id,
+            "Type": _TYPE_NAMES.get(node["type"], "NodeParagraph"),
+            "Properties": properties,
+        }
+        if node["type"] == "h":
+            result["HeadingLevel"] = int(node["subtype"][1:])
+        children: List[Dict[str, Any]] = []
+        if node["content"] and node["type"] not in ("d", "l", "i"):
+            children.append({"Type": "NodeText", "Data": node["content"]})
+        children.extend(self.to_sy(child) for child in node["children"])
+        if children:
+            result["Children"] = children
+        return result
+
+    # ---- 传输层接口 ----
+
+    def post(self, endpoint: str, json_data: Optional[Dict[str, Any]] = None, stream: bool = False):
+        with self._lock:
+            self.calls[endpoint] += 1
+        if self.latency:
+            # 延迟在锁外，并发请求的往返可以重叠
+            time.sleep(self.latency)
+        with self._lock:
+            if endpoint == "/api/file/getFile":
+                return self._get_file((json_data or {}).get("path", ""))
+            try:
+                body = {"code": 0, "msg": "", "data": self._route(endpoint, json_data or {})}
+            except Exception as e:
+                body = {"code": -1, "msg": repr(e), "data": None}
+        return _FakeResponse(json.dumps(body).encode("utf-8"))
+
+    def _get_file(self, path: str) -> _FakeResponse:
+        if path.startswith("/data/") and path.endswith(".sy"):
+            root_id = path.rsplit("/", 1)[-1][:-3]
+            if root_id in self.nodes:
+                return _FakeResponse(json.dumps(self.to_sy(root_id)).encode("utf-8"))
+        return _FakeResponse(json.dumps({"code": 404, "msg": "not found"}).encode("utf-8"))
+
+    def _operation(self, action: str, block_id: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        operation = {
+            "action": action,
+            "id": block_id,
+            "parentID": payload.get("parentID") or "",
+            "previousID": payload.get("previousID") or "",
+            "nextID": payload.get("nextID") or "",
+        }
+        if action != "delete" and block_id in self.nodes:
+            node = self.nodes[block_id]
+            operation["data"] = (
+                f'<div data-node-id="{block_id}" data-type="{_TYPE_NAMES[node["type"]]}" '
+                f'data-subtype="{node["subtype"]}"><div contenteditable="true">'
+                f'{node["content"]}</div></div>'
+            )
+        return [{"doOperations": [operation], "undoOperations": None}]
+
+    def _route(self, endpoint: str, payload: Dict[str, Any]) -> Any:
+        if endpoint == "/api/query/sql":
+            cursor = self.db.execute(payload["stmt"])
+            names = [column[0] for column in cursor.description]
+            rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+            return rows if " limit " in payload["stmt"].lower() else rows[:64]
+        if endpoint == "/api/block/getBlockKramdown":
+            node = self.nodes[payload["id"]]
+            return {
+                "id": payload["id"],
+                "kramdown": f'{node["content"]}\n{{: id="{payload["id"]}" updated="{node["updated"]}"}}',
+            }
+        if endpoint == "/api/block/getChildBlocks":
+            node = self.nodes[payload["id"]]
+            ids = self.section(payload["id"]) if node["type"] == "h" else node["children"]
+            return [
+                {"id": block_id, "type": self.nodes[block_id]["type"], "subType": self.nodes[block_id]["subtype"]}
+                for block_id in ids
+            ]
+        if endpoint in ("/api/block/insertBlock", "/api/block/appendBlock", "/api/block/prependBlock"):
+            return self._insert(endpoint, payload)
+        if endpoint == "/api/block/updateBlock":
+            node = self.nodes[payload["id"]]
+            node["content"] = payload["data"]
+            node["updated"] = self._tick()
+            self._sync_row(payload["id"])
+            return self._operation("update", payload["id"], payload)
+        if endpoint == "/api/block/deleteBlock":
+            parent = self.nodes[payload["id"]]["parent"]
+            self.nodes[parent]["children"].remove(payload["id"])
+            self._drop(payload["id"])
+            self._sync_siblings(parent)
+            return self._operation("delete", payload["id"], payload)
+        if endpoint == "/api/block/moveBlock":
+            return self._move(payload)
+        if endpoint in ("/api/block/foldBlock", "/api/block/unfoldBlock"):
+            self.nodes[payload["id"]]["fold"] = endpoint == "/api/block/foldBlock"
+            self.nodes[payload["id"]]["updated"] = self._tick()
+            self._sync_row(payload["id"])
+            return None
+        if endpoint in ("/api/notification/pushMsg", "/api/notification/pushErrMsg"):
+            return {"id": "0"}
+        if endpoint == "/api/file/readDir":
+            return []
+        raise KeyError(endpoint)
+
+    def _insert(self, endpoint: str, payload: Dict[str, Any]) -> Any:
+        index: Optional[int] = None
+        if endpoint == "/api/block/insertBlock":
+            if payload.get("nextID"):
+                parent = self.nodes[payload["nextID"]]["parent"]
+                index = self.nodes[parent]["children"].index(payload["nextID"])
+            elif payload.get("previousID"):
+                parent = self.nodes[payload["previousID"]]["parent"]
+                index = self.nodes[parent]["children"].index(payload["previousID"]) + 1
+            else:
+                parent = payload["parentID"]
+        else:
+            parent = payload["parentID"]
+            if self.nodes[parent]["type"] == "h":
+                section = self.section(parent)
+                anchor = section[-1] if section and endpoint.endswith("appendBlock") else parent
+                parent = self.nodes[parent]["parent"]
+                index = self.nodes[parent]["children"].index(anchor) + 1
+            elif endpoint.endswith("prependBlock"):
+                index = 0
+        text = payload["data"]
+        if text.startswith("#"):
+            type_, subtype = "h", "h" + str(len(text) - len(text.lstrip("#")))
+        else:
+            type_, subtype = "p", ""
+        block_id = self.add(type_, text.lstrip("# "), parent, subtype, index)
+        if index is not None:
+            self._sync_siblings(parent)
+        action = {
+            "/api/block/insertBlock": "insert",
+            "/api/block/appendBlock": "appendInsert",
+            "/api/block/prependBlock": "prependInsert",
+        }[endpoint]
+        return self._operation(action, block_id, payload)
+
+    def _move(self, payload: Dict[str, Any]) -> Any:
+        block_id = payload["id"]
+        previous_id = payload.get("previousID")
+        parent_id = payload.get("parentID")
+        node = self.nodes[block_id]
+        # 折叠的标题移动时带上整个分节
+        carried = self.section(block_id) if node["type"] == "h" and node["fold"] else []
+        old_parent = node["parent"]
+        for moving in [block_id] + carried:
+            self.nodes[old_parent]["children"].remove(moving)
+        if previous_id:
+            parent = self.nodes[previous_id]["parent"]
+            index = self.nodes[parent]["children"].index(previous_id) + 1
+        elif self.nodes[parent_id]["type"] == "h":
+            parent = self.nodes[parent_id]["parent"]
+            index = self.nodes[parent]["children"].index(parent_id) + 1
+        else:
+            parent, index = parent_id, 0
+        for offset, moving in enumerate([block_id] + carried):
+            self.nodes[parent]["children"].insert(index + offset, moving)
+            self.nodes[moving]["parent"] = parent
+            self.nodes[moving]["updated"] = self._tick()
+            self._sync_row(moving)
+        self._sync_siblings(parent)
+        if old_parent != parent:
+            self._sync_siblings(old_parent)
+        return self._operation("move", block_id, payload)
+
+
+def install(kernel: FakeKernel) -> None:
+    """让服务的所有请求发往 kernel。"""
+    _transport_module.reset_transport()
+    _transport_module._transport = kernel  # type: ignore[assignment]
+
+
+def _reset_server_state(server: Any) -> None:
+    """清空服务侧缓存，让每个场景从冷状态开始。"""
+    server._invalidate_block_caches()
+    server._tree_index.invalidate()
+
+
+def _drain_notifications(server: Any) -> None:
+    if server._notification_queue is not None:
+        server._notification_queue.drain()
+
+
+def _benchmark_section_move(kernel: FakeKernel, sizes=(10, 100, 300)) -> None:
+    """标题分节移动：折叠后整体移动 vs 逐块链式 moveBlock，记录调用次数与耗时。"""
+    import siyuan_mcp_server as server
+
+    print(f"section move (latency {kernel.latency * 1000:.0f} ms per call)")
+    original = server._FOLD_SECTION_MOVE
+    try:
+        for size in sizes:
+            orders = {}
+            for label, folded in (("chained", False), ("folded", True)):
+                kernel.reset()
+                document = kernel.add("d", "doc", sync=False)
+                heading = kernel.add("h", "moving", document, "h2", sync=False)
+                for i in range(size):
+                    kernel.add("p", f"paragraph {i}", document, sync=False)
+                target = kernel.add("h", "target", document, "h2", sync=False)
+                kernel.add("p", "target body", document, sync=False)
+                kernel.sync_all()
+                _reset_server_state(server)
+                server._FOLD_SECTION_MOVE = folded
+                kernel.calls.clear()
+                started = time.perf_counter()
+                server.move_block(heading, previous_id=target)
+                elapsed = time.perf_counter() - started
+                _drain_notifications(server)
+                writes = sum(
+                    count for endpoint, count in kernel.calls.items()
+                    if "/notification/" not in endpoint
+                )
+                orders[label] = kernel.children_of(document)
+                print(
+                    f"  {size:>4} children {label:>8}: {writes:4d} kernel calls "
+                    f"{elapsed:6.2f} s  ({dict(kernel.calls)})"
+                )
+            assert orders["chained"] == orders["folded"], "fold path produced a different order"
+    finally:
+        server._FOLD_SECTION_MOVE = original
+
+
+def _benchmark_batch_ops(kernel: FakeKernel, count: int = 200, documents=(1, 8)) -> None:
+    """逐次调用 append_block vs 一次 batch_block_ops，分别写入 1 篇和多篇文档。"""
+    import siyuan_mcp_server as server
+
+    print(f"batch writes, {count} appends (latency {kernel.latency * 1000:.0f} ms per call)")
+    for document_count in documents:
+        for label in ("append_block", "batch_block_ops"):
+            kernel.reset()
+            targets = [kernel.add("d", f"doc {i}") for i in range(document_count)]
+            _reset_server_state(server)
+            kernel.calls.clear()
+            operations = [
+                {"op": "append", "parent_id": targets[i % document_count], "data": f"item {i}"}
+                for i in range(count)
+            ]
+            started = time.perf_counter()
+            if label == "append_block":
+                for op in operations:
+                    server.append_block(op["parent_id"], op["data"])
+            else:
+                result = server.batch_block_ops(operations)
+                assert result["succeeded"] == count, result
+            elapsed = time.perf_counter() - started
+            _drain_notifications(server)
+            written = sum(len(kernel.children_of(target)) for target in targets)
+            assert written == count, written
+            for i, target in enumerate(targets):
+                expected = [f"item {j}" for j in range(i, count, document_count)]
+                actual = [kernel.nodes[block_id]["content"] for block_id in kernel.children_of(target)]
+                assert actual == expected, "appends within a document must keep their order"
+            calls = sum(kernel.calls.values())
+            print(
+                f"  {document_count} doc(s) {label:>15}: {count / elapsed:7.1f} ops/s "
+                f"{elapsed:5.2f} s  {calls:4d} kernel calls"
+            )
+
+
+def _benchmark_lean_writes(kernel: FakeKernel) -> None:
+    """普通写入 vs lean 写入：20 次追加、10 次更新、10 次删除、1 次移动。"""
+    import siyuan_mcp_server as server
+
+    print(f"lean writes (latency {kernel.latency * 1000:.0f} ms per call)")
+    for lean in (False, True):
+        kernel.reset()
+        document = kernel.add("d", "doc")
+        target = kernel.add("d", "target")
+        blocks = [kernel.add("p", f"paragraph {i}", document) for i in range(20)]
+        _reset_server_state(server)
+        kernel.calls.clear()
+        started = time.perf_counter()
+        for i in range(20):
+            server.append_block(document, f"item {i}", lean=lean)
+        for block_id in blocks[:10]:
+            server.update_block(block_id, "updated", lean=lean)
+        for block_id in blocks[10:]:
+            server.delete_block(block_id, lean=lean)
+        server.move_block(blocks[0], parent_id=target, lean=lean)
+        elapsed = time.perf_counter() - started
+        _drain_notifications(server)
+        calls = sum(
+            count for endpoint, count in kernel.calls.items() if "/notification/" not in endpoint
+        )
+        notifications = sum(kernel.calls.values()) - calls
+        print(
+            f"  lean={str(lean):<5}: {calls:3d} kernel calls (+{notifications} notifications) "
+            f"{elapsed:5.2f} s"
+        )
+
+
+def _benchmark_subtree_rows(kernel: FakeKernel, blocks: int = 20000, repeat: int = 5) -> None:
+    """移动小子树前的结构查询：递归查询子树 vs 整篇文档扫描（不使用文档块树索引）。"""
+    import siyuan_mcp_server as server
+
+    kernel.reset()
+    document = kernel.add("d", "doc", sync=False)
+    for i in range(blocks // 3):
+        outer = kernel.add("l", "", document, sync=False)
+        item = kernel.add("i", "", outer, sync=False)
+        kernel.add("p", f"item {i}", item, sync=False)
+    target_list = kernel.add("l", "", document, sync=False)
+    item = kernel.add("i", "", target_list, sync=False)
+    kernel.add("p", "moving item", item, sync=False)
+    nested = kernel.add("l", "", item, sync=False)
+    kernel.add("i", "", nested, sync=False)
+    kernel.sync_all()
+    print(f"subtree rows, list item with 3 descendants in a {len(kernel.nodes)}-block document")
+
+    original_ttl = server._tree_index.ttl
+    server._tree_index.ttl = 0
+    try:
+        for label, fetch in (
+            ("whole document", lambda: server._get_root_block_rows(document)),
+            ("subtree query", lambda: server._get_subtree_rows(item, document)),
+        ):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = fetch()
+                best = min(best, time.perf_counter() - started)
+            print(f"  {label:>14}: {len(rows):6d} rows  {best * 1000:7.1f} ms")
+        _reset_server_state(server)
+        started = time.perf_counter()
+        server.move_block(item, parent_id=document, lean=True)
+        print(f"  move_block of the item: {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        server._tree_index.ttl = original_ttl
+
+
+def _deleted_blocks_per_row(
+    doc_pairs: List[tuple],
+    current_cache: Dict[str, Dict[str, str]],
+    history_cache: Dict[str, Dict[str, str]],
+) -> List[Dict[str, Any]]:
+    """原实现：每个变更行都重建当前 ID 集合并重扫整份快照，仅作基准与一致性对照。"""
+    from .tools import mask_sensitive_data
+
+    deleted_candidates: Dict[str, Dict[str, Any]] = {}
+    for current_path, history_path, box, path, snapshot in doc_pairs:
+        current_ids = set(current_cache.get(current_path, {}).keys())
+        for history_id, history_text in history_cache.get(history_path, {}).items():
+            if history_id in current_ids or not history_text or history_id in deleted_candidates:
+                continue
+            deleted_candidates[history_id] = {
+                "id": history_id,
+                "box": box,
+                "path": path,
+                "snapshot": snapshot,
+                "before": mask_sensitive_data(history_text),
+                "after": "",
+                "change": "删除",
+            }
+    return list(deleted_candidates.values())
+
+
+def _benchmark_deleted_blocks(
+    kernel: FakeKernel, documents: int = 4, blocks: int = 3000, rows: int = 3000
+) -> None:
+    """get_block_diffs 的已删除块检测：逐行重扫 vs 每个文件对只比较一次（不经过内核）。"""
+    import itertools
+    import random
+
+    import siyuan_mcp_server as server
+
+    rng = random.Random(1)
+    current_cache: Dict[str, Dict[str, str]] = {}
+    history_cache: Dict[str, Dict[str, str]] = {}
+    pairs = []
+    for d in range(documents):
+        current_path = f"/data/box/doc{d}.sy"
+        history_path = f"/history/2025-01-01-000000-update/box/doc{d}.sy"
+        history_map = {
+            f"20250101000000-{d}{b:06d}": f"block {b} of doc {d}, mail user{b}@example.com"
+            for b in range(blocks)
+        }
+        history_cache[history_path] = history_map
+        current_cache[current_path] = {
+            block_id: text for block_id, text in history_map.items() if rng.random() < 0.87
+        }
+        pairs.append((current_path, history_path, "box", f"/doc{d}.sy", "2025-01-01-000000-update"))
+    doc_pairs = [rng.choice(pairs) for _ in range(rows)]
+
+    timings = []
+    results = []
+    for label, run in (
+        ("per-row rescan", lambda: _deleted_blocks_per_row(doc_pairs, current_cache, history_cache)),
+        ("once per pair", lambda: list(server._iter_deleted_blocks(doc_pairs, current_cache, history_cache))),
+        (
+            "once per pair, first 200",
+            lambda: list(itertools.islice(server._iter_deleted_blocks(doc_pairs, current_cache, history_cache), 200)),
+        ),
+    ):
+        started = time.perf_counter()
+        results.append(run())
+        timings.append((label, time.perf_counter() - started))
+    assert results[0] == results[1], "deleted blocks differ from the per-row implementation"
+    assert results[2] == results[0][:200]
+    print(f"deleted blocks, {documents} documents x {blocks} blocks, {rows} changed rows, {len(results[0])} deleted")
+    for label, elapsed in timings:
+        print(f"  {label:>24}: {elapsed * 1000:8.1f} ms")
+
+
+def _benchmark_pagination(kernel: FakeKernel, documents: int = 4, blocks: int = 3000) -> None:
+    """keyset 分页：逐页取完全部结果，检查每行恰好出现一次（updated 故意大量重复）。"""
+    import siyuan_mcp_server as server
+
+    kernel.reset()
+    for d in range(documents):
+        document = kernel.add("d", f"doc {d}", sync=False)
+        for b in range(blocks):
+            kernel.add("p", f"note {d}-{b}", document, sync=False)
+    for n, node in enumerate(kernel.nodes.values()):
+        # 每 50 个块共用同一个 updated，跨页边界的并列值必须靠 id 区分
+        node["updated"] = str(20250102000000 + n // 50)
+    kernel.sync_all()
+    total = len(kernel.nodes)
+    paragraphs = total - documents
+    print(f"pagination, {total} blocks, updated shared by 50 blocks at a time")
+
+    def page_all(label, expected, call, items_of, key="id"):
+        _reset_server_state(server)
+        kernel.calls.clear()
+        seen = []
+        pages = 0
+        cursor = None
+        started = time.perf_counter()
+        while True:
+            result = call(cursor)
+            pages += 1
+            seen.extend(row[key] for row in items_of(result))
+            cursor = result.get("next_cursor")
+            if not cursor:
+                break
+        elapsed = time.perf_counter() - started
+        assert len(seen) == expected and len(set(seen)) == expected, f"{label}: rows missing or repeated"
+        print(
+            f"  {label:>26}: {expected:6d} rows  {pages:3d} pages  "
+            f"{sum(kernel.calls.values()):3d} calls  {elapsed:.2f} s"
+        )
+
+    page_all(
+        "execute_sql (updated, id)", total,
+        lambda cursor: server.execute_sql("SELECT id, updated FROM blocks", cursor=cursor, paginate=True, page_size=500),
+        lambda result: result["items"],
+    )
+    page_all(
+        "execute_sql (sort, id)", total,
+        lambda cursor: server.execute_sql(
+            "SELECT id, sort FROM blocks", cursor=cursor, paginate=True, page_size=500, order_key="sort"
+        ),
+        lambda result: result["items"],
+    )
+    page_all(
+        "search_blocks", paragraphs,
+        lambda cursor: server.search_blocks("note", cursor=cursor, paginate=True, limit=500),
+        lambda result: result["items"],
+    )
+    page_all(
+        "get_block_changes", total,
+        lambda cursor: server.get_block_changes("20250101000000", cursor=cursor, paginate=True, limit=500),
+        lambda result: result["added"] + result["modified"],
+    )
+    kernel.calls.clear()
+    unpaged = server.execute_sql("SELECT id, updated FROM blocks")
+    print(f"  without paginate or LIMIT: {len(unpaged)} rows (kernel cap)")
+
+
+def _benchmark_export(kernel: FakeKernel, documents: int = 6, blocks: int = 5000) -> None:
+    """export_query 落盘 vs execute_sql 整体返回：Python 堆峰值与返回体积。"""
+    import os
+    import tempfile
+    import tracemalloc
+
+    import siyuan_mcp_server as server
+
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet as parquet
+    except ImportError:
+        parquet = None
+
+    kernel.reset()
+    for d in range(documents):
+        document = kernel.add("d", f"doc {d}", sync=False)
+        for b in range(blocks):
+            kernel.add("p", f"row {d}-{b} " * 8, document, sync=False)
+    kernel.sync_all()
+    query = "SELECT id, root_id, type, sort, content, updated FROM blocks"
+    print(f"export, {len(kernel.nodes)} rows")
+
+    original_dir = server._EXPORT_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        server._EXPORT_DIR = directory
+        try:
+            runs = [
+                ("execute_sql", lambda: server.execute_sql(f"{query} LIMIT 1000000")),
+                ("export_query", lambda: server.export_query(query, "bench", page_size=1000)),
+            ]
+            if parquet is not None:
+                runs.append(
+                    ("export_query + parquet", lambda: server.export_query(query, "bench_pq", page_size=1000, parquet=True))
+                )
+            for label, run in runs:
+                _reset_server_state(server)
+                kernel.calls.clear()
+                tracemalloc.start()
+                started = time.perf_counter()
+                result = run()
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                payload = len(json.dumps(result, ensure_ascii=False))
+                print(
+                    f"  {label:>22}: {elapsed:5.2f} s  peak heap {peak / 2**20:5.1f} MiB  "
+                    f"result {payload / 1024:8.1f} KiB  {sum(kernel.calls.values()):3d} calls"
+                )
+                if isinstance(result, dict) and result.get("parquet_path"):
+                    table = parquet.read_table(result["parquet_path"])
+                    assert table.num_rows == len(kernel.nodes), "parquet row count mismatch"
+
+            # 缺少 pyarrow 时应在发出任何查询前失败，且不留下文件
+            if parquet is not None:
+                blocked = {name: sys.modules[name] for name in list(sys.modules) if name.split(".")[0] == "pyarrow"}
+                sys.modules.update({name: None for name in blocked})
+                kernel.calls.clear()
+                try:
+                    server.export_query(query, "no_pyarrow", parquet=True)
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError("export_query should refuse parquet without pyarrow")
+                finally:
+                    sys.modules.update(blocked)
+                leftovers = [name for name in os.listdir(directory) if name.startswith("no_pyarrow")]
+                assert sum(kernel.calls.values()) == 0 and not leftovers
+                print("  without pyarrow: refused before any query, no files left")
+        finally:
+            server._EXPORT_DIR = original_dir
+    _drain_notifications(server)
+
+
+_BENCHMARKS: Dict[str, Callable[[FakeKernel], None]] = {
+    "section_move": _benchmark_section_move,
+    "batch_ops": _benchmark_batch_ops,
+    "lean_writes": _benchmark_lean_writes,
+    "subtree_rows": _benchmark_subtree_rows,
+    "deleted_blocks": _benchmark_deleted_blocks,
+    "pagination": _benchmark_pagination,
+    "export": _benchmark_export,
+}
+
+
+def main(argv: List[str]) -> None:
+    names = argv or list(_BENCHMARKS)
+    unknown = [name for name in names if name not in _BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(_BENCHMARKS)}")
+    kernel = FakeKernel()
+    install(kernel)
+    for name in names:
+        _BENCHMARKS[name](kernel)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
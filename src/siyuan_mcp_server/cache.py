@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+
+class TTLCache:
+    """线程安全的进程内缓存：条目按 TTL 过期，超过容量时淘汰最久未使用的条目。
+
+    ttl <= 0 表示禁用缓存（get 永远未命中，set 不保存），便于通过配置关闭。
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)。"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """删除单个条目；不传 key 时清空全部。"""
+        with self._lock:
+            if key is None:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+            elif self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class RequestScope:
+    """单次工具调用的查询上下文：同一次调用内相同的查询只发一次，并统计后端请求数。
+
+    memo 中的值在调用方之间共享，需要修改时请先复制。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._memo: Dict[Tuple[str, Hashable], Any] = {}
+        self._lock = threading.Lock()
+        self.backend_calls = 0
+        self.memo_hits = 0
+        self.calls_by_endpoint: Dict[str, int] = {}
+
+    def memoize(self, kind: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        memo_key = (kind, key)
+        with self._lock:
+            if memo_key in self._memo:
+                self.memo_hits += 1
+                return self._memo[memo_key]
+        value = loader()
+        with self._lock:
+            self._memo[memo_key] = value
+        return value
+
+    def record_call(self, endpoint: str) -> None:
+        with self._lock:
+            self.backend_calls += 1
+            self.calls_by_endpoint[endpoint] = self.calls_by_endpoint.get(endpoint, 0) + 1
+
+    def invalidate(self) -> None:
+        """写入后调用：之前读到的结构和内容可能已过期。"""
+        with self._lock:
+            self._memo.clear()
+
+
+_current_scope: ContextVar[Optional[RequestScope]] = ContextVar(
+    "siyuan_request_scope", default=None
+)
+_tool_stats: Dict[str, Dict[str, Any]] = {}
+_tool_stats_lock = threading.Lock()
+
+
+def current_scope() -> Optional[RequestScope]:
+    return _current_scope.get()
+
+
+@contextmanager
+def request_scope(name: str) -> Iterator[RequestScope]:
+    """进入一次工具调用的查询上下文；已在上下文中时（工具互相调用）沿用外层上下文。"""
+    scope = _current_scope.get()
+    if scope is not None:
+        yield scope
+        return
+
+    scope = RequestScope(name)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        _record_tool_stats(scope)
+
+
+def _record_tool_stats(scope: RequestScope) -> None:
+    with _tool_stats_lock:
+        stats = _tool_stats.setdefault(
+            scope.name,
+            {
+                "invocations": 0,
+                "backend_calls_total": 0,
+                "backend_calls_max": 0,
+                "backend_calls_last": 0,
+                "memo_hits_total": 0,
+                "last_calls_by_endpoint": {},
+            },
+        )
+        stats["invocations"] += 1
+        stats["backend_calls_total"] += scope.backend_calls
+        stats["backend_calls_max"] = max(stats["backend_calls_max"], scope.backend_calls)
+        stats["backend_calls_last"] = scope.backend_calls
+        stats["memo_hits_total"] += scope.memo_hits
+        stats["last_calls_by_endpoint"] = dict(scope.calls_by_endpoint)
+
+
+def tool_call_stats() -> Dict[str, Dict[str, Any]]:
+    """按工具汇总的后端请求统计（自进程启动起累计）。"""
+    with _tool_stats_lock:
+        result: Dict[str, Dict[str, Any]] = {}
+        for name, stats in _tool_stats.items():
+            item = dict(stats)
+            item["last_calls_by_endpoint"] = dict(stats["last_calls_by_endpoint"])
+            item["backend_calls_avg"] = round(
+                stats["backend_calls_total"] / stats["invocations"], 2
+            )
+            result[name] = item
+        return result
@@ -0,0 +1,189 @@
+import difflib
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 两侧都不超过该长度时直接做字符级比较，结果与原实现完全一致
+EXACT_MAX_CHARS = 2000
+# 去掉公共前后缀后，中间部分不超过该长度时仍做字符级比较
+_MIDDLE_EXACT_MAX_CHARS = 2000
+# 行/词级比较的序列长度上限，超出时不再细分
+_MAX_UNITS = 20000
+# 单个变更区域两侧都不超过该长度时才做字符级细化
+_REFINE_MAX_CHARS = 400
+
+# 句子：以中英文句末标点或换行结尾；词：ASCII 单词、空白或单个其他字符（如汉字）
+_SENTENCE_RE = re.compile(r"[^。！？!?；;.\n]*[。！？!?；;.\n]|[^。！？!?；;.\n]+")
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+|\s+|.", re.DOTALL)
+
+
+def _exact_stats(before: str, after: str) -> Dict[str, Any]:
+    matcher = difflib.SequenceMatcher(None, before, after)
+    ratio = matcher.ratio()
+    insert_chars = 0
+    delete_chars = 0
+    replace_segments = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "insert":
+            insert_chars += j2 - j1
+        elif tag == "delete":
+            delete_chars += i2 - i1
+        elif tag == "replace":
+            replace_segments += 1
+            insert_chars += j2 - j1
+            delete_chars += i2 - i1
+    return {
+        "similarity": round(ratio, 3),
+        "inserted_chars": insert_chars,
+        "deleted_chars": delete_chars,
+        "replaced_segments": replace_segments,
+    }
+
+
+def _common_affix(before: str, after: str) -> Tuple[int, int]:
+    """返回公共前缀、公共后缀长度（两者不重叠）。"""
+    limit = min(len(before), len(after))
+    prefix = 0
+    step = 1024
+    while prefix < limit:
+        end = min(prefix + step, limit)
+        if before[prefix:end] == after[prefix:end]:
+            prefix = end
+            continue
+        while before[prefix] == after[prefix]:
+            prefix += 1
+        break
+    limit -= prefix
+    suffix = 0
+    while suffix < limit:
+        end = min(suffix + step, limit)
+        if before[len(before) - end : len(before) - suffix] == after[
+            len(after) - end : len(after) - suffix
+        ]:
+            suffix = end
+            continue
+        while before[len(before) - suffix - 1] == after[len(after) - suffix - 1]:
+            suffix += 1
+        break
+    return prefix, suffix
+
+
+def _split_units(before: str, after: str) -> Optional[Tuple[List[str], List[str]]]:
+    """依次尝试按行、按句、按词切分，取第一个切得足够细且不超过上限的结果。"""
+    for pattern in (None, _SENTENCE_RE, _TOKEN_RE):
+        if pattern is None:
+            units_a = before.splitlines(keepends=True)
+            units_b = after.splitlines(keepends=True)
+        else:
+            units_a = pattern.findall(before)
+            units_b = pattern.findall(after)
+        count = len(units_a) + len(units_b)
+        if count > _MAX_UNITS:
+            return None
+        if count > 4 or pattern is _TOKEN_RE:
+            return units_a, units_b
+    return None
+
+
+class _Tally:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.matched = 0
+        self.inserted = 0
+        self.deleted = 0
+        self.replaced = 0
+        self.cut = False
+
+    def coarse(self, deleted: int, inserted: int) -> None:
+        self.deleted += deleted
+        self.inserted += inserted
+        if deleted and inserted:
+            self.replaced += 1
+
+    def refine(self, before: str, after: str) -> None:
+        matcher = difflib.SequenceMatcher(None, before, after)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                self.matched += i2 - i1
+            elif tag == "insert":
+                self.inserted += j2 - j1
+            elif tag == "delete":
+                self.deleted += i2 - i1
+            else:
+                self.replaced += 1
+                self.inserted += j2 - j1
+                self.deleted += i2 - i1
+
+    def units(self, units_a: Sequence[str], units_b: Sequence[str]) -> None:
+        matcher = difflib.SequenceMatcher(None, units_a, units_b)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                self.matched += sum(len(unit) for unit in units_a[i1:i2])
+                continue
+            region_a = "".join(units_a[i1:i2])
+            region_b = "".join(units_b[j1:j2])
+            if tag != "replace":
+                self.coarse(len(region_a), len(region_b))
+            elif (
+                len(region_a) <= _REFINE_MAX_CHARS
+                and len(region_b) <= _REFINE_MAX_CHARS
+                and not self._expired()
+            ):
+                self.refine(region_a, region_b)
+            else:
+                self.coarse(len(region_a), len(region_b))
+
+    def _expired(self) -> bool:
+        if time.monotonic() >= self.deadline:
+            self.cut = True
+        return self.cut
+
+
+def describe_diff(
+    before: str, after: str, budget_seconds: float = 0.2
+) -> Dict[str, Any]:
+    """返回 before/after 的差异统计：similarity、inserted_chars、deleted_chars、replaced_segments。
+
+    - 两侧都不超过 EXACT_MAX_CHARS 时为原来的字符级 SequenceMatcher，结果不变。
+    - 更长的文本先去掉公共前后缀，中间部分较短时仍按字符比较；否则按行（或词）比较，
+      只在较小的替换区域内做字符级细化，similarity 为近似值。
+    - 超过 budget_seconds 后剩余区域按整体替换计数，并附加 budget_exceeded=True。
+    """
+    if len(before) <= EXACT_MAX_CHARS and len(after) <= EXACT_MAX_CHARS:
+        return _exact_stats(before, after)
+    if before == after:
+        return {
+            "similarity": 1.0,
+            "inserted_chars": 0,
+            "deleted_chars": 0,
+            "replaced_segments": 0,
+        }
+
+    prefix, suffix = _common_affix(before, after)
+    middle_a = before[prefix : len(before) - suffix]
+    middle_b = after[prefix : len(after) - suffix]
+    tally = _Tally(time.monotonic() + budget_seconds)
+    tally.matched = prefix + suffix
+
+    if not middle_a or not middle_b:
+        tally.coarse(len(middle_a), len(middle_b))
+    elif len(middle_a) <= _MIDDLE_EXACT_MAX_CHARS and len(middle_b) <= _MIDDLE_EXACT_MAX_CHARS:
+        tally.refine(middle_a, middle_b)
+    else:
+        units = _split_units(middle_a, middle_b)
+        if units is None:
+            tally.cut = True
+            tally.coarse(len(middle_a), len(middle_b))
+        else:
+            tally.units(*units)
+
+    total = len(before) + len(after)
+    stats: Dict[str, Any] = {
+        "similarity": round(2.0 * tally.matched / total, 3) if total else 1.0,
+        "inserted_chars": tally.inserted,
+        "deleted_chars": tally.deleted,
+        "replaced_segments": tally.replaced,
+    }
+    if tally.cut:
+        stats["budget_exceeded"] = True
+    return stats
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_SUFFIX = ".z"
+
+
+def default_cache_dir() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "siyuan-mcp-server")
+
+
+class TextMapDiskCache:
+    """块 ID → 文本映射的磁盘缓存，跨进程、跨调用复用已解析的 .sy 文件。
+
+    - 每个键一个文件：文件名为键的 sha256，内容为 zlib 压缩的 JSON。
+    - 总字节数超过 max_bytes 时按最近使用时间淘汰（命中会刷新文件 mtime）。
+    - 缓存内容是未脱敏的文档文本，目录权限 0700、文件权限 0600。
+    - max_bytes <= 0 表示禁用；读写失败只计入统计，不影响调用方。
+    - 锁只保护内存中的条目表与统计；文件读写、解码与淘汰时的删除都在锁外进行，
+      并发读写互不阻塞（只有首次使用时扫描目录在锁内）。
+    """
+
+    def __init__(self, name: str, directory: str, max_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 文件名 -> 字节数，按最近使用排序；首次使用时从磁盘加载
+        self._entries: "Optional[OrderedDict[str, int]]" = None
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return "\n".join(str(part) for part in parts)
+
+    def _filename(self, key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + _SUFFIX
+
+    def _load_entries(self) -> "OrderedDict[str, int]":
+        if self._entries is not None:
+            return self._entries
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # makedirs 不会修改已存在目录的权限
+        os.chmod(self.directory, 0o700)
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(_SUFFIX) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((name, size) for _, name, size in found)
+        self._total_bytes = sum(self._entries.values())
+        return self._entries
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        if not self.enabled:
+            return None
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            try:
+                known = filename in self._load_entries()
+            except OSError:
+                self.errors += 1
+                return None
+            if not known:
+                self.misses += 1
+                return None
+        try:
+            with open(path, "rb") as f:
+                payload = f.read()
+            value = json.loads(zlib.decompress(payload).decode("utf-8"))
+            os.utime(path)
+        except FileNotFoundError:
+            # 读取前刚被其它线程淘汰
+            with self._lock:
+                self.misses += 1
+                self._forget(filename)
+            return None
+        except (OSError, ValueError, zlib.error):
+            with self._lock:
+                self.errors += 1
+                self._forget(filename)
+            self._unlink(path)
+            return None
+        with self._lock:
+            entries = self._load_entries()
+            if filename in entries:
+                entries.move_to_end(filename)
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, str]) -> None:
+        if not self.enabled:
+            return
+        payload = zlib.compress(
+            json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        )
+        if len(payload) > self.max_bytes:
+            return
+        filename = self._filename(key)
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            try:
+                self._load_entries()
+            except OSError:
+                self.errors += 1
+                return
+        # 先在锁外写临时文件并原子替换，锁内只更新条目表
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(payload)
+                os.chmod(tmp_path, 0o600)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return
+        victims = []
+        with self._lock:
+            entries = self._load_entries()
+            self._total_bytes += len(payload) - entries.pop(filename, 0)
+            entries[filename] = len(payload)
+            self.writes += 1
+            while self._total_bytes > self.max_bytes and entries:
+                victim, size = entries.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+                victims.append(victim)
+        for victim in victims:
+            self._unlink(os.path.join(self.directory, victim))
+
+    def _forget(self, filename: str) -> None:
+        """从条目表中移除（调用方持有锁），文件由调用方在锁外删除。"""
+        if self._entries is not None and filename in self._entries:
+            self._total_bytes -= self._entries.pop(filename)
+
+    def _unlink(self, path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            with self._lock:
+                self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "enabled": self.enabled,
+                "directory": self.directory,
+                "entries": len(self._entries) if self._entries is not None else None,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
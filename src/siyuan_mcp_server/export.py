@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterable, Iterator, List
+
+_FILE_NAME_RE = re.compile(r"^[\w.\-]+$")
+_TYPE_NAMES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def default_export_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), "siyuan-mcp-exports")
+
+
+def validate_file_name(file_name: Any) -> None:
+    if not isinstance(file_name, str) or not _FILE_NAME_RE.match(file_name) or file_name.startswith("."):
+        raise ValueError("file_name may only contain letters, digits, '_', '-' and '.'")
+
+
+def resolve_export_path(directory: str, file_name: str, suffix: str, overwrite: bool) -> str:
+    """校验文件名并返回导出目录下的目标路径；文件名不能包含目录，已存在且不允许覆盖时报错。"""
+    validate_file_name(file_name)
+    if not file_name.endswith(suffix):
+        file_name += suffix
+    path = os.path.join(directory, file_name)
+    if os.path.exists(path) and not overwrite:
+        raise ValueError(f"Export file already exists: {path} (pass overwrite=true to replace it)")
+    return path
+
+
+class SchemaTracker:
+    """按列记录出现过的 JSON 值类型，列顺序为首次出现顺序。"""
+
+    def __init__(self) -> None:
+        self._types: Dict[str, set] = {}
+
+    def observe(self, row: Dict[str, Any]) -> None:
+        for key, value in row.items():
+            types = self._types.setdefault(key, set())
+            types.add("null" if value is None else _TYPE_NAMES.get(type(value), "string"))
+
+    def columns(self) -> Dict[str, str]:
+        """列名 → 类型；只含 null 的列为 "null"，多种类型混合时为 "mixed"。"""
+        result = {}
+        for key, types in self._types.items():
+            concrete = types - {"null"}
+            if not concrete:
+                result[key] = "null"
+            elif concrete == {"integer", "number"}:
+                result[key] = "number"
+            elif len(concrete) == 1:
+                result[key] = next(iter(concrete))
+            else:
+                result[key] = "mixed"
+        return result
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """产出同目录下的临时文件路径（权限 0600）；正常退出时改名为 path，出错时删除临时文件。"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def require_pyarrow() -> None:
+    """确认 pyarrow 可用，否则抛出 ValueError；应在开始分页导出前调用。"""
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ValueError(
+            "Parquet export requires pyarrow; install it with `pip install pyarrow`"
+        ) from e
+
+
+def write_ndjson_rows(file: IO[str], rows: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def ndjson_to_parquet(
+    ndjson_path: str, parquet_path: str, columns: Dict[str, str], batch_rows: int
+) -> None:
+    """把已写好的 NDJSON 按批转换为 Parquet，内存占用与 batch_rows 成正比。
+
+    列类型取自完整的 schema：integer → int64，number → float64，boolean → bool，
+    其余（string / mixed / null）统一为 string。需要安装 pyarrow。
+    """
+    require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"integer": pa.int64(), "number": pa.float64(), "boolean": pa.bool_()}
+    schema = pa.schema([(name, arrow_types.get(kind, pa.string())) for name, kind in columns.items()])
+    as_text = {name for name, kind in columns.items() if kind not in arrow_types}
+
+    def to_batch(rows: List[Dict[str, Any]]) -> "pa.RecordBatch":
+        arrays = []
+        for field in schema:
+            values = [row.get(field.name) for row in rows]
+            if field.name in as_text:
+                values = [
+                    v if v is None or isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+                    for v in values
+                ]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    with atomic_path(parquet_path) as tmp_path:
+        writer = pq.ParquetWriter(tmp_path, schema)
+        try:
+            with open(ndjson_path, encoding="utf-8") as source:
+                batch: List[Dict[str, Any]] = []
+                for line in source:
+                    batch.append(json.loads(line))
+                    if len(batch) >= batch_rows:
+                        writer.write_batch(to_batch(batch))
+                        batch = []
+                if batch:
+                    writer.write_batch(to_batch(batch))
+        finally:
+            writer.close()
@@ -0,0 +1,176 @@
+import bisect
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_HISTORY_DIR_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})-(\d{6})-(\w+)$")
+
+# 同一时间戳下多个快照时的优先级，数值越大越优先
+KIND_PRIORITY = {"update": 3, "sync": 2, "delete": 1}
+
+
+def parse_history_dir_name(name: str) -> Optional[Tuple[str, str]]:
+    """解析形如 2024-01-02-150405-update 的快照目录名，返回 (YYYYMMDDHHMMSS, 类型)。"""
+    match = _HISTORY_DIR_RE.match(name)
+    if not match:
+        return None
+    ts = "".join(match.groups()[:4])
+    kind = match.group(5)
+    return ts, kind
+
+
+class SnapshotIndex:
+    """历史快照目录的有序索引，用于查询“不晚于 T 的最新快照”。
+
+    - 按 (时间戳, 类型优先级, 首次出现顺序) 排序，二分查找。
+    - refresh 只解析新出现的目录名；有目录消失（被清理）时整体重建。
+    - 时间戳与优先级都相同时取目录列表中先出现的一个。
+    """
+
+    def __init__(self) -> None:
+        # 排序键为 (ts, priority, -seq)：seq 越小（越早出现）排得越靠后，相同时优先被选中
+        self._keys: List[Tuple[str, int, int]] = []
+        self._names: List[str] = []
+        self._seen: Dict[str, int] = {}
+        self._next_seq = 0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def refresh(self, entries: List[Dict[str, Any]]) -> int:
+        """用 readDir 的结果更新索引，返回新增的快照目录数。"""
+        names = [
+            entry.get("name")
+            for entry in entries
+            if isinstance(entry, dict) and isinstance(entry.get("name"), str)
+        ]
+        with self._lock:
+            current = set(names)
+            if any(name not in current for name in self._seen):
+                self._reset()
+            added = 0
+            for name in names:
+                if name in self._seen:
+                    continue
+                seq = self._next_seq
+                self._next_seq += 1
+                self._seen[name] = seq
+                parsed = parse_history_dir_name(name)
+                if parsed is None:
+                    continue
+                ts, kind = parsed
+                key = (ts, KIND_PRIORITY.get(kind, 0), -seq)
+                position = bisect.bisect_left(self._keys, key)
+                self._keys.insert(position, key)
+                self._names.insert(position, name)
+                added += 1
+            return added
+
+    def _reset(self) -> None:
+        self._keys.clear()
+        self._names.clear()
+        self._seen.clear()
+        self._next_seq = 0
+        self.rebuilds += 1
+
+    def latest_at_or_before(self, target_time: str) -> Optional[str]:
+        with self._lock:
+            # 优先级最大为 3，(target_time, 4, 0) 大于所有时间戳等于 target_time 的键
+            position = bisect.bisect_right(self._keys, (target_time, 4, 0))
+            if position == 0:
+                return None
+            return self._names[position - 1]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+_snapshot_indexes: Dict[str, SnapshotIndex] = {}
+_snapshot_indexes_lock = threading.Lock()
+
+
+def get_snapshot_index(history_root: str) -> SnapshotIndex:
+    """按历史根目录返回进程内共享的快照索引。"""
+    with _snapshot_indexes_lock:
+        index = _snapshot_indexes.get(history_root)
+        if index is None:
+            index = SnapshotIndex()
+            _snapshot_indexes[history_root] = index
+        return index
+
+
+def _select_snapshot_linear(entries: List[Dict[str, Any]], target_time: str) -> Optional[str]:
+    """原逐行解析并排序的实现，仅作基准与一致性对照。"""
+    candidates = []
+    for entry in entries:
+        name = entry.get("name")
+        if not name:
+            continue
+        parsed = parse_history_dir_name(name)
+        if not parsed:
+            continue
+        ts, kind = parsed
+        if ts <= target_time:
+            candidates.append((ts, kind, name))
+    if not candidates:
+        return None
+    candidates.sort(key=lambda item: (item[0], KIND_PRIORITY.get(item[1], 0)), reverse=True)
+    return candidates[0][2]
+
+
+def _benchmark_snapshot_index(folders=5376, rows=200):
+    """对比逐行扫描与快照索引的耗时（python src/siyuan_mcp_server/history.py）。"""
+    import random
+    import time
+
+    kinds = ["update", "sync", "delete", "other"]
+
+    def folder_name(rng, day, second):
+        return "2025-01-%02d-%06d-%s" % (day, second, rng.choice(kinds))
+
+    def listing(rng, count):
+        names = [folder_name(rng, rng.randint(1, 28), rng.randint(0, 3) * 10000) for _ in range(count)]
+        names += ["junk", "2025-01-01-bad"]
+        rng.shuffle(names)
+        return [{"name": name, "isDir": True} for name in names]
+
+    def targets(rng, count):
+        return ["202501%02d%06d" % (rng.randint(1, 28), rng.randint(0, 4) * 10000) for _ in range(count)]
+
+    rng = random.Random(1)
+    for _ in range(200):
+        entries = listing(rng, rng.randint(0, 60))
+        index = SnapshotIndex()
+        index.refresh(entries)
+        for target in targets(rng, 20):
+            assert index.latest_at_or_before(target) == _select_snapshot_linear(entries, target), "golden mismatch"
+        # 删除部分目录、追加新目录后再次核对
+        entries = [entry for entry in entries if rng.random() < 0.8] + listing(rng, 5)
+        index.refresh(entries)
+        for target in targets(rng, 20):
+            assert index.latest_at_or_before(target) == _select_snapshot_linear(entries, target), "golden mismatch"
+
+    entries = listing(rng, folders)
+    lookups = targets(rng, rows)
+
+    start = time.perf_counter()
+    expected = [_select_snapshot_linear(entries, target) for target in lookups]
+    linear = time.perf_counter() - start
+
+    index = SnapshotIndex()
+    start = time.perf_counter()
+    index.refresh(entries)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.refresh(entries)
+    found = [index.latest_at_or_before(target) for target in lookups]
+    warm = time.perf_counter() - start
+    assert found == expected, "golden mismatch"
+
+    print(f"{len(entries)} folders, {rows} rows")
+    print(f"  per-row scan: {linear * 1000:.1f} ms")
+    print(f"  index build: {build * 1000:.1f} ms  warm refresh + lookups: {warm * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    _benchmark_snapshot_index()
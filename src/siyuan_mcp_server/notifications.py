@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# 汇总通知中“最近一次”内容的预览长度
+_SUMMARY_PREVIEW_LIMIT = 60
+
+
+@dataclass
+class _Notification:
+    endpoint: str
+    title: str
+    msg: str
+    timeout: int
+    is_error: bool
+    enqueued_at: float
+
+
+def format_notification(title: str, msg: str) -> str:
+    title_text = title.strip() if isinstance(title, str) else ""
+    return f"{title_text}：{msg}" if title_text else msg
+
+
+def _preview(text: str, limit: int = _SUMMARY_PREVIEW_LIMIT) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class NotificationQueue:
+    """写操作通知的后台发送队列。
+
+    - enqueue 立即返回，由后台线程调用 sender 真正推送。
+    - 队列空闲（距上次发送已超过 coalesce_window 秒）时，新消息立即发送。
+    - 否则消息入队后，若 coalesce_window 秒内没有新消息（或最早一条已等待 max_delay 秒）
+      才发送；期间同类（同端点、同标题）的多条成功通知合并为一条汇总通知。
+    - 错误通知不参与合并，入队后立即连同已排队的消息一起发送，每条错误单独推送。
+    - 队列满时优先丢弃最早的成功通知（错误通知尽量保留），被丢弃的条数会
+      附在下一条发送的通知中，不会静默消失。
+    """
+
+    def __init__(
+        self,
+        sender: Callable[[str, str, int], Any],
+        maxsize: int = 200,
+        coalesce_window: float = 1.0,
+        max_delay: Optional[float] = None,
+    ):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self._sender = sender
+        self.maxsize = maxsize
+        self.coalesce_window = coalesce_window
+        self.max_delay = coalesce_window * 5 if max_delay is None else max_delay
+        self._items: Deque[_Notification] = deque()
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._sending = False
+        self._flushing = False
+        self._closed = False
+        self._pending_dropped = 0
+        self._pending_errors = 0
+        self._last_sent_at = float("-inf")
+        self.enqueued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failures = 0
+        self.max_depth = 0
+        self.last_error: Optional[str] = None
+
+    def enqueue(
+        self, endpoint: str, title: str, msg: str, timeout: int, is_error: bool = False
+    ) -> None:
+        item = _Notification(
+            endpoint, title, msg, timeout, is_error, time.monotonic()
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("notification queue is closed")
+            if len(self._items) >= self.maxsize:
+                self._drop_one()
+            self._items.append(item)
+            if is_error:
+                self._pending_errors += 1
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def _drop_one(self) -> None:
+        victim = next((n for n in self._items if not n.is_error), None)
+        if victim is None:
+            victim = self._items[0]
+        self._items.remove(victim)
+        if victim.is_error:
+            self._pending_errors -= 1
+        self.dropped += 1
+        self._pending_dropped += 1
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="siyuan-notify", daemon=True
+            )
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._items and not self._closed:
+                    self._cond.wait()
+                if not self._items:
+                    return
+                while not (self._flushing or self._closed or self._pending_errors):
+                    if (
+                        len(self._items) == 1
+                        and time.monotonic() - self._last_sent_at >= self.coalesce_window
+                    ):
+                        # 空闲时的第一条消息不等待合并窗口
+                        break
+                    deadline = min(
+                        self._items[-1].enqueued_at + self.coalesce_window,
+                        self._items[0].enqueued_at + self.max_delay,
+                    )
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = list(self._items)
+                self._items.clear()
+                dropped, self._pending_dropped = self._pending_dropped, 0
+                self._pending_errors = 0
+                self._sending = True
+
+            try:
+                for endpoint, text, timeout in self._coalesce(batch, dropped):
+                    self._send(endpoint, text, timeout)
+            finally:
+                with self._cond:
+                    self._sending = False
+                    self._last_sent_at = time.monotonic()
+                    self._cond.notify_all()
+
+    def _coalesce(
+        self, batch: List[_Notification], dropped: int
+    ) -> List[Tuple[str, str, int]]:
+        # 错误通知各自成组，不与其它通知合并
+        groups: Dict[Tuple[str, str, int], List[_Notification]] = {}
+        for index, item in enumerate(batch):
+            key = (item.endpoint, item.title, index if item.is_error else -1)
+            groups.setdefault(key, []).append(item)
+
+        messages: List[Tuple[str, str, int]] = []
+        for (endpoint, title, _), items in groups.items():
+            timeout = max(item.timeout for item in items)
+            if len(items) == 1:
+                text = format_notification(title, items[0].msg)
+            else:
+                with self._cond:
+                    self.coalesced += len(items) - 1
+                text = format_notification(
+                    title,
+                    f"共 {len(items)} 次，最近一次：{_preview(items[-1].msg)}",
+                )
+            messages.append((endpoint, text, timeout))
+
+        if dropped and messages:
+            endpoint, text, timeout = messages[-1]
+            messages[-1] = (
+                endpoint,
+                f"{text}（另有 {dropped} 条通知因积压被省略）",
+                timeout,
+            )
+        return messages
+
+    def _send(self, endpoint: str, text: str, timeout: int) -> None:
+        try:
+            self._sender(endpoint, text, timeout)
+            with self._cond:
+                self.sent += 1
+        except Exception as e:  # 后台线程无处抛出，记录到统计中
+            with self._cond:
+                self.failures += 1
+                self.last_error = str(e)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """立即发送已排队的通知并等待发送完成；超时返回 False。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushing = True
+            self._cond.notify_all()
+            try:
+                while self._items or self._sending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flushing = False
+
+    def close(self, timeout: float = 5.0) -> bool:
+        """进程退出前调用：发送剩余通知后停止后台线程。"""
+        drained = self.drain(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "max_depth": self.max_depth,
+                "maxsize": self.maxsize,
+                "coalesce_window_seconds": self.coalesce_window,
+                "max_delay_seconds": self.max_delay,
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failures": self.failures,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,88 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 排序键：(列名, 是否降序)。最后一列必须唯一（id），保证翻页不重不漏
+KeyColumns = Sequence[Tuple[str, bool]]
+
+KEYSETS: Dict[str, KeyColumns] = {
+    "updated": (("updated", True), ("id", True)),
+    "sort": (("sort", False), ("id", False)),
+    "id": (("id", False),),
+}
+
+
+def query_fingerprint(tool: str, params: Dict[str, Any]) -> str:
+    """由工具名和查询条件生成指纹，游标只能用于生成它的同一查询。"""
+    raw = json.dumps([tool, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint: str, values: Sequence[Any]) -> str:
+    payload = json.dumps({"q": fingerprint, "k": list(values)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, fingerprint: str, size: int) -> List[Any]:
+    """解析游标并校验其属于当前查询；格式不对或不匹配时抛出 ValueError。"""
+    if not isinstance(cursor, str) or not cursor:
+        raise ValueError("cursor must be a non-empty string")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("cursor is malformed") from e
+    if not isinstance(payload, dict) or payload.get("q") != fingerprint:
+        raise ValueError("cursor does not belong to this query; restart without cursor")
+    values = payload.get("k")
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values)
+    ):
+        raise ValueError("cursor is malformed")
+    return values
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def keyset_condition(columns: KeyColumns, values: Sequence[Any], alias: str = "") -> str:
+    """生成“排在游标之后”的条件，例如 (updated < 'x' OR (updated = 'x' AND id < 'y'))。"""
+    prefix = f"{alias}." if alias else ""
+    clauses = []
+    for index, (column, descending) in enumerate(columns):
+        parts = [
+            f"{prefix}{col} = {_literal(values[i])}" for i, (col, _) in enumerate(columns[:index])
+        ]
+        parts.append(f"{prefix}{column} {'<' if descending else '>'} {_literal(values[index])}")
+        clauses.append(" AND ".join(parts))
+    return "(" + " OR ".join(f"({clause})" for clause in clauses) + ")"
+
+
+def order_clause(columns: KeyColumns, alias: str = "") -> str:
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f"{prefix}{col} {'DESC' if desc else 'ASC'}" for col, desc in columns)
+
+
+def next_cursor(
+    rows: List[Dict[str, Any]], page_size: int, columns: KeyColumns, fingerprint: str
+) -> Optional[str]:
+    """rows 为按 page_size + 1 查询的结果：多出一行说明还有下一页，截掉多余行并返回游标。"""
+    if len(rows) <= page_size:
+        return None
+    del rows[page_size:]
+    last = rows[-1]
+    values = []
+    for column, _ in columns:
+        value = last.get(column) if isinstance(last, dict) else None
+        if value is None or isinstance(value, bool):
+            raise ValueError(
+                f"paginated rows must include a non-null '{column}' column"
+            )
+        values.append(value)
+    return encode_cursor(fingerprint, values)
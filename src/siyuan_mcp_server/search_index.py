@@ -0,0 +1,370 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 从思源同步到本地索引的列
+_SYNC_COLUMNS = ("id", "parent_id", "root_id", "type", "subtype", "created", "updated", "content")
+
+# 每次加锁写入的行数
+_WRITE_CHUNK = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS block_meta ("
+    " rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, parent_id TEXT, root_id TEXT,"
+    " type TEXT, subtype TEXT, created TEXT, updated TEXT)",
+    "CREATE INDEX IF NOT EXISTS block_meta_parent ON block_meta(parent_id)",
+    "CREATE INDEX IF NOT EXISTS block_meta_root ON block_meta(root_id)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS block_fts USING fts5(content, tokenize='trigram')",
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def fts_phrase(text: str) -> str:
+    """把普通文本转成 FTS5 短语查询，trigram 分词下等价于不区分大小写的子串匹配。"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class SearchIndex:
+    """思源 blocks 表的本地 SQLite FTS5 全文索引（trigram 分词，支持中文子串、短语、前缀与 BM25 排序）。
+
+    - 首次全量构建（按 (updated, id) 分页拉取）在后台线程进行，完成前 ensure_ready 返回 False，
+      调用方应退回原有查询；之后只拉取 updated 不早于水位线的块。
+    - 同步最多每 refresh_interval 秒一次；本服务的写操作调用 mark_stale 后下次查询立即同步。
+    - 索引不感知思源侧删除的块：调用方需用 IN 查询回思源核对命中结果，再用 remove 清理。
+    - 从思源拉取数据时不持有索引锁，只在写入每一批时短暂加锁，构建期间 search / remove 不被阻塞。
+    - 索引文件含未脱敏的块内容，权限为 0600。
+    """
+
+    name = "search_index"
+
+    def __init__(
+        self,
+        path: str,
+        fetch_rows: Callable[[str], List[Dict[str, Any]]],
+        refresh_interval: float = 5.0,
+        batch_size: int = 5000,
+    ):
+        self.path = path
+        self._fetch_rows = fetch_rows
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_sync = 0.0
+        self._ready = False
+        self._builder: Optional[threading.Thread] = None
+        self._builder_lock = threading.Lock()
+        # 串行化同步过程；与 _lock 分开，拉取数据期间不阻塞查询
+        self._sync_lock = threading.Lock()
+        self.syncs = 0
+        self.synced_rows = 0
+        self.removed = 0
+        self.searches = 0
+        self.last_sync_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+                # makedirs 不会修改已存在目录的权限
+                os.chmod(directory, 0o700)
+            if not os.path.exists(self.path):
+                os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+            self._conn = conn
+            self._ready = self._state("initialized") == "1"
+        return self._conn
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM sync_state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def mark_stale(self) -> None:
+        self._next_sync = 0.0
+
+    def ensure_ready(self) -> bool:
+        """首次全量同步已完成时返回 True；否则确保后台构建线程在运行并返回 False。
+
+        索引无法打开（SQLite 不支持 FTS5 / trigram、缓存目录不可写等）时记录到 last_error
+        并返回 False，调用方退回原有查询。
+        """
+        if self._ready:
+            return True
+        with self._builder_lock:
+            if self._builder is not None and self._builder.is_alive():
+                return False
+            try:
+                with self._lock:
+                    self._connection()
+            except Exception as e:
+                self.last_error = repr(e)
+                return False
+            if self._ready:
+                return True
+            if self._builder is None or not self._builder.is_alive():
+                self._builder = threading.Thread(
+                    target=self._build, name="siyuan-search-index", daemon=True
+                )
+                self._builder.start()
+        return False
+
+    def _build(self) -> None:
+        try:
+            self.sync(force=True)
+        except Exception as e:  # 构建失败不影响调用方，下次 ensure_ready 时重试
+            self.last_error = repr(e)
+
+    def sync(self, force: bool = False) -> int:
+        """从思源拉取水位线之后更新的块写入索引，返回写入行数。"""
+        with self._sync_lock:
+            if not force and time.monotonic() < self._next_sync:
+                return 0
+            started = time.monotonic()
+            with self._lock:
+                self._connection()
+                watermark = self._state("watermark") or ""
+            columns = ", ".join(_SYNC_COLUMNS)
+            # 同一秒内可能还有未同步的块，因此从水位线所在的秒（含）开始拉取
+            condition = f"updated >= {_literal(watermark)}"
+            total = 0
+            while True:
+                rows = self._fetch_rows(
+                    f"SELECT {columns} FROM blocks WHERE {condition} "
+                    f"ORDER BY updated ASC, id ASC LIMIT {self.batch_size}"
+                )
+                rows = [row for row in rows if isinstance(row, dict) and row.get("id")]
+                if not rows:
+                    break
+                # 全文索引写入较慢，分小块加锁提交，避免查询长时间等待
+                for start in range(0, len(rows), _WRITE_CHUNK):
+                    chunk = rows[start : start + _WRITE_CHUNK]
+                    with self._lock:
+                        conn = self._connection()
+                        self._upsert(conn, chunk)
+                        conn.execute(
+                            "INSERT OR REPLACE INTO sync_state VALUES ('watermark', ?)",
+                            (str(chunk[-1].get("updated") or ""),),
+                        )
+                        conn.commit()
+                total += len(rows)
+                last = rows[-1]
+                last_updated, last_id = str(last.get("updated") or ""), str(last["id"])
+                if len(rows) < self.batch_size:
+                    break
+                condition = (
+                    f"(updated > {_literal(last_updated)} OR "
+                    f"(updated = {_literal(last_updated)} AND id > {_literal(last_id)}))"
+                )
+            if not self._ready:
+                with self._lock:
+                    conn = self._connection()
+                    conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('initialized', '1')")
+                    conn.commit()
+                self._ready = True
+            self._next_sync = time.monotonic() + self.refresh_interval
+            self.syncs += 1
+            self.synced_rows += total
+            self.last_sync_seconds = round(time.monotonic() - started, 3)
+            return total
+
+    def _upsert(self, conn: sqlite3.Connection, rows: Sequence[Dict[str, Any]]) -> None:
+        existing: Dict[str, int] = {}
+        ids = [row["id"] for row in rows]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            existing.update(
+                conn.execute(
+                    f"SELECT id, rowid FROM block_meta WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+            )
+        next_rowid = conn.execute("SELECT IFNULL(MAX(rowid), 0) + 1 FROM block_meta").fetchone()[0]
+        meta, fts, stale = [], [], []
+        for row in rows:
+            rowid = existing.get(row["id"])
+            if rowid is None:
+                rowid = next_rowid
+                next_rowid += 1
+            else:
+                stale.append((rowid,))
+            meta.append((rowid, *(row.get(column) for column in _SYNC_COLUMNS[:7])))
+            fts.append((rowid, row.get("content") or ""))
+        # 已存在的块先删掉旧的全文条目，再与新块一起批量写入
+        conn.executemany("DELETE FROM block_fts WHERE rowid = ?", stale)
+        conn.executemany("INSERT OR REPLACE INTO block_meta VALUES (?, ?, ?, ?, ?, ?, ?, ?)", meta)
+        conn.executemany("INSERT INTO block_fts (rowid, content) VALUES (?, ?)", fts)
+
+    def search(
+        self,
+        match: str,
+        filters: Dict[str, Any],
+        limit: int,
+        offset: int = 0,
+    ) -> List[str]:
+        """返回按 BM25 排序的块 ID。
+
+        filters 支持 parent_id / root_id / type / created_after / updated_after，
+        以及 ids（限定在给定块 ID 列表内）。
+        """
+        clauses = ["block_fts MATCH ?"]
+        params: List[Any] = [match]
+        for key, column, op in (
+            ("parent_id", "parent_id", "="),
+            ("root_id", "root_id", "="),
+            ("type", "type", "="),
+            ("created_after", "created", ">"),
+            ("updated_after", "updated", ">"),
+        ):
+            value = filters.get(key)
+            if value:
+                clauses.append(f"m.{column} {op} ?")
+                params.append(value)
+        if filters.get("ids") is not None:
+            clauses.append("m.id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(filters["ids"])))
+        params.extend([limit, offset])
+        with self._lock:
+            self.searches += 1
+            try:
+                rows = self._connection().execute(
+                    "SELECT m.id FROM block_fts JOIN block_meta m ON m.rowid = block_fts.rowid "
+                    f"WHERE {' AND '.join(clauses)} ORDER BY bm25(block_fts) LIMIT ? OFFSET ?",
+                    params,
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError(f"Invalid full-text query: {e}") from e
+        return [row[0] for row in rows]
+
+    def remove(self, ids: Sequence[str]) -> int:
+        """删除思源中已不存在的块，返回实际删除的条数。"""
+        if not ids:
+            return 0
+        removed = 0
+        with self._lock:
+            conn = self._connection()
+            for block_id in ids:
+                row = conn.execute("SELECT rowid FROM block_meta WHERE id = ?", (block_id,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM block_fts WHERE rowid = ?", (row[0],))
+                    conn.execute("DELETE FROM block_meta WHERE rowid = ?", (row[0],))
+                    removed += 1
+            conn.commit()
+            self.removed += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = watermark = None
+            if self._conn is not None:
+                size = self._conn.execute("SELECT COUNT(*) FROM block_meta").fetchone()[0]
+                watermark = self._state("watermark")
+            return {
+                "name": self.name,
+                "enabled": True,
+                "ready": self._ready,
+                "building": self._builder is not None and self._builder.is_alive(),
+                "path": self.path,
+                "size": size,
+                "watermark": watermark,
+                "syncs": self.syncs,
+                "synced_rows": self.synced_rows,
+                "removed": self.removed,
+                "searches": self.searches,
+                "last_sync_seconds": self.last_sync_seconds,
+                "last_error": self.last_error,
+            }
+
+
+def _benchmark_search_index(rows=200000, repeat=5):
+    """对比 LIKE 全表扫描与本地索引的查询耗时（python src/siyuan_mcp_server/search_index.py）。
+
+    用内存中的 SQLite blocks 表代替思源，不含网络往返与回思源复核的开销。
+    """
+    import random
+    import shutil
+    import tempfile
+
+    rng = random.Random(7)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(5000)]
+    cjk = [chr(0x4E00 + rng.randint(0, 3000)) for _ in range(3000)]
+    source = sqlite3.connect(":memory:", check_same_thread=False)
+    source.execute(f"CREATE TABLE blocks ({', '.join(_SYNC_COLUMNS)})")
+    data = []
+    for i in range(rows):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(5, 40)))
+        if i % 3 == 0:
+            text += " " + "".join(rng.choice(cjk) for _ in range(rng.randint(5, 60)))
+        updated = str(20250101000000 + rng.randint(0, 10**6))
+        root = f"2025root{i % 200:06d}"
+        data.append((f"2025{i:010d}-{i:07d}", root, root, "h" if i % 10 == 0 else "p", "", updated, updated, text))
+    source.executemany(f"INSERT INTO blocks VALUES ({', '.join('?' * len(_SYNC_COLUMNS))})", data)
+    source_lock = threading.Lock()
+
+    def fetch_rows(stmt):
+        with source_lock:
+            cursor = source.execute(stmt)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    directory = tempfile.mkdtemp()
+    try:
+        index = SearchIndex(os.path.join(directory, "search.sqlite3"), fetch_rows)
+        started = time.perf_counter()
+        index.ensure_ready()
+        # 构建期间查询与删除不应等待整个构建完成
+        waits = []
+        while index._builder is not None and index._builder.is_alive():
+            t = time.perf_counter()
+            index.search(fts_phrase(words[1]), {}, 20)
+            waits.append(time.perf_counter() - t)
+            time.sleep(0.05)
+        print(
+            f"initial build {index.synced_rows} rows {time.perf_counter() - started:.2f} s, "
+            f"max search wait during build {max(waits, default=0) * 1000:.1f} ms, error {index.last_error}"
+        )
+
+        def best(func):
+            elapsed = float("inf")
+            for _ in range(repeat):
+                t = time.perf_counter()
+                result = func()
+                elapsed = min(elapsed, time.perf_counter() - t)
+            return elapsed, result
+
+        cjk_text = data[0][7].split()[-1]
+        for query in (words[1], words[3][:3], cjk_text[2:5], " ".join(data[1][7].split()[1:3])):
+            like_time, like_ids = best(
+                lambda: fetch_rows("SELECT id FROM blocks WHERE content LIKE " + _literal(f"%{query}%"))
+            )
+            index_time, index_ids = best(lambda: index.search(fts_phrase(query), {}, rows))
+            assert {row["id"] for row in like_ids} == set(index_ids), query
+            print(
+                f"{query!r:24} hits={len(index_ids):6}  LIKE {like_time * 1000:7.1f} ms  "
+                f"index {index_time * 1000:6.1f} ms"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    _benchmark_search_index()
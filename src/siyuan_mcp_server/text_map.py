@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, Tuple
+
+
+def walk_block_tree(root: Dict[str, Any]) -> Dict[str, str]:
+    """迭代遍历 .sy 节点树，返回块 ID → 该块子树文本（自身文本在前，子节点按序拼接）。
+
+    所有文本只追加一次到共享缓冲区，每个块记录 [起始, 结束) 偏移，最后统一切片，
+    避免逐层拼接子节点字符串；不受递归深度限制。
+    """
+    parts: List[str] = []
+    length = 0
+    # 后序记录 (块 ID, 起始, 结束)，重复 ID 时与递归版本一样以后完成的节点为准
+    spans: List[Tuple[str, int, int]] = []
+    # 栈中的 dict 为待进入的节点，tuple 为 (块 ID, 起始偏移) 形式的离开标记
+    stack: List[Any] = [root]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        item_class = item.__class__
+        if item_class is tuple:
+            spans.append((item[0], item[1], length))
+            continue
+        if item_class is not dict:
+            continue
+        get = item.get
+        node_id = get("ID")
+        if not node_id:
+            properties = get("Properties")
+            node_id = properties.get("id") if properties else None
+        if node_id:
+            push((node_id, length))
+        node_type = get("Type")
+        if node_type == "NodeText":
+            text = get("Data", "")
+        elif node_type == "NodeTextMark":
+            text = get("TextMarkTextContent", "")
+        else:
+            text = ""
+        if text:
+            parts.append(text)
+            length += len(text)
+        children = get("Children")
+        if children:
+            stack.extend(reversed(children))
+
+    buffer = "".join(parts)
+    block_map: Dict[str, str] = {}
+    last_span: Tuple[int, int] = (-1, -1)
+    last_text = ""
+    for node_id, start, end in spans:
+        # 只有一个子块的容器（列表、列表项等）与子块范围相同，复用同一个字符串
+        if (start, end) != last_span:
+            last_span = (start, end)
+            last_text = buffer[start:end]
+        block_map[node_id] = last_text
+    return block_map
+
+
+def _walk_recursive(node: Dict[str, Any], block_map: Dict[str, str]) -> str:
+    """原递归实现，仅作基准与一致性对照。"""
+    children = node.get("Children", [])
+    aggregated = "".join(_walk_recursive(child, block_map) for child in children) if children else ""
+    node_type = node.get("Type")
+    if node_type == "NodeText":
+        node_text = node.get("Data", "")
+    elif node_type == "NodeTextMark":
+        node_text = node.get("TextMarkTextContent", "")
+    else:
+        node_text = ""
+    combined = node_text + aggregated
+    node_id = node.get("ID") or node.get("Properties", {}).get("id")
+    if node_id:
+        block_map[node_id] = combined
+    return combined
+
+
+def _benchmark_text_map(repeat=5):
+    """对比递归与迭代遍历的耗时（python src/siyuan_mcp_server/text_map.py）。"""
+    import itertools
+    import random
+    import sys
+    import time
+
+    counter = itertools.count(1)
+
+    def new_id():
+        return "20250101000000-%07d" % next(counter)
+
+    def para(text):
+        return {
+            "ID": new_id(),
+            "Type": "NodeParagraph",
+            "Children": [
+                {"Type": "NodeText", "Data": text},
+                {"Type": "NodeTextMark", "TextMarkTextContent": "**b**"},
+            ],
+        }
+
+    def deep(depth, width):
+        root = {"ID": new_id(), "Type": "NodeDocument", "Children": []}
+        current = root
+        for level in range(depth):
+            item = {
+                "ID": new_id(),
+                "Type": "NodeListItem",
+                "Children": [para(f"level {level} " * 5) for _ in range(width)],
+            }
+            current["Children"].append({"ID": new_id(), "Type": "NodeList", "Children": [item]})
+            current = item
+        return root
+
+    def random_tree(rng, depth=0):
+        node = {"Type": rng.choice(["NodeParagraph", "NodeList", "NodeText"]), "Data": "x" * rng.randint(0, 3)}
+        if rng.random() < 0.8:
+            node["ID"] = rng.choice([new_id(), "dup1", "dup2"])
+        elif rng.random() < 0.5:
+            node["Properties"] = {"id": new_id()}
+        if depth < 6:
+            node["Children"] = [random_tree(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+        return node
+
+    def recursive(doc):
+        block_map: Dict[str, str] = {}
+        _walk_recursive(doc, block_map)
+        return block_map
+
+    rng = random.Random(1)
+    for _ in range(300):
+        doc = random_tree(rng)
+        assert walk_block_tree(doc) == recursive(doc), "golden mismatch"
+
+    wide = {"ID": new_id(), "Type": "NodeDocument", "Children": [para(f"paragraph {i} " * 8) for i in range(20000)]}
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(100000)
+    try:
+        for name, doc in (("wide 20000", wide), ("deep 300x3", deep(300, 3)), ("deep 900", deep(900, 1))):
+            assert walk_block_tree(doc) == recursive(doc), "golden mismatch"
+            timings = []
+            for func in (recursive, walk_block_tree):
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    func(doc)
+                    best = min(best, time.perf_counter() - start)
+                timings.append(best)
+            print(f"{name:>12}: recursive {timings[0] * 1000:.1f} ms  iterative {timings[1] * 1000:.1f} ms")
+    finally:
+        sys.setrecursionlimit(limit)
+
+    doc = deep(5000, 1)
+    try:
+        recursive(doc)
+        print("  deep 5000: recursive ok")
+    except RecursionError:
+        print("  deep 5000: recursive RecursionError")
+    print(f"  deep 5000: iterative {len(walk_block_tree(doc))} blocks")
+
+
+if __name__ == "__main__":
+    _benchmark_text_map()
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_SIYUAN_API_URL = "http://127.0.0.1:6806"
+
+# 只读端点：重复发送不会产生副作用，连接失败时允许有限重试。
+# 写入类端点（含通知推送）一律不重试，避免重复写入或重复弹窗。
+IDEMPOTENT_ENDPOINTS = frozenset(
+    {
+        "/api/query/sql",
+        "/api/notebook/lsNotebooks",
+        "/api/block/getBlockKramdown",
+        "/api/block/getChildBlocks",
+        "/api/file/readDir",
+        "/api/file/getFile",
+    }
+)
+
+# 端点默认读超时（秒），可通过 SIYUAN_API_ENDPOINT_TIMEOUTS 覆盖。
+_DEFAULT_ENDPOINT_READ_TIMEOUTS: Dict[str, float] = {
+    "/api/file/getFile": 120.0,
+    "/api/query/sql": 60.0,
+    "/api/block/moveBlock": 60.0,
+    "/api/filetree/createDocWithMd": 60.0,
+    "/api/notification/pushMsg": 10.0,
+    "/api/notification/pushErrMsg": 10.0,
+}
+
+_RETRY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+def env_float(name: str, default: float, allow_zero: bool = False) -> float:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = float(raw)
+    except ValueError as e:
+        raise ValueError(f"{name} must be a number, got {raw!r}") from e
+    if value < 0 or (value == 0 and not allow_zero):
+        raise ValueError(f"{name} must be positive, got {raw!r}")
+    return value
+
+
+def env_int(name: str, default: int, minimum: int = 0) -> int:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except ValueError as e:
+        raise ValueError(f"{name} must be an integer, got {raw!r}") from e
+    if value < minimum:
+        raise ValueError(f"{name} must be >= {minimum}, got {raw!r}")
+    return value
+
+
+def env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip().lower()
+    if value in {"1", "true", "yes", "on"}:
+        return True
+    if value in {"0", "false", "no", "off"}:
+        return False
+    raise ValueError(f"{name} must be a boolean (1/0/true/false), got {raw!r}")
+
+
+def _parse_endpoint_timeouts(raw: Optional[str]) -> Dict[str, float]:
+    """解析 `端点=秒数` 逗号分隔列表，例如 `/api/query/sql=90,/api/file/getFile=300`。"""
+    timeouts = dict(_DEFAULT_ENDPOINT_READ_TIMEOUTS)
+    if not raw:
+        return timeouts
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" not in item:
+            raise ValueError(
+                f"SIYUAN_API_ENDPOINT_TIMEOUTS item must look like '/api/x=30', got {item!r}"
+            )
+        endpoint, seconds = item.split("=", 1)
+        try:
+            value = float(seconds)
+        except ValueError as e:
+            raise ValueError(
+                f"Invalid timeout for {endpoint.strip()!r}: {seconds!r}"
+            ) from e
+        if value <= 0:
+            raise ValueError(f"Timeout for {endpoint.strip()!r} must be positive")
+        timeouts[endpoint.strip()] = value
+    return timeouts
+
+
+@dataclass(frozen=True)
+class SiyuanConfig:
+    """启动后解析一次的思源连接配置。"""
+
+    base_url: str
+    headers: Dict[str, str]
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    endpoint_read_timeouts: Dict[str, float] = field(default_factory=dict)
+    max_retries: int = 2
+    retry_backoff: float = 0.2
+    pool_size: int = 16
+
+    @classmethod
+    def from_env(cls) -> "SiyuanConfig":
+        api_token = os.getenv("SIYUAN_API_TOKEN")
+        if not api_token:
+            raise ValueError("SIYUAN_API_TOKEN environment variable not set.")
+
+        base_url = os.getenv("SIYUAN_API_URL", DEFAULT_SIYUAN_API_URL).rstrip("/")
+        return cls(
+            base_url=base_url,
+            headers={
+                "Authorization": f"Token {api_token}",
+                "Content-Type": "application/json",
+            },
+            connect_timeout=env_float("SIYUAN_API_CONNECT_TIMEOUT", 5.0),
+            read_timeout=env_float("SIYUAN_API_TIMEOUT", 30.0),
+            endpoint_read_timeouts=_parse_endpoint_timeouts(
+                os.getenv("SIYUAN_API_ENDPOINT_TIMEOUTS")
+            ),
+            max_retries=env_int("SIYUAN_API_MAX_RETRIES", 2),
+            retry_backoff=env_float("SIYUAN_API_RETRY_BACKOFF", 0.2),
+            pool_size=env_int("SIYUAN_API_POOL_SIZE", 16, minimum=1),
+        )
+
+
+class SiyuanTransport:
+    """持有长连接会话的思源 API 传输层，供所有工具共享。
+
+    - 使用 requests.Session + 连接池复用 TCP 连接（keep-alive）。
+    - 每个请求都带 (连接超时, 读超时)，读超时可按端点单独配置。
+    - 仅对只读端点在连接失败/超时/网关错误时做有限次指数退避重试。
+    """
+
+    def __init__(self, config: SiyuanConfig):
+        self.config = config
+        self.session = requests.Session()
+        self.session.headers.update(config.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=config.pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def timeout_for(self, endpoint: str) -> Tuple[float, float]:
+        read_timeout = self.config.endpoint_read_timeouts.get(
+            endpoint, self.config.read_timeout
+        )
+        return self.config.connect_timeout, read_timeout
+
+    def post(
+        self,
+        endpoint: str,
+        json_data: Optional[Dict[str, Any]] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """发送 POST 请求并返回已校验 HTTP 状态的响应。
+
+        Raises:
+            requests.exceptions.RequestException: 重试耗尽后仍失败。
+        """
+        url = f"{self.config.base_url}{endpoint}"
+        timeout = self.timeout_for(endpoint)
+        attempts = 1
+        if endpoint in IDEMPOTENT_ENDPOINTS:
+            attempts += self.config.max_retries
+
+        for attempt in range(attempts):
+            is_last = attempt == attempts - 1
+            try:
+                response = self.session.post(
+                    url, json=json_data, timeout=timeout, stream=stream
+                )
+                if response.status_code in _RETRY_STATUS_CODES and not is_last:
+                    response.close()
+                    self._sleep_before_retry(attempt)
+                    continue
+                response.raise_for_status()
+                return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if is_last:
+                    raise
+                self._sleep_before_retry(attempt)
+
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        time.sleep(min(self.config.retry_backoff * (2**attempt), 5.0))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_transport: Optional[SiyuanTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> SiyuanTransport:
+    """返回进程内共享的传输层实例，首次调用时解析环境变量配置。"""
+    global _transport
+    transport = _transport
+    if transport is not None:
+        return transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = SiyuanTransport(SiyuanConfig.from_env())
+        return _transport
+
+
+def reset_transport() -> None:
+    """关闭共享会话并丢弃已缓存的配置（环境变量变更后调用）。"""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = None
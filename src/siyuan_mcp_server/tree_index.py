@@ -0,0 +1,526 @@
+import threading
+import time
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# .sy 文件中的节点类型 -> blocks 表中的 type 取值
+_NODE_TYPES: Dict[str, str] = {
+    "NodeDocument": "d",
+    "NodeHeading": "h",
+    "NodeParagraph": "p",
+    "NodeList": "l",
+    "NodeListItem": "i",
+    "NodeBlockquote": "b",
+    "NodeSuperBlock": "s",
+    "NodeCodeBlock": "c",
+    "NodeTable": "t",
+    "NodeMathBlock": "m",
+    "NodeHTMLBlock": "html",
+    "NodeThematicBreak": "tb",
+    "NodeBlockQueryEmbed": "query_embed",
+    "NodeVideo": "video",
+    "NodeAudio": "audio",
+    "NodeIFrame": "iframe",
+    "NodeWidget": "widget",
+    "NodeAttributeView": "av",
+    "NodeCallout": "callout",
+}
+
+# 不改变块结构的操作，可直接忽略
+_NON_STRUCTURAL_ACTIONS = frozenset({"updateAttrs", "setAttrs", "foldHeading", "unfoldHeading"})
+
+_VOID_TAGS = frozenset(
+    {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+     "source", "track", "wbr"}
+)
+
+
+class TreeDrift(Exception):
+    """操作无法精确应用到索引上，说明索引与思源中的实际结构可能已不一致。"""
+
+
+class _Node:
+    __slots__ = ("type", "subtype", "parent", "children", "folded")
+
+    def __init__(self, type_: str, subtype: str, parent: str):
+        self.type = type_
+        self.subtype = subtype
+        self.parent = parent
+        self.children: List[str] = []
+        self.folded = False
+
+
+def _heading_level(subtype: str) -> int:
+    if len(subtype) == 2 and subtype[0] == "h" and subtype[1].isdigit():
+        return int(subtype[1])
+    return 6
+
+
+class _BlockDomParser(HTMLParser):
+    """从写接口返回的 DOM 中提取块（data-node-id）及其嵌套关系。"""
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Tuple[str, str, str, Optional[str]]] = []
+        self._stack: List[Optional[str]] = []
+
+    def _current_block(self) -> Optional[str]:
+        for block_id in reversed(self._stack):
+            if block_id is not None:
+                return block_id
+        return None
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        values = dict(attrs)
+        block_id = values.get("data-node-id")
+        if block_id:
+            type_ = _NODE_TYPES.get(values.get("data-type") or "", "")
+            subtype = values.get("data-subtype") or ""
+            self.blocks.append((block_id, type_, subtype, self._current_block()))
+        if tag not in _VOID_TAGS:
+            self._stack.append(block_id or None)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        pass
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag not in _VOID_TAGS and self._stack:
+            self._stack.pop()
+
+
+def _parse_block_dom(data: Any) -> List[Tuple[str, str, str, Optional[str]]]:
+    """返回 [(id, type, subtype, 父块 id 或 None)]，顺序为文档先序。"""
+    if not isinstance(data, str) or "data-node-id" not in data:
+        raise TreeDrift("operation data has no block DOM")
+    parser = _BlockDomParser()
+    parser.feed(data)
+    parser.close()
+    if not parser.blocks:
+        raise TreeDrift("operation data has no block DOM")
+    return parser.blocks
+
+
+class DocumentTree:
+    """单篇文档的块树：子块列表、标题级别与分节范围。"""
+
+    def __init__(self, root_id: str, loaded_at: float):
+        self.root_id = root_id
+        self.loaded_at = loaded_at
+        self.nodes: Dict[str, _Node] = {}
+
+    @classmethod
+    def from_sy(cls, data: Dict[str, Any], loaded_at: float) -> "DocumentTree":
+        root_id = data.get("ID")
+        if not isinstance(root_id, str) or not root_id:
+            raise ValueError("document tree has no root ID")
+        tree = cls(root_id, loaded_at)
+        stack: List[Tuple[Dict[str, Any], str]] = [(data, "")]
+        while stack:
+            node, parent_id = stack.pop()
+            block_id = node.get("ID")
+            if not isinstance(block_id, str) or not block_id:
+                continue  # 行内节点
+            type_ = _NODE_TYPES.get(node.get("Type", ""), "")
+            subtype = ""
+            if type_ == "h":
+                subtype = f"h{node.get('HeadingLevel') or 6}"
+            entry = _Node(type_, subtype, parent_id)
+            properties = node.get("Properties")
+            if isinstance(properties, dict):
+                entry.folded = properties.get("fold") == "1"
+            tree.nodes[block_id] = entry
+            if parent_id:
+                tree.nodes[parent_id].children.append(block_id)
+            children = node.get("Children")
+            if isinstance(children, list):
+                for child in reversed(children):
+                    if isinstance(child, dict):
+                        stack.append((child, block_id))
+        return tree
+
+    def __contains__(self, block_id: str) -> bool:
+        return block_id in self.nodes
+
+    # ---- 查询 ----
+
+    def row(self, block_id: str) -> Dict[str, Any]:
+        node = self.nodes[block_id]
+        return {
+            "id": block_id,
+            "parent_id": node.parent,
+            "root_id": self.root_id,
+            "type": node.type,
+            "subtype": node.subtype,
+            "subType": node.subtype,
+        }
+
+    def children_ids(self, block_id: str) -> List[str]:
+        return list(self.nodes[block_id].children)
+
+    def section_ids(self, heading_id: str) -> List[str]:
+        """标题分节：标题本身 + 其后直到同级或更高级标题之前的兄弟块。"""
+        node = self.nodes[heading_id]
+        if node.type != "h" or not node.parent:
+            return [heading_id]
+        level = _heading_level(node.subtype)
+        siblings = self.nodes[node.parent].children
+        section = [heading_id]
+        for sibling_id in siblings[siblings.index(heading_id) + 1 :]:
+            sibling = self.nodes[sibling_id]
+            if sibling.type == "h" and _heading_level(sibling.subtype) <= level:
+                break
+            section.append(sibling_id)
+        return section
+
+    def child_block_ids(self, block_id: str) -> List[str]:
+        """与 getChildBlocks 一致：标题返回其分节内容，其它块返回直接子块。"""
+        if self.nodes[block_id].type == "h":
+            return self.section_ids(block_id)[1:]
+        return self.children_ids(block_id)
+
+    def subtree_ids(self, block_id: str) -> List[str]:
+        ordered: List[str] = []
+        stack = [block_id]
+        while stack:
+            current = stack.pop()
+            ordered.append(current)
+            stack.extend(reversed(self.nodes[current].children))
+        return ordered
+
+    # ---- 修改 ----
+
+    def detach(self, block_id: str) -> Dict[str, _Node]:
+        """把块及其后代从树中摘下，返回被摘下的节点。"""
+        node = self.nodes.get(block_id)
+        if node is None or not node.parent:
+            raise TreeDrift(f"block not in tree: {block_id}")
+        self.nodes[node.parent].children.remove(block_id)
+        removed = {node_id: self.nodes.pop(node_id) for node_id in self._subtree_of(block_id)}
+        return removed
+
+    def _subtree_of(self, block_id: str) -> List[str]:
+        ordered: List[str] = []
+        stack = [block_id]
+        while stack:
+            current = stack.pop()
+            ordered.append(current)
+            stack.extend(self.nodes[current].children)
+        return ordered
+
+    def attach(
+        self,
+        block_id: str,
+        nodes: Dict[str, _Node],
+        parent_id: str,
+        index: Optional[int] = None,
+    ) -> None:
+        if parent_id not in self.nodes:
+            raise TreeDrift(f"parent not in tree: {parent_id}")
+        nodes[block_id].parent = parent_id
+        self.nodes.update(nodes)
+        children = self.nodes[parent_id].children
+        children.insert(len(children) if index is None else index, block_id)
+
+    def position_after(self, previous_id: str) -> Tuple[str, int]:
+        node = self.nodes.get(previous_id)
+        if node is None or not node.parent:
+            raise TreeDrift(f"anchor not in tree: {previous_id}")
+        siblings = self.nodes[node.parent].children
+        return node.parent, siblings.index(previous_id) + 1
+
+    def position_before(self, next_id: str) -> Tuple[str, int]:
+        node = self.nodes.get(next_id)
+        if node is None or not node.parent:
+            raise TreeDrift(f"anchor not in tree: {next_id}")
+        siblings = self.nodes[node.parent].children
+        return node.parent, siblings.index(next_id)
+
+    def position_in_parent(self, parent_id: str, append: bool) -> Tuple[str, int]:
+        """appendInsert / prependInsert 的落点：父块是标题时落在分节末尾或标题之后。"""
+        parent = self.nodes.get(parent_id)
+        if parent is None:
+            raise TreeDrift(f"parent not in tree: {parent_id}")
+        if parent.type == "h":
+            anchor = self.section_ids(parent_id)[-1] if append else parent_id
+            return self.position_after(anchor)
+        return parent_id, len(parent.children) if append else 0
+
+
+def _nodes_from_dom(
+    blocks: List[Tuple[str, str, str, Optional[str]]]
+) -> List[Tuple[str, Dict[str, _Node]]]:
+    """把 DOM 解析结果整理为若干顶层块，每个顶层块带上自己的后代节点。"""
+    top_level: List[Tuple[str, Dict[str, _Node]]] = []
+    owner: Dict[str, Dict[str, _Node]] = {}
+    for block_id, type_, subtype, parent_id in blocks:
+        node = _Node(type_, subtype, parent_id or "")
+        if parent_id is None:
+            group = {block_id: node}
+            top_level.append((block_id, group))
+        else:
+            group = owner[parent_id]
+            group[parent_id].children.append(block_id)
+            group[block_id] = node
+        owner[block_id] = group
+    return top_level
+
+
+class TreeIndex:
+    """进程内的文档块树索引：按文档加载一次，随写接口返回的 doOperations 原地更新。
+
+    - 超过 ttl 秒的文档树视为过期，下次使用时重新加载（ttl <= 0 表示禁用）。
+    - 无法精确应用的操作会使相关文档树失效，下次使用时重新加载。
+    - 文档树会被其它线程的 apply_transactions 原地修改，只能通过 read 在锁内查询。
+    """
+
+    def __init__(self, ttl: float):
+        self.name = "document_trees"
+        self.ttl = ttl
+        self._trees: Dict[str, DocumentTree] = {}
+        self._block_roots: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.patched_operations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def read(
+        self, root_id: str, block_id: str, reader: Callable[[DocumentTree], T]
+    ) -> Tuple[bool, Optional[T]]:
+        """在锁内执行只读查询 reader(tree)，返回 (是否命中, 结果)。
+
+        文档树未加载、已过期或不包含 block_id 时返回 (False, None)；reader 抛出的异常原样传出。
+        """
+        with self._lock:
+            tree = self._get(root_id)
+            if tree is None or block_id not in tree:
+                return False, None
+            return True, reader(tree)
+
+    def _get(self, root_id: str) -> Optional[DocumentTree]:
+        with self._lock:
+            tree = self._trees.get(root_id)
+            if tree is not None and time.monotonic() - tree.loaded_at >= self.ttl:
+                self._drop(root_id)
+                tree = None
+            if tree is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return tree
+
+    def root_of(self, block_id: str) -> Optional[str]:
+        with self._lock:
+            return self._block_roots.get(block_id)
+
+    def store(self, tree: DocumentTree) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._drop(tree.root_id)
+            self._trees[tree.root_id] = tree
+            for block_id in tree.nodes:
+                self._block_roots[block_id] = tree.root_id
+            self.loads += 1
+
+    def invalidate(self, root_id: Optional[str] = None) -> None:
+        with self._lock:
+            roots = list(self._trees) if root_id is None else [root_id]
+            for root in roots:
+                if root in self._trees:
+                    self._drop(root)
+                    self.invalidations += 1
+
+    def _drop(self, root_id: str) -> None:
+        tree = self._trees.pop(root_id, None)
+        if tree is None:
+            return
+        for block_id in tree.nodes:
+            if self._block_roots.get(block_id) == root_id:
+                del self._block_roots[block_id]
+
+    def set_folded(self, block_id: str, folded: bool) -> None:
+        with self._lock:
+            tree = self._tree_containing(block_id)
+            if tree is not None:
+                tree.nodes[block_id].folded = folded
+
+    def _tree_containing(self, block_id: Optional[str]) -> Optional[DocumentTree]:
+        if not block_id:
+            return None
+        root_id = self._block_roots.get(block_id)
+        return self._trees.get(root_id) if root_id else None
+
+    def apply_transactions(self, transactions: Any) -> None:
+        """应用写接口返回的事务列表（[{"doOperations": [...]}, ...]）。"""
+        if not self._trees or not isinstance(transactions, list):
+            return
+        with self._lock:
+            for transaction in transactions:
+                operations = (
+                    transaction.get("doOperations") if isinstance(transaction, dict) else None
+                )
+                if not isinstance(operations, list):
+                    continue
+                for operation in operations:
+                    if isinstance(operation, dict):
+                        self._apply_operation(operation)
+
+    def _apply_operation(self, operation: Dict[str, Any]) -> None:
+        action = operation.get("action")
+        if action in _NON_STRUCTURAL_ACTIONS:
+            return
+        referenced = [
+            operation.get(key) for key in ("id", "parentID", "previousID", "nextID")
+        ]
+        affected = {
+            tree.root_id
+            for tree in (self._tree_containing(block_id) for block_id in referenced)
+            if tree is not None
+        }
+        if action in ("insert", "appendInsert", "prependInsert", "update"):
+            try:
+                for block_id, _, _, _ in _parse_block_dom(operation.get("data")):
+                    tree = self._tree_containing(block_id)
+                    if tree is not None:
+                        affected.add(tree.root_id)
+            except TreeDrift:
+                pass
+        if not affected:
+            return
+        try:
+            self._apply(action, operation)
+            self.patched_operations += 1
+        except (TreeDrift, KeyError, ValueError):
+            for root_id in affected:
+                if root_id in self._trees:
+                    self._drop(root_id)
+                    self.invalidations += 1
+
+    def _apply(self, action: Any, operation: Dict[str, Any]) -> None:
+        block_id = operation.get("id") or ""
+        previous_id = operation.get("previousID") or ""
+        next_id = operation.get("nextID") or ""
+        parent_id = operation.get("parentID") or ""
+
+        if action == "delete":
+            tree = self._tree_containing(block_id)
+            if tree is None:
+                raise TreeDrift(f"unknown block: {block_id}")
+            node = tree.nodes[block_id]
+            removed_ids = (
+                tree.section_ids(block_id)
+                if node.type == "h" and node.folded
+                else [block_id]
+            )
+            for removed_id in removed_ids:
+                for node_id in tree.detach(removed_id):
+                    self._block_roots.pop(node_id, None)
+            return
+
+        if action == "update":
+            tree = self._tree_containing(block_id)
+            top_level = _nodes_from_dom(_parse_block_dom(operation.get("data")))
+            if tree is None or len(top_level) != 1 or top_level[0][0] != block_id:
+                raise TreeDrift(f"cannot apply update of {block_id}")
+            parent, index = tree.position_before(block_id)
+            folded = tree.nodes[block_id].folded
+            for node_id in tree.detach(block_id):
+                self._block_roots.pop(node_id, None)
+            top_level[0][1][block_id].folded = folded
+            self._attach(tree, block_id, top_level[0][1], parent, index)
+            return
+
+        if action in ("insert", "appendInsert", "prependInsert"):
+            top_level = _nodes_from_dom(_parse_block_dom(operation.get("data")))
+            tree, parent, index = self._resolve_position(
+                action, previous_id, next_id, parent_id
+            )
+            for offset, (top_id, nodes) in enumerate(top_level):
+                self._attach(tree, top_id, nodes, parent, index + offset)
+            return
+
+        if action == "move":
+            source = self._tree_containing(block_id)
+            tree, parent, _ = self._resolve_position(
+                action, previous_id, next_id, parent_id
+            )
+            if source is None:
+                raise TreeDrift(f"moved block not indexed: {block_id}")
+            node = source.nodes[block_id]
+            moving = (
+                source.section_ids(block_id)
+                if node.type == "h" and node.folded
+                else [block_id]
+            )
+            if previous_id in moving or parent_id in moving:
+                raise TreeDrift("move anchor inside moving group")
+            detached = [(moving_id, source.detach(moving_id)) for moving_id in moving]
+            # 摘下后重新计算落点（同一父块内移动时下标会变化）
+            tree, parent, index = self._resolve_position(
+                action, previous_id, next_id, parent_id
+            )
+            for offset, (moving_id, nodes) in enumerate(detached):
+                self._attach(tree, moving_id, nodes, parent, index + offset)
+            return
+
+        raise TreeDrift(f"unsupported action: {action}")
+
+    def _resolve_position(
+        self, action: Any, previous_id: str, next_id: str, parent_id: str
+    ) -> Tuple[DocumentTree, str, int]:
+        if previous_id:
+            tree = self._tree_containing(previous_id)
+            if tree is None:
+                raise TreeDrift(f"anchor not indexed: {previous_id}")
+            parent, index = tree.position_after(previous_id)
+        elif next_id:
+            tree = self._tree_containing(next_id)
+            if tree is None:
+                raise TreeDrift(f"anchor not indexed: {next_id}")
+            parent, index = tree.position_before(next_id)
+        elif parent_id and action in ("appendInsert", "prependInsert", "move"):
+            tree = self._tree_containing(parent_id)
+            if tree is None:
+                raise TreeDrift(f"parent not indexed: {parent_id}")
+            parent, index = tree.position_in_parent(
+                parent_id, append=action == "appendInsert"
+            )
+        else:
+            raise TreeDrift("operation has no usable position")
+        return tree, parent, index
+
+    def _attach(
+        self,
+        tree: DocumentTree,
+        block_id: str,
+        nodes: Dict[str, _Node],
+        parent_id: str,
+        index: int,
+    ) -> None:
+        tree.attach(block_id, nodes, parent_id, index)
+        for node_id in nodes:
+            self._block_roots[node_id] = tree.root_id
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "documents": len(self._trees),
+                "blocks": len(self._block_roots),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "loads": self.loads,
+                "patched_operations": self.patched_operations,
+                "invalidations": self.invalidations,
+            }